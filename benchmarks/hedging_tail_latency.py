@@ -0,0 +1,81 @@
+"""
+Tail latency of model and tool calls with and without hedging.
+
+Runs `--calls` calls against a local stand-in whose latency is usually
+`--base` seconds but, with probability `--spike-rate`, spikes to
+`--spike` seconds (a slow replica, a stuck connection). Each call goes
+through a `CallPolicy`:
+
+- deadline only: no hedges (ML_HEDGE_BUDGET=0)
+- hedged:        a duplicate request once a call is slower than the
+                 observed p95, capped at `--budget` of all calls
+
+and reports p50 / p95 / p99 / max latency, the hedge rate and how many
+calls hit the deadline.
+
+Usage (from the repo root):
+
+    python -m benchmarks.hedging_tail_latency
+    python -m benchmarks.hedging_tail_latency --calls 1000 --spike-rate 0.03 --budget 0.1
+"""
+import sys
+import time
+import random
+import asyncio
+import argparse
+import statistics
+
+from ml_common.hedging import CallPolicy, DeadlineExceeded
+
+
+def _percentile(values: list[float], q: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+async def run(label: str, policy: CallPolicy, args) -> None:
+    rng = random.Random(args.seed)
+
+    async def stand_in() -> str:
+        spike = rng.random() < args.spike_rate
+        await asyncio.sleep(args.spike if spike else rng.uniform(0.5, 1.5) * args.base)
+        return "ok"
+
+    latencies = []
+    for _ in range(args.calls):
+        started = time.perf_counter()
+        try:
+            await policy.call("model:bench", stand_in, args.deadline, idempotent=True)
+        except DeadlineExceeded:
+            pass
+        latencies.append(time.perf_counter() - started)
+
+    stats = policy.stats
+    print(
+        f"{label:<14} p50 {statistics.median(latencies) * 1000:6.1f} ms"
+        f"   p95 {_percentile(latencies, 0.95) * 1000:6.1f} ms"
+        f"   p99 {_percentile(latencies, 0.99) * 1000:6.1f} ms"
+        f"   max {max(latencies) * 1000:6.1f} ms"
+        f"   hedged {stats['hedged'] / stats['calls']:5.1%}"
+        f" (won {stats['hedge_wins']})   deadline hits {stats['deadline_exceeded']}",
+        file=sys.stderr,
+    )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--calls", type=int, default=500)
+    parser.add_argument("--base", type=float, default=0.01, help="typical latency (s)")
+    parser.add_argument("--spike", type=float, default=0.5, help="latency of a spike (s)")
+    parser.add_argument("--spike-rate", type=float, default=0.02)
+    parser.add_argument("--deadline", type=float, default=1.0, help="per-call deadline (s)")
+    parser.add_argument("--budget", type=float, default=0.05, help="max fraction of calls hedged")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    asyncio.run(run("deadline only", CallPolicy(hedge_budget=0), args))
+    asyncio.run(run("hedged", CallPolicy(hedge_budget=args.budget), args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,88 @@
+"""
+Import-time benchmark for the ADK apps.
+
+Runs `python -X importtime -c "import <app>.agent"` in a fresh interpreter
+for each app (so nothing is cached between runs) and reports the total
+cold-import time plus the slowest modules by cumulative time.
+
+Usage (from the repo root):
+
+    python -m benchmarks.import_time
+    python -m benchmarks.import_time ml_team --top 20 --repeat 5
+"""
+import os
+import sys
+import argparse
+import statistics
+import subprocess
+
+APPS = ["project_planner", "ml_researcher", "ml_engineer", "ml_team"]
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def measure(module: str) -> list[tuple[int, int, str]]:
+    """
+    Import `module` in a fresh interpreter and return
+    (self_us, cumulative_us, module_name) rows from `-X importtime`.
+    """
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=REPO_ROOT,
+        capture_output=True,
+        text=True,
+    )
+    if proc.returncode != 0:
+        raise RuntimeError(f"import {module} failed:\n{proc.stderr[-2000:]}")
+
+    rows = []
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        rows.append((int(self_us), int(cumulative_us), name.strip()))
+    return rows
+
+
+def _package(name: str) -> str:
+    parts = name.split(".")
+    # Namespace packages like google.* are only useful one level deeper.
+    return ".".join(parts[:2]) if parts[0] == "google" else parts[0]
+
+
+def report(app: str, repeat: int, top: int) -> None:
+    module = f"{app}.agent"
+    runs = [measure(module) for _ in range(repeat)]
+    totals = [sum(self_us for self_us, _, _ in rows) / 1e6 for rows in runs]
+
+    print(f"=== {module} ===")
+    print(
+        f"cold import: median {statistics.median(totals):.3f}s "
+        f"(min {min(totals):.3f}s, max {max(totals):.3f}s, n={repeat})"
+    )
+
+    # Break the median run down by top-level package (self time summed).
+    median_run = sorted(zip(totals, runs))[len(runs) // 2][1]
+    by_package: dict[str, int] = {}
+    for self_us, _, name in median_run:
+        package = _package(name)
+        by_package[package] = by_package.get(package, 0) + self_us
+
+    print(f"top {top} packages by import time:")
+    for package, self_us in sorted(by_package.items(), key=lambda kv: -kv[1])[:top]:
+        print(f"  {self_us / 1e3:9.1f} ms  {package}")
+    print()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("apps", nargs="*", default=APPS)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--top", type=int, default=15)
+    args = parser.parse_args()
+
+    for app in args.apps:
+        report(app, args.repeat, args.top)
+
+
+if __name__ == "__main__":
+    main()
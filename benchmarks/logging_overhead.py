@@ -0,0 +1,154 @@
+"""
+Per-event overhead of the logging plugin stack on the agent hot path.
+
+Replays a realistic callback sequence (agent start, model request and
+response, a tool call with a large STDOUT result, a yielded event, agent
+end) through:
+
+- adk:     ADK's LoggingPlugin + InvocationMetricsPlugin, with a
+           synchronous root handler (the previous `get_common_plugins()`)
+- sampled: SampledLoggingPlugin + InvocationMetricsPlugin, written through
+           the QueueHandler / QueueListener background writer
+- sampled@WARNING: the same, with INFO disabled
+
+and reports the time spent on the caller's thread per callback.
+
+Usage (from the repo root):
+
+    python -m benchmarks.logging_overhead
+    python -m benchmarks.logging_overhead --turns 5000 --payload-kb 64 --output /tmp/bench.log
+"""
+import os
+import sys
+import time
+import queue
+import asyncio
+import logging
+import argparse
+import contextlib
+import logging.handlers
+from types import SimpleNamespace
+
+from google.adk.events import Event
+from google.adk.models.llm_request import LlmRequest
+from google.adk.models.llm_response import LlmResponse
+from google.adk.plugins.logging_plugin import LoggingPlugin
+from google.genai import types
+
+from ml_common.logging_plugin import LOG_FORMAT, DeferredQueueHandler, SampledLoggingPlugin
+from ml_common.plugins import InvocationMetricsPlugin
+
+CALLBACKS_PER_TURN = 8
+
+
+def make_turn(payload_kb: int):
+    blob = "epoch 1/10 - loss: 0.4213 - acc: 0.8791\n" * (payload_kb * 1024 // 40)
+    session = SimpleNamespace(id="bench-session")
+    agent = SimpleNamespace(name="ML_Engineer")
+    tool = SimpleNamespace(name="run_python")
+    ctx = SimpleNamespace(
+        session=session,
+        agent_name="ML_Engineer",
+        invocation_id="bench-invocation",
+        function_call_id="call-1",
+        user_id="demo-user",
+        app_name="ml_engineer",
+        branch=None,
+        agent=agent,
+        _invocation_context=SimpleNamespace(branch=None),
+    )
+    user_message = types.Content(role="user", parts=[types.Part(text="Train a model on MNIST.")])
+    request = LlmRequest(
+        model="gemini-2.5-flash",
+        config=types.GenerateContentConfig(system_instruction="You are an ML engineer. " * 50),
+    )
+    response = LlmResponse(
+        content=types.Content(role="model", parts=[types.Part(text=blob[:8192])]),
+        usage_metadata=types.GenerateContentResponseUsageMetadata(
+            prompt_token_count=1200, candidates_token_count=800
+        ),
+    )
+    tool_args = {"code": "import torch\n" * 200}
+    result = {"result": f"STATUS: OK\n\nSTDOUT:\n{blob}\n\nSTDERR:\n"}
+    event = Event(author="ML_Engineer", content=response.content)
+
+    async def turn(plugins) -> None:
+        for p in plugins:
+            await p.on_user_message_callback(invocation_context=ctx, user_message=user_message)
+            await p.before_agent_callback(agent=agent, callback_context=ctx)
+            await p.before_model_callback(callback_context=ctx, llm_request=request)
+            await p.after_model_callback(callback_context=ctx, llm_response=response)
+            await p.before_tool_callback(tool=tool, tool_args=tool_args, tool_context=ctx)
+            await p.after_tool_callback(tool=tool, tool_args=tool_args, tool_context=ctx, result=result)
+            await p.on_event_callback(invocation_context=ctx, event=event)
+            await p.after_agent_callback(agent=agent, callback_context=ctx)
+
+    return turn
+
+
+def install_handler(handler: logging.Handler, level: int) -> None:
+    root = logging.getLogger()
+    root.handlers = [handler]
+    root.setLevel(level)
+
+
+def bench(label: str, plugins, turns: int, payload_kb: int, level: int, output: str, background: bool) -> None:
+    turn = make_turn(payload_kb)
+    with open(output, "a", encoding="utf-8") as sink:
+        stream = logging.StreamHandler(sink)
+        stream.setFormatter(logging.Formatter(LOG_FORMAT))
+        listener = None
+        if background:
+            log_queue: queue.SimpleQueue = queue.SimpleQueue()
+            listener = logging.handlers.QueueListener(log_queue, stream)
+            listener.start()
+            install_handler(DeferredQueueHandler(log_queue), level)
+        else:
+            install_handler(stream, level)
+
+        async def run() -> float:
+            started = time.perf_counter()
+            for _ in range(turns):
+                await turn(plugins)
+            return time.perf_counter() - started
+
+        # LoggingPlugin prints to stdout; send it to the same sink.
+        with contextlib.redirect_stdout(sink):
+            elapsed = asyncio.run(run())
+
+        drained = time.perf_counter()
+        if listener is not None:
+            listener.stop()
+        drained = time.perf_counter() - drained
+
+    events = turns * CALLBACKS_PER_TURN
+    print(
+        f"{label:<18} {elapsed / events * 1e6:8.2f} us/event on caller"
+        f"   (background drain after run: {drained * 1000:.0f} ms)",
+        file=sys.stderr,
+    )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--turns", type=int, default=2000)
+    parser.add_argument("--payload-kb", type=int, default=32, help="size of the tool STDOUT payload")
+    parser.add_argument("--sample-rate", type=float, default=0.1)
+    parser.add_argument("--max-chars", type=int, default=200)
+    parser.add_argument("--output", default=os.devnull, help="where log lines are written")
+    args = parser.parse_args()
+
+    def sampled():
+        return [
+            SampledLoggingPlugin(max_payload_chars=args.max_chars, sample_rate=args.sample_rate),
+            InvocationMetricsPlugin(),
+        ]
+
+    common = (args.turns, args.payload_kb)
+    bench("adk", [LoggingPlugin(), InvocationMetricsPlugin()], *common, logging.INFO, args.output, False)
+    bench("sampled", sampled(), *common, logging.INFO, args.output, True)
+    bench("sampled@WARNING", sampled(), *common, logging.WARNING, args.output, True)
+
+
+if __name__ == "__main__":
+    main()
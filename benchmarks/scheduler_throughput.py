@@ -0,0 +1,90 @@
+"""
+Aggregate throughput of concurrent code executions with and without the
+execution scheduler.
+
+Starts `--jobs` copies of a BLAS-heavy script (repeated matrix products)
+at once, from `--sessions` sessions, through:
+
+- unscheduled: every job starts immediately with the default thread count
+               (each BLAS pool sizes itself to all cores -> oversubscription)
+- scheduled:   jobs go through `ExecutionScheduler` leases, pinned to
+               `--job-cores` cores with matching thread caps
+
+and reports wall time, jobs per minute and the slowest session's finish time.
+Gains need a many-core machine; on one or two cores both modes are close.
+
+Usage (from the repo root):
+
+    python -m benchmarks.scheduler_throughput
+    python -m benchmarks.scheduler_throughput --jobs 16 --sessions 4 --size 1500 --job-cores 2
+"""
+import sys
+import time
+import asyncio
+import argparse
+import contextlib
+from collections import defaultdict
+from types import SimpleNamespace
+
+from ml_engineer.parallel import SubprocessExecutor
+from ml_engineer.scheduler import ExecutionScheduler, available_cores
+
+SCRIPT = """
+import numpy as np
+a = np.random.rand({size}, {size})
+for _ in range({reps}):
+    a = a @ a
+    a /= np.abs(a).max()
+report(checksum=float(a.sum()))
+"""
+
+
+class _Unscheduled:
+    """Lease source that admits everything at once with no caps."""
+
+    cores = available_cores()
+
+    @contextlib.asynccontextmanager
+    async def lease(self, session_id, cores=None, mem_mb=None):
+        yield SimpleNamespace(env=dict, timeout_s=None)
+
+
+async def run(label: str, executor: SubprocessExecutor, args) -> None:
+    code = SCRIPT.format(size=args.size, reps=args.reps)
+    finished: dict[str, float] = defaultdict(float)
+    started = time.perf_counter()
+
+    async def job(i: int) -> None:
+        session = f"session-{i % args.sessions}"
+        ctx = SimpleNamespace(session=SimpleNamespace(id=session), state={}, agent_name="ML_Engineer")
+        result = await executor.run_python(code, ctx)
+        if result["status"] != "OK":
+            raise RuntimeError(result["error"])
+        finished[session] = time.perf_counter() - started
+
+    await asyncio.gather(*(job(i) for i in range(args.jobs)))
+    elapsed = time.perf_counter() - started
+    print(
+        f"{label:<12} {elapsed:7.2f} s   {args.jobs / elapsed * 60:7.1f} jobs/min"
+        f"   slowest session done at {max(finished.values()):.2f} s",
+        file=sys.stderr,
+    )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--jobs", type=int, default=8)
+    parser.add_argument("--sessions", type=int, default=2)
+    parser.add_argument("--size", type=int, default=1000, help="matrix dimension")
+    parser.add_argument("--reps", type=int, default=10, help="matrix products per job")
+    parser.add_argument("--job-cores", type=int, default=1)
+    args = parser.parse_args()
+
+    print(f"{len(available_cores())} cores available", file=sys.stderr)
+    asyncio.run(run("unscheduled", SubprocessExecutor(_Unscheduled()), args))
+    scheduler = ExecutionScheduler(job_cores=args.job_cores)
+    asyncio.run(run("scheduled", SubprocessExecutor(scheduler), args))
+
+
+if __name__ == "__main__":
+    main()
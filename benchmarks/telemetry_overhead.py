@@ -0,0 +1,84 @@
+"""
+Per-event overhead of the telemetry pipeline on the agent hot path.
+
+Measures how long `TelemetryExporter.emit()` and a full
+`TelemetryPlugin` before/after tool callback pair take on the caller's
+thread, for each local sink, and reports the exporter's drop counters.
+
+Usage (from the repo root):
+
+    python -m benchmarks.telemetry_overhead
+    python -m benchmarks.telemetry_overhead --events 200000 --queue-size 1000
+"""
+import os
+import time
+import asyncio
+import argparse
+import tempfile
+from types import SimpleNamespace
+
+from ml_common.telemetry import TelemetryExporter, TelemetryPlugin, make_sink
+
+EVENT = {
+    "ts": 0.0,
+    "kind": "tool",
+    "session_id": "bench-session",
+    "agent": "ML_Engineer",
+    "name": "run_python",
+    "duration_ms": 12.5,
+}
+
+
+def bench_emit(path: str | None, events: int, queue_size: int) -> None:
+    sinks = [make_sink(path)] if path else []
+    exporter = TelemetryExporter(sinks=sinks, max_queue_size=queue_size)
+
+    started = time.perf_counter()
+    for _ in range(events):
+        exporter.emit(dict(EVENT))
+    elapsed = time.perf_counter() - started
+    exporter.close()
+
+    label = os.path.splitext(path)[1] if path else "no sink"
+    print(f"emit() [{label:>8}]   {elapsed / events * 1e9:8.0f} ns/event   {exporter.stats()}")
+
+
+def bench_plugin(path: str, events: int, queue_size: int) -> None:
+    exporter = TelemetryExporter(sinks=[make_sink(path)], max_queue_size=queue_size)
+    plugin = TelemetryPlugin(exporter)
+    tool = SimpleNamespace(name="run_python")
+    ctx = SimpleNamespace(
+        session=SimpleNamespace(id="bench-session"),
+        agent_name="ML_Engineer",
+        invocation_id="bench-invocation",
+        function_call_id="",
+    )
+
+    async def run() -> float:
+        started = time.perf_counter()
+        for i in range(events):
+            ctx.function_call_id = str(i)
+            await plugin.before_tool_callback(tool=tool, tool_args={}, tool_context=ctx)
+            await plugin.after_tool_callback(tool=tool, tool_args={}, tool_context=ctx, result={})
+        return time.perf_counter() - started
+
+    elapsed = asyncio.run(run())
+    exporter.close()
+    print(f"plugin tool pair     {elapsed / events * 1e9:8.0f} ns/event   {exporter.stats()}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--events", type=int, default=100_000)
+    parser.add_argument("--queue-size", type=int, default=10_000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        bench_emit(None, args.events, args.queue_size)
+        bench_emit(os.path.join(tmp, "events.jsonl"), args.events, args.queue_size)
+        bench_emit(os.path.join(tmp, "events.parquet"), args.events, args.queue_size)
+        bench_plugin(os.path.join(tmp, "plugin.jsonl"), args.events, args.queue_size)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,94 @@
+"""
+Time and execution capacity spent on broken training runs with and
+without the progress watchdog.
+
+Runs `--jobs` stand-in training scripts (`--step-s` seconds per step,
+`--steps` steps) through a `SubprocessExecutor` with a `--timeout`
+wall-clock limit and `--cores` execution slots. A quarter of them are
+healthy; the others break a few steps in: the loss becomes NaN, the loss
+diverges, or the "data loader" hangs. With the watchdog off a broken run
+only ends at the wall-clock limit (or at the end of its steps); with it
+on, it is killed as soon as a rule fires and its slot goes to the next job.
+
+Reports, per mode, the total wall time, the mean time until a broken run
+returns its result, and the core-seconds spent on broken runs. No network
+or API keys are needed.
+
+Usage (from the repo root):
+
+    python -m benchmarks.watchdog_early_stop
+    python -m benchmarks.watchdog_early_stop --jobs 16 --cores 2 --timeout 30 --stall-s 3
+"""
+import os
+import sys
+import time
+import asyncio
+import argparse
+import statistics
+from types import SimpleNamespace
+
+SCRIPT = """
+import time
+loss = 2.0
+for step in range({steps}):
+    if "{kind}" == "hang" and step == 3:
+        time.sleep(10 ** 6)
+    time.sleep({step_s})
+    loss = {{"nan": float("nan") if step >= 3 else loss * 0.9,
+             "diverge": loss * 3 if step >= 6 else loss * 0.9}}.get("{kind}", loss * 0.9)
+    print(f"step {{step}} loss {{loss:.4f}}")
+    progress(step=step, loss=loss)
+report(loss=loss)
+"""
+
+KINDS = ("ok", "nan", "diverge", "hang")
+
+
+async def run(label: str, watchdog_on: bool, args) -> None:
+    from ml_engineer import watchdog
+    from ml_engineer.parallel import SubprocessExecutor
+    from ml_engineer.scheduler import ExecutionScheduler, available_cores
+
+    watchdog.WATCHDOG = watchdog_on
+    scheduler = ExecutionScheduler(cores=available_cores()[:args.cores], job_timeout_s=args.timeout)
+    executor = SubprocessExecutor(scheduler)
+    broken: list[float] = []
+
+    async def job(i: int) -> None:
+        kind = KINDS[i % len(KINDS)]
+        code = SCRIPT.format(steps=args.steps, step_s=args.step_s, kind=kind)
+        ctx = SimpleNamespace(session=SimpleNamespace(id=f"session-{i}"), state={}, agent_name="ML_Engineer")
+        result = await executor.run_python(code, ctx)
+        if kind != "ok":
+            broken.append(result["duration_s"])
+        elif result["status"] != "OK":
+            raise RuntimeError(result["error"])
+
+    started = time.perf_counter()
+    await asyncio.gather(*(job(i) for i in range(args.jobs)))
+    elapsed = time.perf_counter() - started
+    print(
+        f"{label:<13} {elapsed:7.2f} s total   broken runs end after {statistics.mean(broken):6.2f} s"
+        f" on average   {sum(broken):7.1f} core-s spent on broken runs",
+        file=sys.stderr,
+    )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--jobs", type=int, default=8)
+    parser.add_argument("--cores", type=int, default=len(os.sched_getaffinity(0)))
+    parser.add_argument("--steps", type=int, default=40)
+    parser.add_argument("--step-s", type=float, default=0.25, help="seconds per training step")
+    parser.add_argument("--timeout", type=float, default=20.0, help="wall-clock limit per run (s)")
+    parser.add_argument("--stall-s", type=float, default=2.0, help="watchdog stall limit (s)")
+    args = parser.parse_args()
+
+    os.environ["ML_ENGINEER_STALL_S"] = str(args.stall_s)
+    os.environ["ML_ENGINEER_PROGRESS_INTERVAL_S"] = "0"
+    asyncio.run(run("watchdog off", False, args))
+    asyncio.run(run("watchdog on", True, args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,153 @@
+"""
+Session throughput of the worker mode with 1 vs. N worker processes.
+
+Queues `--jobs` sessions of a stand-in agent whose model is a pure-Python
+CPU burner (`--cpu-ms` per call, holding the GIL the way orchestration,
+parsing and in-process scripts do), runs them on a `WorkerPool` of each
+size in `--workers`, and reports wall time and sessions per minute. No
+network or API keys are needed.
+
+With `--script-ms`, the stand-in model instead asks for one `run_python`
+call per session, a script burning that much CPU in a child process, so
+the sessions mostly run scripts. Each worker is pinned to its own slice
+of cores, so these scale with the workers too.
+
+With `--kill`, one worker is killed mid-run to show its jobs being
+retried by the others once their lease expires.
+
+Usage (from the repo root):
+
+    python -m benchmarks.worker_scaling
+    python -m benchmarks.worker_scaling --jobs 32 --cpu-ms 500 --workers 1 2 4 8 --kill
+    python -m benchmarks.worker_scaling --jobs 16 --cpu-ms 10 --script-ms 2000
+"""
+import os
+import sys
+import time
+import shutil
+import asyncio
+import argparse
+import tempfile
+
+from google.adk.agents import LlmAgent
+from google.adk.models.base_llm import BaseLlm
+from google.adk.models.llm_response import LlmResponse
+from google.genai import types
+
+
+class _CpuBoundLlm(BaseLlm):
+    """Answers after burning `BENCH_CPU_MS` of CPU time."""
+
+    async def generate_content_async(self, llm_request, stream: bool = False):
+        deadline = time.process_time() + float(os.getenv("BENCH_CPU_MS", "200")) / 1000
+        while time.process_time() < deadline:
+            pass
+        yield LlmResponse(content=types.Content(role="model", parts=[types.Part(text="done")]))
+
+
+class _ScriptLlm(BaseLlm):
+    """Asks for one `run_python` call burning `BENCH_SCRIPT_MS` of CPU, then answers."""
+
+    async def generate_content_async(self, llm_request, stream: bool = False):
+        ran = any(
+            part.function_response
+            for content in llm_request.contents
+            for part in content.parts or []
+        )
+        if ran:
+            yield LlmResponse(content=types.Content(role="model", parts=[types.Part(text="done")]))
+            return
+        code = (
+            "import time\n"
+            f"deadline = time.process_time() + {float(os.getenv('BENCH_SCRIPT_MS', '1000')) / 1000}\n"
+            "while time.process_time() < deadline:\n"
+            "    pass\n"
+        )
+        yield LlmResponse(content=types.Content(role="model", parts=[types.Part(
+            function_call=types.FunctionCall(name="run_python", args={"code": code})
+        )]))
+
+
+# Loaded by the workers as "benchmarks.worker_scaling:root_agent" / ":script_agent".
+root_agent = LlmAgent(name="Bench", model=_CpuBoundLlm(model="cpu-bound"), instruction="Reply.")
+
+
+def _script_agent() -> LlmAgent:
+    from ml_engineer.parallel import SubprocessExecutor
+
+    return LlmAgent(
+        name="BenchScript",
+        model=_ScriptLlm(model="script"),
+        instruction="Run the script.",
+        tools=[SubprocessExecutor().run_python],
+    )
+
+
+def __getattr__(name: str):
+    # Built on first use, so plain runs do not import the executor.
+    if name == "script_agent":
+        return _script_agent()
+    raise AttributeError(name)
+
+
+def run(workers: int, args) -> None:
+    from ml_common import workers as worker_mode
+
+    directory = tempfile.mkdtemp(prefix="ml_workers_bench_")
+    os.environ["ML_WORKER_DIR"] = directory
+    os.environ["ML_WORKER_LEASE_S"] = "3"
+    queue_path = os.path.join(directory, "queue.db")
+    queue = worker_mode.JobQueue(queue_path)
+    app = "benchmarks.worker_scaling:" + ("script_agent" if args.script_ms else "root_agent")
+    jobs = [queue.submit(app, f"task {i}") for i in range(args.jobs)]
+
+    pool = worker_mode.WorkerPool(workers, queue_path=queue_path)
+    started = time.perf_counter()
+    pool.start()
+    killed = False
+    try:
+        while True:
+            counts = queue.counts()
+            if counts.get("done", 0) + counts.get("failed", 0) == args.jobs:
+                break
+            if args.kill and not killed and counts.get("done", 0) >= args.jobs // 4:
+                pool.processes[0].kill()
+                killed = True
+            pool.supervise()
+            time.sleep(0.05)
+    finally:
+        pool.stop()
+    elapsed = time.perf_counter() - started
+
+    async def events_per_job() -> int:
+        return sum([len([e async for e in worker_mode.stream_events(queue, job.id)]) for job in jobs])
+
+    retried = sum(queue.get(job.id).attempts > 1 for job in jobs)
+    print(
+        f"{workers:>2} workers  {elapsed:7.2f} s   {args.jobs / elapsed * 60:7.1f} sessions/min"
+        f"   failed {queue.counts().get('failed', 0)}   retried {retried}"
+        f"   events streamed {asyncio.run(events_per_job())}",
+        file=sys.stderr,
+    )
+    queue.close()
+    shutil.rmtree(directory, ignore_errors=True)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--jobs", type=int, default=16)
+    parser.add_argument("--cpu-ms", type=int, default=200, help="CPU time per model call")
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, len(os.sched_getaffinity(0))])
+    parser.add_argument("--script-ms", type=int, default=0, help="CPU time of one run_python script per session")
+    parser.add_argument("--kill", action="store_true", help="kill one worker mid-run")
+    args = parser.parse_args()
+
+    os.environ["BENCH_CPU_MS"] = str(args.cpu_ms)
+    os.environ["BENCH_SCRIPT_MS"] = str(args.script_ms)
+    print(f"{len(os.sched_getaffinity(0))} cores available", file=sys.stderr)
+    for workers in dict.fromkeys(args.workers):
+        run(workers, args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,80 @@
+import asyncio
+import logging
+from typing import AsyncGenerator, Optional
+
+from google.adk.agents import BaseAgent
+from google.adk.agents.invocation_context import InvocationContext
+from google.adk.events import Event
+
+
+class ConcurrentBranches:
+    """
+    Drives several agents concurrently, each on its own conversation
+    branch, and merges their events into one stream for the parent agent.
+
+    `events()` yields `(name, event)` in arrival order, and `(name, None)`
+    once an agent has finished. Each agent waits until its event was taken
+    (i.e. the runner processed it) before producing the next one, as it
+    would when run on its own. Leaving `events()` early, or `cancel(name)`,
+    cancels the agents still running.
+    """
+
+    def __init__(self, ctx: InvocationContext, runs: dict[str, tuple[BaseAgent, Optional[str]]]) -> None:
+        self.ctx = ctx
+        self.runs = runs
+        self.pending = set(runs)
+        self.tasks: dict[str, asyncio.Task] = {}
+        self._queue: asyncio.Queue = asyncio.Queue()
+        self._done = object()
+
+    async def _drive(self, name: str, agent: BaseAgent, branch: Optional[str]) -> None:
+        agent_ctx = self.ctx.model_copy()
+        agent_ctx.branch = branch
+        agen = agent.run_async(agent_ctx)
+        try:
+            async for event in agen:
+                resume = asyncio.Event()
+                await self._queue.put((name, event, resume))
+                # Wait until the runner has processed the event.
+                await resume.wait()
+        finally:
+            await agen.aclose()
+            await self._queue.put((name, self._done, None))
+
+    def cancel(self, name: str) -> None:
+        """Stop one agent; its remaining events are dropped."""
+        if name in self.tasks:
+            self.tasks[name].cancel()
+        self.pending.discard(name)
+
+    async def events(self) -> AsyncGenerator[tuple[str, Optional[Event]], None]:
+        self.tasks = {
+            name: asyncio.create_task(self._drive(name, agent, branch))
+            for name, (agent, branch) in self.runs.items()
+        }
+        try:
+            while self.pending:
+                name, event, resume = await self._queue.get()
+                if name not in self.pending:
+                    continue  # left over from a cancelled agent
+                if event is self._done:
+                    self.pending.discard(name)
+                    yield name, None
+                    continue
+                yield name, event
+                resume.set()
+        finally:
+            for task in self.tasks.values():
+                task.cancel()
+            await asyncio.gather(*self.tasks.values(), return_exceptions=True)
+
+    def raise_errors(self) -> None:
+        """Log every agent (not cancelled) that failed, and re-raise the first error."""
+        failed = [
+            (name, task.exception()) for name, task in self.tasks.items()
+            if not task.cancelled() and task.exception()
+        ]
+        for name, error in failed:
+            logging.error("[Branches] '%s' failed: %s: %s", name, type(error).__name__, error)
+        if failed:
+            raise failed[0][1]
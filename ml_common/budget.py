@@ -0,0 +1,309 @@
+import os
+import json
+import time
+import logging
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Optional
+
+from google.adk.plugins.base_plugin import BasePlugin
+from google.adk.agents.base_agent import BaseAgent
+from google.adk.agents.callback_context import CallbackContext
+from google.adk.agents.llm_agent import LlmAgent
+from google.adk.events import Event
+from google.adk.models.llm_request import LlmRequest
+from google.adk.models.llm_response import LlmResponse
+from google.genai import types
+
+# USD per 1M tokens: (prompt, completion). Matched by longest model-name prefix.
+DEFAULT_PRICES = {
+    "gemini-2.5-pro": (1.25, 10.00),
+    "gemini-2.5-flash": (0.30, 2.50),
+    "gemini-2.5-flash-lite": (0.10, 0.40),
+    "gemini-2.0-flash": (0.10, 0.40),
+    "gemini-2.0-flash-lite": (0.075, 0.30),
+}
+
+# Stage 1 routes each model to its cheaper sibling.
+DEFAULT_DOWNGRADES = {
+    "gemini-2.5-pro": "gemini-2.5-flash",
+    "gemini-2.5-flash": "gemini-2.5-flash-lite",
+    "gemini-2.0-flash": "gemini-2.0-flash-lite",
+}
+
+# Stage 2 skips these agents; the team still produces a result without them.
+DEFAULT_OPTIONAL_AGENTS = ("KaggleResearchAgent", "MLTeamReporter")
+
+BUDGET_MARKER = "[Budget]"
+
+
+@dataclass
+class Usage:
+    prompt_tokens: int = 0
+    completion_tokens: int = 0
+    cost_usd: float = 0.0
+    model_calls: int = 0
+
+    @property
+    def total_tokens(self) -> int:
+        return self.prompt_tokens + self.completion_tokens
+
+    def add(self, prompt: int, completion: int, cost: float) -> None:
+        self.prompt_tokens += prompt
+        self.completion_tokens += completion
+        self.cost_usd += cost
+        self.model_calls += 1
+
+
+@dataclass
+class SessionBudget:
+    total: Usage = field(default_factory=Usage)
+    per_agent: dict[str, Usage] = field(default_factory=dict)
+    stage: int = 0  # 0 normal, 1 cheaper models, 2 skip optional, 3 halted
+    halt_reported: bool = False
+
+
+class BudgetPlugin(BasePlugin):
+    """
+    Per-session token and cost budget, enforced in steps.
+
+    Prompt and completion tokens are read from `usage_metadata` of every
+    model response and accumulated per session and per agent; cost comes
+    from a per-model price table. As the used fraction of the budget grows:
+
+    - >= `downgrade_at`:      requests are routed to cheaper models,
+    - >= `skip_optional_at`:  optional agents are skipped,
+    - >= 1.0:                 the run is halted with a terminal message
+                              (every LoopAgent is escalated out).
+
+    After each model response a `budget` metrics event is logged and, if
+    an exporter is given, emitted to it (see `ml_common.telemetry`).
+
+    Budgets span every run of a session, so they are kept after a run ends;
+    at most `max_sessions` are held, and the least recently used is dropped.
+    """
+
+    def __init__(
+        self,
+        max_tokens: Optional[int] = None,
+        max_cost_usd: Optional[float] = None,
+        prices: Optional[dict[str, tuple[float, float]]] = None,
+        downgrades: Optional[dict[str, str]] = None,
+        optional_agents: tuple[str, ...] = DEFAULT_OPTIONAL_AGENTS,
+        downgrade_at: float = 0.5,
+        skip_optional_at: float = 0.8,
+        exporter=None,
+        max_sessions: int = 10000,
+    ) -> None:
+        super().__init__(name="budget")
+        self.max_tokens = max_tokens
+        self.max_cost_usd = max_cost_usd
+        self.prices = prices or DEFAULT_PRICES
+        self.downgrades = DEFAULT_DOWNGRADES if downgrades is None else downgrades
+        self.optional_agents = set(optional_agents)
+        self.downgrade_at = downgrade_at
+        self.skip_optional_at = skip_optional_at
+        self.exporter = exporter
+        self.max_sessions = max_sessions
+        self.sessions: OrderedDict[str, SessionBudget] = OrderedDict()
+        self._requested_model: dict[tuple[str, str], str] = {}
+
+    # --- accounting ---------------------------------------------------------
+    def _price(self, model: str) -> tuple[float, float]:
+        matches = [name for name in self.prices if model.startswith(name)]
+        if not matches:
+            return (0.0, 0.0)
+        return self.prices[max(matches, key=len)]
+
+    def used_fraction(self, budget: SessionBudget) -> float:
+        fractions = [0.0]
+        if self.max_tokens:
+            fractions.append(budget.total.total_tokens / self.max_tokens)
+        if self.max_cost_usd:
+            fractions.append(budget.total.cost_usd / self.max_cost_usd)
+        return max(fractions)
+
+    def _stage(self, fraction: float) -> int:
+        if fraction >= 1.0:
+            return 3
+        if fraction >= self.skip_optional_at:
+            return 2
+        if fraction >= self.downgrade_at:
+            return 1
+        return 0
+
+    def _session(self, callback_context: CallbackContext) -> SessionBudget:
+        session_id = callback_context.session.id
+        budget = self.sessions.pop(session_id, None) or SessionBudget()
+        self.sessions[session_id] = budget
+        while len(self.sessions) > self.max_sessions:
+            self.sessions.popitem(last=False)
+        return budget
+
+    def snapshot(self, session_id: str) -> dict:
+        budget = self.sessions.get(session_id, SessionBudget())
+        return {
+            "session_id": session_id,
+            "stage": budget.stage,
+            "used_fraction": round(self.used_fraction(budget), 4),
+            "prompt_tokens": budget.total.prompt_tokens,
+            "completion_tokens": budget.total.completion_tokens,
+            "cost_usd": round(budget.total.cost_usd, 6),
+            "per_agent": {
+                agent: {
+                    "tokens": usage.total_tokens,
+                    "cost_usd": round(usage.cost_usd, 6),
+                    "model_calls": usage.model_calls,
+                }
+                for agent, usage in budget.per_agent.items()
+            },
+        }
+
+    def _halt_message(self, budget: SessionBudget) -> str:
+        return (
+            f"{BUDGET_MARKER} Session budget exhausted "
+            f"({budget.total.total_tokens} tokens, ${budget.total.cost_usd:.4f}). "
+            "Halting this run; no further model calls will be made."
+        )
+
+    # --- enforcement --------------------------------------------------------
+    async def before_agent_callback(
+        self, *, agent: BaseAgent, callback_context: CallbackContext
+    ) -> Optional[types.Content]:
+        if not isinstance(agent, LlmAgent):
+            return None
+        budget = self._session(callback_context)
+        if budget.stage >= 3:
+            return types.Content(
+                role="model", parts=[types.Part(text=self._halt_message(budget))]
+            )
+        if budget.stage >= 2 and agent.name in self.optional_agents:
+            logging.info("%s Skipping optional agent '%s'", BUDGET_MARKER, agent.name)
+            return types.Content(
+                role="model",
+                parts=[types.Part(text=f"{BUDGET_MARKER} Skipped '{agent.name}' to stay within budget.")],
+            )
+        return None
+
+    async def before_model_callback(
+        self, *, callback_context: CallbackContext, llm_request: LlmRequest
+    ) -> Optional[LlmResponse]:
+        budget = self._session(callback_context)
+        if budget.stage >= 3:
+            return LlmResponse(
+                content=types.Content(
+                    role="model", parts=[types.Part(text=self._halt_message(budget))]
+                )
+            )
+
+        if budget.stage >= 1 and llm_request.model in self.downgrades:
+            cheaper = self.downgrades[llm_request.model]
+            logging.info(
+                "%s Routing '%s' from %s to %s",
+                BUDGET_MARKER, callback_context.agent_name, llm_request.model, cheaper,
+            )
+            llm_request.model = cheaper
+
+        key = (callback_context.invocation_id, callback_context.agent_name)
+        self._requested_model[key] = llm_request.model or ""
+        return None
+
+    async def after_model_callback(
+        self, *, callback_context: CallbackContext, llm_response: LlmResponse
+    ) -> Optional[LlmResponse]:
+        usage = llm_response.usage_metadata
+        if llm_response.partial or usage is None:
+            return None
+
+        key = (callback_context.invocation_id, callback_context.agent_name)
+        model = self._requested_model.pop(key, None) or llm_response.model_version or ""
+        prompt = usage.prompt_token_count or 0
+        # Thinking tokens are billed as output tokens.
+        completion = (usage.candidates_token_count or 0) + (usage.thoughts_token_count or 0)
+        prompt_price, completion_price = self._price(model)
+        cost = (prompt * prompt_price + completion * completion_price) / 1e6
+
+        budget = self._session(callback_context)
+        budget.total.add(prompt, completion, cost)
+        budget.per_agent.setdefault(callback_context.agent_name, Usage()).add(
+            prompt, completion, cost
+        )
+
+        stage = self._stage(self.used_fraction(budget))
+        if stage > budget.stage:
+            logging.warning(
+                "%s Session %s at %.0f%% of budget -> stage %d",
+                BUDGET_MARKER, callback_context.session.id,
+                self.used_fraction(budget) * 100, stage,
+            )
+            budget.stage = stage
+
+        metrics = self.snapshot(callback_context.session.id)
+        logging.info(
+            "%s session=%s stage=%d used=%.1f%% tokens=%d cost=$%.4f",
+            BUDGET_MARKER, metrics["session_id"], metrics["stage"],
+            metrics["used_fraction"] * 100,
+            metrics["prompt_tokens"] + metrics["completion_tokens"], metrics["cost_usd"],
+        )
+        if self.exporter is not None:
+            self.exporter.emit({
+                "ts": time.time(),
+                "kind": "budget",
+                "session_id": metrics["session_id"],
+                "agent": callback_context.agent_name,
+                "name": model,
+                "duration_ms": None,
+                **{k: v for k, v in metrics.items() if k != "session_id"},
+            })
+        return None
+
+    async def on_event_callback(
+        self, *, invocation_context, event: Event
+    ) -> Optional[Event]:
+        budget = self.sessions.get(invocation_context.session.id)
+        if budget is None or budget.stage < 3:
+            return None
+
+        # Loop agents check `escalate` after the runner has seen the event,
+        # so flagging it here stops every enclosing loop.
+        event.actions.escalate = True
+
+        if not budget.halt_reported and not event.partial:
+            budget.halt_reported = True
+            message = types.Part(text=self._halt_message(budget))
+            content = event.content or types.Content(role="model", parts=[])
+            return event.model_copy(update={
+                "content": content.model_copy(update={"parts": [*(content.parts or []), message]}),
+            })
+        return None
+
+
+def get_budget_plugin(exporter=None) -> Optional[BudgetPlugin]:
+    """
+    Build a `BudgetPlugin` from the environment, or return None if neither
+    ML_BUDGET_MAX_TOKENS nor ML_BUDGET_MAX_COST_USD is set.
+
+    ML_BUDGET_PRICES may hold a JSON object overriding the price table,
+    e.g. {"gemini-2.5-flash": [0.30, 2.50]} (USD per 1M prompt/completion tokens).
+    """
+    max_tokens = os.getenv("ML_BUDGET_MAX_TOKENS")
+    max_cost = os.getenv("ML_BUDGET_MAX_COST_USD")
+    if not max_tokens and not max_cost:
+        return None
+
+    prices = dict(DEFAULT_PRICES)
+    if os.getenv("ML_BUDGET_PRICES"):
+        prices.update({
+            model: tuple(price)
+            for model, price in json.loads(os.environ["ML_BUDGET_PRICES"]).items()
+        })
+
+    return BudgetPlugin(
+        max_tokens=int(max_tokens) if max_tokens else None,
+        max_cost_usd=float(max_cost) if max_cost else None,
+        prices=prices,
+        downgrade_at=float(os.getenv("ML_BUDGET_DOWNGRADE_AT", "0.5")),
+        skip_optional_at=float(os.getenv("ML_BUDGET_SKIP_OPTIONAL_AT", "0.8")),
+        exporter=exporter,
+        max_sessions=int(os.getenv("ML_BUDGET_MAX_SESSIONS", "10000")),
+    )
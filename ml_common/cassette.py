@@ -0,0 +1,407 @@
+import os
+import gzip
+import atexit
+import json
+import time
+import asyncio
+import hashlib
+import logging
+from collections import defaultdict, deque
+from typing import Any, Callable, Optional
+
+from google.adk.plugins.base_plugin import BasePlugin
+from google.adk.agents.callback_context import CallbackContext
+from google.adk.agents.readonly_context import ReadonlyContext
+from google.adk.models.llm_request import LlmRequest
+from google.adk.models.llm_response import LlmResponse
+from google.adk.tools.base_tool import BaseTool
+from google.adk.tools.base_toolset import BaseToolset
+from google.adk.tools.tool_context import ToolContext
+from google.genai import types
+
+CASSETTE_VERSION = 1
+
+# Tool side effects that steer the orchestration (e.g. `exit_loop` sets
+# `escalate`); replayed together with the tool result.
+REPLAYED_ACTIONS = ("escalate", "transfer_to_agent", "skip_summarization", "state_delta")
+
+
+class CassetteMissError(RuntimeError):
+    """A strict replay met a request that is not in the cassette."""
+
+
+# --- Request hashing --------------------------------------------------------
+def _digest(payload: Any) -> str:
+    data = json.dumps(payload, sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.sha256(data.encode()).hexdigest()[:32]
+
+
+def _strip_call_ids(content: dict) -> dict:
+    # ADK gives every function call a fresh random id; it must not
+    # change the hash of an otherwise identical request.
+    for part in content.get("parts", []):
+        for field in ("function_call", "function_response"):
+            if field in part:
+                part[field].pop("id", None)
+    return content
+
+
+def model_request_key(agent_name: str, llm_request: LlmRequest) -> str:
+    """
+    Hash of what the model sees: agent, system instruction, available tools
+    and conversation. The model name is left out, so a request rerouted to
+    another model (see `ml_common.budget`) still matches its recording.
+    """
+    config = llm_request.config
+    instruction = config.system_instruction if config else None
+    if isinstance(instruction, types.Content):
+        instruction = instruction.model_dump(mode="json", exclude_none=True)
+    return _digest({
+        "agent": agent_name,
+        "instruction": instruction,
+        "tools": sorted(llm_request.tools_dict),
+        "contents": [
+            _strip_call_ids(c.model_dump(mode="json", exclude_none=True))
+            for c in llm_request.contents
+        ],
+    })
+
+
+def tool_call_key(agent_name: str, tool_name: str, tool_args: dict) -> str:
+    return _digest({"agent": agent_name, "tool": tool_name, "args": tool_args})
+
+
+# --- Cassette file ----------------------------------------------------------
+def _open(path: str, mode: str):
+    if path.endswith(".gz"):
+        return gzip.open(path, mode + "t", encoding="utf-8")
+    return open(path, mode, encoding="utf-8")
+
+
+class CassetteWriter:
+    """
+    Appends cassette entries as compact JSON lines. With a `.gz` path each
+    entry is its own gzip member (readers see concatenated members as one
+    stream), so every written entry is complete on disk even if the
+    process dies without `close()`.
+
+    The file is opened for appending and each entry is a single `write()`,
+    so several writers (the runners of one process, worker processes) can
+    share a path. The header is only written to a new file; delete the
+    file to record from scratch.
+    """
+
+    def __init__(self, path: str) -> None:
+        self.path = path
+        self.entries = 0
+        self._fd: Optional[int] = os.open(path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+        atexit.register(self.close)
+        if os.fstat(self._fd).st_size == 0:
+            self.write({"type": "header", "version": CASSETTE_VERSION, "created_at": time.time()})
+
+    def write(self, entry: dict) -> None:
+        data = (json.dumps(entry, separators=(",", ":"), default=str) + "\n").encode()
+        if self.path.endswith(".gz"):
+            data = gzip.compress(data)
+        os.write(self._fd, data)
+        self.entries += 1
+
+    def close(self) -> None:
+        if self._fd is not None:
+            os.close(self._fd)
+            self._fd = None
+            atexit.unregister(self.close)
+
+
+class Cassette:
+    """
+    A recorded session, indexed for replay.
+
+    Model and tool entries are queued per request key in recording order;
+    `next()` pops the oldest unserved entry for a key, so repeated identical
+    requests get their responses back in the order they were recorded.
+    """
+
+    def __init__(self, entries: list[dict]) -> None:
+        self._queues: dict[tuple[str, str], deque] = defaultdict(deque)
+        self._declarations: dict[str, dict[str, dict]] = defaultdict(dict)
+        for entry in entries:
+            if entry["type"] in ("model", "tool"):
+                self._queues[(entry["type"], entry["key"])].append(entry)
+            elif entry["type"] == "declarations":
+                for declaration in entry["declarations"]:
+                    self._declarations[entry["agent"]][declaration["name"]] = declaration
+
+    @classmethod
+    def load(cls, path: str) -> "Cassette":
+        with _open(path, "r") as f:
+            entries = [json.loads(line) for line in f if line.strip()]
+        if not entries or entries[0].get("type") != "header":
+            raise ValueError(f"{path} is not a cassette file")
+        if entries[0]["version"] != CASSETTE_VERSION:
+            raise ValueError(
+                f"{path}: unsupported cassette version {entries[0]['version']}"
+            )
+        return cls(entries)
+
+    def next(self, kind: str, key: str) -> Optional[dict]:
+        queue = self._queues.get((kind, key))
+        return queue.popleft() if queue else None
+
+    def remaining(self) -> int:
+        return sum(len(q) for q in self._queues.values())
+
+    def declarations(self, agent_name: str) -> list[types.FunctionDeclaration]:
+        return [
+            types.FunctionDeclaration.model_validate(d)
+            for d in self._declarations.get(agent_name, {}).values()
+        ]
+
+
+# --- Recording --------------------------------------------------------------
+class CassetteRecordPlugin(BasePlugin):
+    """
+    Records every model request/response and tool input/output of the
+    runner's sessions into a cassette file.
+
+    Each entry stores the request hash, the response (or tool result and
+    its `REPLAYED_ACTIONS`) and the observed latency. Function declarations
+    seen by each agent are stored too, so toolsets that need the network
+    (Kaggle MCP) can be stood in for on replay (see `replayable_toolset`).
+    """
+
+    def __init__(self, path: str) -> None:
+        super().__init__(name="cassette_record")
+        self.writer = CassetteWriter(path)
+        self._pending: dict[Any, tuple[str, float]] = {}
+        self._declared: set[tuple[str, str]] = set()
+
+    def _record_declarations(self, agent_name: str, llm_request: LlmRequest) -> None:
+        tools = (llm_request.config.tools if llm_request.config else None) or []
+        declarations = [
+            d.model_dump(mode="json", exclude_none=True)
+            for tool in tools
+            if isinstance(tool, types.Tool)
+            for d in tool.function_declarations or []
+            if (agent_name, d.name) not in self._declared
+        ]
+        if declarations:
+            self._declared.update((agent_name, d["name"]) for d in declarations)
+            self.writer.write({
+                "type": "declarations", "agent": agent_name, "declarations": declarations,
+            })
+
+    async def before_model_callback(
+        self, *, callback_context: CallbackContext, llm_request: LlmRequest
+    ) -> None:
+        agent = callback_context.agent_name
+        self._record_declarations(agent, llm_request)
+        self._pending[("model", callback_context.invocation_id, agent)] = (
+            model_request_key(agent, llm_request),
+            time.perf_counter(),
+        )
+
+    async def after_model_callback(
+        self, *, callback_context: CallbackContext, llm_response: LlmResponse
+    ) -> None:
+        if llm_response.partial:
+            return None
+        pending = self._pending.pop(
+            ("model", callback_context.invocation_id, callback_context.agent_name), None
+        )
+        if pending is None:
+            return None
+        key, started = pending
+        self.writer.write({
+            "type": "model",
+            "key": key,
+            "agent": callback_context.agent_name,
+            "latency_s": round(time.perf_counter() - started, 4),
+            "response": llm_response.model_dump(mode="json", exclude_none=True),
+        })
+
+    async def before_tool_callback(
+        self, *, tool: BaseTool, tool_args: dict[str, Any], tool_context: ToolContext
+    ) -> None:
+        self._pending[("tool", tool_context.function_call_id)] = (
+            tool_call_key(tool_context.agent_name, tool.name, tool_args),
+            time.perf_counter(),
+        )
+
+    async def after_tool_callback(
+        self,
+        *,
+        tool: BaseTool,
+        tool_args: dict[str, Any],
+        tool_context: ToolContext,
+        result: Any,
+    ) -> None:
+        pending = self._pending.pop(("tool", tool_context.function_call_id), None)
+        if pending is None:
+            return None
+        key, started = pending
+        actions = tool_context.actions.model_dump(
+            mode="json", exclude_none=True, include=set(REPLAYED_ACTIONS)
+        )
+        self.writer.write({
+            "type": "tool",
+            "key": key,
+            "agent": tool_context.agent_name,
+            "name": tool.name,
+            "latency_s": round(time.perf_counter() - started, 4),
+            "result": result,
+            "actions": {k: v for k, v in actions.items() if v},
+        })
+
+    async def close(self) -> None:
+        self.writer.close()
+        logging.info(
+            "[Cassette] Recorded %d entries to %s", self.writer.entries, self.writer.path
+        )
+
+
+# --- Replay -----------------------------------------------------------------
+class CassetteReplayPlugin(BasePlugin):
+    """
+    Serves model responses and tool results from a cassette instead of
+    calling Gemini or running the tool.
+
+    Requests are matched by hash. Recorded latencies are replayed scaled by
+    `latency_scale` (1.0 keeps them, 0.1 compresses 10x, 0 drops them).
+    On a miss, a `strict` replay raises `CassetteMissError`; otherwise the
+    call goes through live.
+    """
+
+    def __init__(self, cassette: Cassette, latency_scale: float = 0.0, strict: bool = True) -> None:
+        super().__init__(name="cassette_replay")
+        self.cassette = cassette
+        self.latency_scale = latency_scale
+        self.strict = strict
+        self.hits = 0
+        self.misses = 0
+
+    async def _serve(self, kind: str, key: str, what: str) -> Optional[dict]:
+        entry = self.cassette.next(kind, key)
+        if entry is None:
+            self.misses += 1
+            if self.strict:
+                raise CassetteMissError(f"No recorded {kind} response for {what} (key {key})")
+            logging.warning("[Cassette] Miss for %s; calling it live", what)
+            return None
+        self.hits += 1
+        if self.latency_scale > 0:
+            await asyncio.sleep(entry["latency_s"] * self.latency_scale)
+        return entry
+
+    async def before_model_callback(
+        self, *, callback_context: CallbackContext, llm_request: LlmRequest
+    ) -> Optional[LlmResponse]:
+        agent = callback_context.agent_name
+        entry = await self._serve(
+            "model", model_request_key(agent, llm_request), f"model call of '{agent}'"
+        )
+        if entry is None:
+            return None
+        return LlmResponse.model_validate(entry["response"])
+
+    async def before_tool_callback(
+        self, *, tool: BaseTool, tool_args: dict[str, Any], tool_context: ToolContext
+    ) -> Optional[Any]:
+        key = tool_call_key(tool_context.agent_name, tool.name, tool_args)
+        entry = await self._serve("tool", key, f"tool '{tool.name}' of '{tool_context.agent_name}'")
+        if entry is None:
+            return None
+
+        for name, value in entry["actions"].items():
+            if name == "state_delta":
+                for state_key, state_value in value.items():
+                    tool_context.state[state_key] = state_value
+            else:
+                setattr(tool_context.actions, name, value)
+        # A `None` result would be taken as "no override" and run the tool.
+        return entry["result"] if entry["result"] is not None else {"result": None}
+
+    async def close(self) -> None:
+        logging.info(
+            "[Cassette] Replay done: %d hits, %d misses, %d recorded entries unused",
+            self.hits, self.misses, self.cassette.remaining(),
+        )
+
+
+# --- Stand-in toolsets ------------------------------------------------------
+class CassetteTool(BaseTool):
+    """A tool known only by its recorded declaration; replay serves its results."""
+
+    def __init__(self, declaration: types.FunctionDeclaration) -> None:
+        super().__init__(name=declaration.name, description=declaration.description or "")
+        self._declaration = declaration
+
+    def _get_declaration(self) -> Optional[types.FunctionDeclaration]:
+        return self._declaration
+
+    async def run_async(self, *, args: dict[str, Any], tool_context: ToolContext) -> Any:
+        raise CassetteMissError(
+            f"Tool '{self.name}' only exists in the cassette and this call was not recorded"
+        )
+
+
+class CassetteToolset(BaseToolset):
+    """The tools an agent declared while recording, as `CassetteTool`s."""
+
+    def __init__(self, cassette: Cassette, agent_name: str) -> None:
+        super().__init__()
+        self._tools = [CassetteTool(d) for d in cassette.declarations(agent_name)]
+
+    async def get_tools(
+        self, readonly_context: Optional[ReadonlyContext] = None
+    ) -> list[BaseTool]:
+        return self._tools
+
+    async def close(self) -> None:
+        pass
+
+
+def replayable_toolset(
+    factory: Callable[[], BaseToolset], agent_name: str
+) -> Callable[[], BaseToolset]:
+    """
+    Wrap a toolset factory (for `LazyToolset`) so that, when replaying a
+    cassette, the agent gets stand-ins built from the recorded declarations
+    instead of the live toolset (e.g. no MCP server is started).
+
+    Use it for an agent whose only function tools come from this toolset.
+    """
+    def build() -> BaseToolset:
+        path = os.getenv("ML_CASSETTE_REPLAY")
+        if path:
+            return CassetteToolset(Cassette.load(path), agent_name)
+        return factory()
+
+    return build
+
+
+def get_cassette_plugin() -> Optional[BasePlugin]:
+    """
+    Build a record or replay plugin from the environment, or return None.
+
+    ML_CASSETTE_RECORD         record sessions into this file (.jsonl or .jsonl.gz)
+    ML_CASSETTE_REPLAY         replay sessions from this file, with no model calls
+    ML_CASSETTE_LATENCY_SCALE  replayed latency = recorded x scale (default 0)
+    ML_CASSETTE_STRICT         "0" to call unmatched requests live (default "1")
+    """
+    record_path = os.getenv("ML_CASSETTE_RECORD")
+    replay_path = os.getenv("ML_CASSETTE_REPLAY")
+    if record_path and replay_path:
+        raise ValueError("Set only one of ML_CASSETTE_RECORD and ML_CASSETTE_REPLAY")
+
+    if record_path:
+        logging.info("[Cassette] Recording to %s", record_path)
+        return CassetteRecordPlugin(record_path)
+    if replay_path:
+        logging.info("[Cassette] Replaying from %s", replay_path)
+        return CassetteReplayPlugin(
+            Cassette.load(replay_path),
+            latency_scale=float(os.getenv("ML_CASSETTE_LATENCY_SCALE", "0")),
+            strict=os.getenv("ML_CASSETTE_STRICT", "1") != "0",
+        )
+    return None
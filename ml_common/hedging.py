@@ -0,0 +1,353 @@
+import os
+import asyncio
+import fnmatch
+import logging
+from collections import defaultdict, deque
+from typing import Any, AsyncGenerator, Awaitable, Callable, Optional, TypeVar, Union
+
+from google.adk.agents import BaseAgent, LlmAgent
+from google.adk.agents.readonly_context import ReadonlyContext
+from google.adk.models.base_llm import BaseLlm
+from google.adk.models.llm_request import LlmRequest
+from google.adk.models.llm_response import LlmResponse
+from google.adk.models.registry import LLMRegistry
+from google.adk.tools.base_tool import BaseTool
+from google.adk.tools.base_toolset import BaseToolset
+from google.adk.tools.tool_context import ToolContext
+from pydantic import ConfigDict
+
+T = TypeVar("T")
+
+
+class DeadlineExceeded(TimeoutError):
+    pass
+
+
+# --- Latency tracking / hedge budget ----------------------------------------
+class LatencyTracker:
+    """Recent latencies per call key ("model:<agent>", "tool:<name>")."""
+
+    def __init__(self, window: int = 200, min_samples: int = 20) -> None:
+        self.min_samples = min_samples
+        self._samples: dict[str, deque] = defaultdict(lambda: deque(maxlen=window))
+
+    def observe(self, key: str, latency_s: float) -> None:
+        self._samples[key].append(latency_s)
+
+    def quantile(self, key: str, q: float) -> Optional[float]:
+        """The `q` quantile of recent latencies, or None until `min_samples`."""
+        samples = self._samples.get(key)
+        if not samples or len(samples) < self.min_samples:
+            return None
+        ordered = sorted(samples)
+        return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+class HedgeBudget:
+    """
+    Token bucket capping hedges at `ratio` of all calls: every call earns
+    `ratio` tokens (up to `burst`), every hedge spends one. A latency spike
+    across the board therefore cannot double the load.
+    """
+
+    def __init__(self, ratio: float, burst: float = 5.0) -> None:
+        self.ratio = ratio
+        self.burst = burst
+        self._tokens = burst if ratio > 0 else 0.0
+
+    def earn(self) -> None:
+        self._tokens = min(self.burst, self._tokens + self.ratio)
+
+    def try_spend(self) -> bool:
+        if self._tokens >= 1.0:
+            self._tokens -= 1.0
+            return True
+        return False
+
+
+# --- Policy -----------------------------------------------------------------
+def _parse_deadlines(spec: str) -> dict[str, float]:
+    deadlines = {}
+    for item in filter(None, (part.strip() for part in spec.split(","))):
+        name, _, seconds = item.partition("=")
+        deadlines[name.strip()] = float(seconds)
+    return deadlines
+
+
+class CallPolicy:
+    """
+    Deadlines and hedging for model and tool calls.
+
+    - Every call gets a deadline: `deadlines[name]` (agent name for model
+      calls, tool name for tool calls) or the model / tool default.
+    - An idempotent call still pending after the `quantile` of its recent
+      latencies gets one duplicate request, if `budget` allows. The first
+      successful response wins and the other request is cancelled. Model
+      calls are idempotent; toolset tools only when their name matches one
+      of the `idempotent_tools` patterns (read-only tools: a duplicated
+      write would happen twice).
+    """
+
+    def __init__(
+        self,
+        model_deadline_s: Optional[float] = 180.0,
+        tool_deadline_s: Optional[float] = 90.0,
+        deadlines: Optional[dict[str, float]] = None,
+        hedge_budget: float = 0.05,
+        quantile: float = 0.95,
+        min_samples: int = 20,
+        idempotent_tools: tuple[str, ...] = (),
+    ) -> None:
+        self.model_deadline_s = model_deadline_s
+        self.tool_deadline_s = tool_deadline_s
+        self.deadlines = deadlines or {}
+        self.idempotent_tools = idempotent_tools
+        self.quantile = quantile
+        self.tracker = LatencyTracker(min_samples=min_samples)
+        self.budget = HedgeBudget(hedge_budget)
+        self.stats = {"calls": 0, "hedged": 0, "hedge_wins": 0, "deadline_exceeded": 0}
+
+    def deadline_for(self, name: str, default: Optional[float]) -> Optional[float]:
+        deadline = self.deadlines.get(name, default)
+        return deadline or None
+
+    def is_idempotent_tool(self, name: str) -> bool:
+        return any(fnmatch.fnmatchcase(name, pattern) for pattern in self.idempotent_tools)
+
+    async def call(
+        self,
+        key: str,
+        make_call: Callable[[], Awaitable[T]],
+        deadline_s: Optional[float],
+        idempotent: bool,
+    ) -> T:
+        """Run `make_call()` under the deadline, hedging it if allowed."""
+        loop = asyncio.get_running_loop()
+        started = loop.time()
+        deadline = started + deadline_s if deadline_s else None
+        hedge_at = None
+        if idempotent and self.budget.ratio > 0:
+            delay = self.tracker.quantile(key, self.quantile)
+            hedge_at = started + delay if delay is not None else None
+        self.stats["calls"] += 1
+        self.budget.earn()
+
+        attempts: dict[asyncio.Future, float] = {asyncio.ensure_future(make_call()): started}
+        hedge = None
+        error: Optional[BaseException] = None
+        try:
+            while attempts:
+                wake_at = min(t for t in (deadline, hedge_at) if t is not None) if (deadline or hedge_at) else None
+                timeout = max(0.0, wake_at - loop.time()) if wake_at is not None else None
+                done, _ = await asyncio.wait(attempts, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+
+                for task in done:
+                    attempt_started = attempts.pop(task)
+                    if task.exception() is None:
+                        self.tracker.observe(key, loop.time() - attempt_started)
+                        if task is hedge:
+                            self.stats["hedge_wins"] += 1
+                        return task.result()
+                    error = task.exception()
+                if done:
+                    continue
+
+                now = loop.time()
+                if deadline is not None and now >= deadline:
+                    self.stats["deadline_exceeded"] += 1
+                    raise DeadlineExceeded(f"{key} exceeded its {deadline_s:g}s deadline")
+                if hedge_at is not None and now >= hedge_at:
+                    hedge_at = None  # at most one hedge per call
+                    if self.budget.try_spend():
+                        self.stats["hedged"] += 1
+                        logging.info("[Hedging] %s still pending after %.2fs; sending a hedge", key, now - started)
+                        hedge = asyncio.ensure_future(make_call())
+                        attempts[hedge] = now
+            raise error
+        finally:
+            for task in attempts:
+                task.cancel()
+            if attempts:
+                await asyncio.gather(*attempts, return_exceptions=True)
+
+
+# --- Models -----------------------------------------------------------------
+class HedgedLlm(BaseLlm):
+    """
+    Wraps a model so each request runs under a `CallPolicy`.
+
+    Non-streaming requests are deadline-bound and hedged; streaming ones
+    only get the deadline. A request past its deadline returns an
+    LlmResponse with error_code "DEADLINE_EXCEEDED" instead of hanging the
+    agent.
+    """
+
+    model_config = ConfigDict(arbitrary_types_allowed=True)
+
+    inner: BaseLlm
+    policy: Any
+    agent_name: str
+    idempotent: bool = True
+
+    async def generate_content_async(
+        self, llm_request: LlmRequest, stream: bool = False
+    ) -> AsyncGenerator[LlmResponse, None]:
+        deadline_s = self.policy.deadline_for(self.agent_name, self.policy.model_deadline_s)
+        key = f"model:{self.agent_name}"
+        try:
+            if stream:
+                async with asyncio.timeout(deadline_s):
+                    async for response in self.inner.generate_content_async(llm_request, stream=True):
+                        yield response
+                return
+
+            async def attempt() -> list[LlmResponse]:
+                # Each attempt gets its own copy: models may edit the request.
+                request = llm_request.model_copy(deep=True)
+                return [r async for r in self.inner.generate_content_async(request, stream=False)]
+
+            for response in await self.policy.call(key, attempt, deadline_s, self.idempotent):
+                yield response
+        except (DeadlineExceeded, TimeoutError):
+            logging.warning("[Hedging] %s exceeded its %ss deadline", key, deadline_s)
+            yield LlmResponse(
+                error_code="DEADLINE_EXCEEDED",
+                error_message=f"The model call did not finish within {deadline_s:g}s.",
+            )
+
+    def connect(self, llm_request: LlmRequest):
+        return self.inner.connect(llm_request)
+
+
+# --- Tools ------------------------------------------------------------------
+class HedgedTool(BaseTool):
+    """A tool whose calls run under a `CallPolicy`; errors come back as results."""
+
+    def __init__(self, tool: BaseTool, policy: CallPolicy, idempotent: bool) -> None:
+        super().__init__(
+            name=tool.name,
+            description=tool.description,
+            is_long_running=tool.is_long_running,
+            custom_metadata=tool.custom_metadata,
+        )
+        self.tool = tool
+        self.policy = policy
+        self.idempotent = idempotent
+
+    def _get_declaration(self):
+        return self.tool._get_declaration()
+
+    async def run_async(self, *, args: dict[str, Any], tool_context: ToolContext) -> Any:
+        deadline_s = self.policy.deadline_for(self.name, self.policy.tool_deadline_s)
+        try:
+            return await self.policy.call(
+                f"tool:{self.name}",
+                lambda: self.tool.run_async(args=args, tool_context=tool_context),
+                deadline_s,
+                self.idempotent,
+            )
+        except DeadlineExceeded as e:
+            logging.warning("[Hedging] %s", e)
+            return {"error": f"DeadlineExceeded: {self.name} did not finish within {deadline_s:g}s."}
+
+
+class HedgedToolset(BaseToolset):
+    """
+    Toolset whose tools are wrapped in `HedgedTool`. Every tool gets the
+    deadline; only those `idempotent` allows (a flag, or a predicate on
+    the tool name) are hedged.
+    """
+
+    def __init__(
+        self,
+        toolset: BaseToolset,
+        policy: CallPolicy,
+        idempotent: Union[bool, Callable[[str], bool]] = False,
+    ) -> None:
+        super().__init__()
+        self.toolset = toolset
+        self.policy = policy
+        self.idempotent = idempotent
+
+    async def get_tools(
+        self, readonly_context: Optional[ReadonlyContext] = None
+    ) -> list[BaseTool]:
+        tools = await self.toolset.get_tools_with_prefix(readonly_context)
+        return [
+            HedgedTool(
+                tool,
+                self.policy,
+                self.idempotent(tool.name) if callable(self.idempotent) else self.idempotent,
+            )
+            for tool in tools
+        ]
+
+    async def close(self) -> None:
+        await self.toolset.close()
+
+
+# --- Wiring -----------------------------------------------------------------
+_policy: Optional[CallPolicy] = None
+
+
+def get_call_policy() -> Optional[CallPolicy]:
+    """
+    The process-wide call policy, built from the environment on first use.
+
+    ML_MODEL_DEADLINE_S    default deadline per model call (default 180)
+    ML_TOOL_DEADLINE_S     default deadline per toolset tool call (default 90)
+    ML_DEADLINES           per agent / tool overrides, e.g. "ResearchBrain=60,search_datasets=20"
+    ML_HEDGE_BUDGET        max fraction of calls that may be hedged (default 0.05, 0 disables)
+    ML_HEDGE_QUANTILE      latency quantile after which a call is hedged (default 0.95)
+    ML_HEDGE_MIN_SAMPLES   latencies observed per key before hedging starts (default 20)
+    ML_HEDGE_TOOLS         toolset tools that are read-only and may be hedged, as
+                           name patterns (default "search_*,list_*,get_*,describe_*")
+    ML_CALL_POLICY         "off" disables deadlines and hedging entirely
+    """
+    global _policy
+    if os.getenv("ML_CALL_POLICY", "on").lower() in ("0", "off", "false"):
+        return None
+    if _policy is None:
+        _policy = CallPolicy(
+            model_deadline_s=float(os.getenv("ML_MODEL_DEADLINE_S", "180")),
+            tool_deadline_s=float(os.getenv("ML_TOOL_DEADLINE_S", "90")),
+            deadlines=_parse_deadlines(os.getenv("ML_DEADLINES", "")),
+            hedge_budget=float(os.getenv("ML_HEDGE_BUDGET", "0.05")),
+            quantile=float(os.getenv("ML_HEDGE_QUANTILE", "0.95")),
+            min_samples=int(os.getenv("ML_HEDGE_MIN_SAMPLES", "20")),
+            idempotent_tools=tuple(
+                pattern.strip()
+                for pattern in os.getenv("ML_HEDGE_TOOLS", "search_*,list_*,get_*,describe_*").split(",")
+                if pattern.strip()
+            ),
+        )
+    return _policy
+
+
+def apply_call_policy(agent: BaseAgent, policy: Optional[CallPolicy] = None) -> BaseAgent:
+    """
+    Put every LLM agent under `agent` behind the call policy: its model
+    becomes a `HedgedLlm` and its toolsets (MCP) `HedgedToolset`s, which
+    hedge only the read-only tools `policy.idempotent_tools` names. Plain
+    function tools are left alone, since they are neither cancellable nor
+    idempotent (`run_python` has its own deadline in the subprocess
+    executor). Agents that are already wrapped are skipped, so shared
+    sub-agents can be wrapped by several apps.
+    """
+    policy = policy or get_call_policy()
+    if policy is None:
+        return agent
+
+    if isinstance(agent, LlmAgent):
+        if agent.model and not isinstance(agent.model, HedgedLlm):
+            inner = agent.model if isinstance(agent.model, BaseLlm) else LLMRegistry.new_llm(agent.model)
+            agent.model = HedgedLlm(model=inner.model, inner=inner, policy=policy, agent_name=agent.name)
+        agent.tools = [
+            HedgedToolset(tool, policy, idempotent=policy.is_idempotent_tool)
+            if isinstance(tool, BaseToolset) and not isinstance(tool, HedgedToolset)
+            else tool
+            for tool in agent.tools
+        ]
+    for sub_agent in agent.sub_agents:
+        apply_call_policy(sub_agent, policy)
+    return agent
@@ -0,0 +1,35 @@
+from typing import Callable, Optional
+
+from google.adk.agents.readonly_context import ReadonlyContext
+from google.adk.tools.base_tool import BaseTool
+from google.adk.tools.base_toolset import BaseToolset
+
+
+class LazyToolset(BaseToolset):
+    """
+    Toolset that builds the real toolset on first use.
+
+    `factory` is called the first time an agent asks for tools, so the
+    underlying SDK (e.g. the MCP client) is imported and configured only
+    when the agent actually runs, not when its module is imported.
+    """
+
+    def __init__(self, factory: Callable[[], BaseToolset]) -> None:
+        super().__init__()
+        self._factory = factory
+        self._toolset: Optional[BaseToolset] = None
+
+    @property
+    def toolset(self) -> BaseToolset:
+        if self._toolset is None:
+            self._toolset = self._factory()
+        return self._toolset
+
+    async def get_tools(
+        self, readonly_context: Optional[ReadonlyContext] = None
+    ) -> list[BaseTool]:
+        return await self.toolset.get_tools_with_prefix(readonly_context)
+
+    async def close(self) -> None:
+        if self._toolset is not None:
+            await self._toolset.close()
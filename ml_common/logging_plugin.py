@@ -0,0 +1,327 @@
+import os
+import queue
+import atexit
+import random
+import logging
+import reprlib
+import logging.handlers
+from typing import Any, Optional
+
+from google.adk.plugins.base_plugin import BasePlugin
+from google.adk.agents.base_agent import BaseAgent
+from google.adk.agents.callback_context import CallbackContext
+from google.adk.events import Event
+from google.adk.models.llm_request import LlmRequest
+from google.adk.models.llm_response import LlmResponse
+from google.adk.tools.base_tool import BaseTool
+from google.adk.tools.tool_context import ToolContext
+from google.genai import types
+
+LOG_FORMAT = "%(asctime)s | %(levelname)s | %(name)s | %(message)s"
+
+logger = logging.getLogger("ml_copilot.adk")
+
+
+# --- Payload truncation -----------------------------------------------------
+def _clip(text: str, max_chars: int) -> str:
+    if len(text) <= max_chars:
+        return text
+    return f"{text[:max_chars]}... [{len(text) - max_chars} more chars]"
+
+
+def _repr_limits(max_chars: int) -> reprlib.Repr:
+    # Bounded repr: long strings (STDOUT blobs, research notes) are cut
+    # while being rendered, not after the whole payload was stringified.
+    r = reprlib.Repr()
+    r.maxstring = max_chars
+    r.maxother = max_chars
+    r.maxdict = r.maxlist = r.maxtuple = 8
+    r.maxlevel = 3
+    return r
+
+
+def _clip_content(content: Optional[types.Content], max_chars: int) -> str:
+    if not content or not content.parts:
+        return "None"
+    parts = []
+    for part in content.parts:
+        if part.text:
+            parts.append(f"text: {_clip(part.text.strip(), max_chars)!r}")
+        elif part.function_call:
+            parts.append(f"function_call: {part.function_call.name}")
+        elif part.function_response:
+            parts.append(f"function_response: {part.function_response.name}")
+        else:
+            parts.append("other_part")
+    return " | ".join(parts)
+
+
+# --- Plugin -----------------------------------------------------------------
+class SampledLoggingPlugin(BasePlugin):
+    """
+    Low-overhead replacement for ADK's `LoggingPlugin`.
+
+    - Every agent, model and tool callback logs one compact INFO line
+      (names, ids, token counts) through the `ml_copilot.adk` logger.
+    - Payloads (user messages, model responses, tool arguments/results,
+      yielded events) are verbose lines: they are cut to `max_payload_chars`
+      and, unless the logger is at DEBUG, kept with probability `sample_rate`.
+    - Errors are always logged, at WARNING.
+
+    When the logger is disabled for a level, the callback returns before any
+    payload is touched. Formatting and I/O are left to the background writer
+    installed by `configure_background_logging`.
+    """
+
+    def __init__(
+        self,
+        max_payload_chars: int = 200,
+        sample_rate: float = 0.1,
+        name: str = "sampled_logging",
+    ) -> None:
+        super().__init__(name=name)
+        self.max_payload_chars = max_payload_chars
+        self.sample_rate = sample_rate
+        self._repr = _repr_limits(max_payload_chars)
+
+    def _verbose(self) -> bool:
+        if logger.isEnabledFor(logging.DEBUG):
+            return True
+        if not logger.isEnabledFor(logging.INFO):
+            return False
+        return self.sample_rate >= 1.0 or random.random() < self.sample_rate
+
+    def _value(self, value: Any) -> str:
+        return _clip(self._repr.repr(value), self.max_payload_chars)
+
+    # --- run / events -------------------------------------------------------
+    async def on_user_message_callback(
+        self, *, invocation_context, user_message: types.Content
+    ) -> None:
+        if self._verbose():
+            logger.info(
+                "user message session=%s invocation=%s content=%s",
+                invocation_context.session.id,
+                invocation_context.invocation_id,
+                _clip_content(user_message, self.max_payload_chars),
+            )
+
+    async def on_event_callback(self, *, invocation_context, event: Event) -> None:
+        if event.partial or not self._verbose():
+            return None
+        logger.info(
+            "event author=%s final=%s content=%s",
+            event.author,
+            event.is_final_response(),
+            _clip_content(event.content, self.max_payload_chars),
+        )
+
+    # --- agents -------------------------------------------------------------
+    async def before_agent_callback(
+        self, *, agent: BaseAgent, callback_context: CallbackContext
+    ) -> None:
+        if logger.isEnabledFor(logging.INFO):
+            logger.info(
+                "agent start %s invocation=%s",
+                agent.name, callback_context.invocation_id,
+            )
+
+    async def after_agent_callback(
+        self, *, agent: BaseAgent, callback_context: CallbackContext
+    ) -> None:
+        if logger.isEnabledFor(logging.INFO):
+            logger.info(
+                "agent done %s invocation=%s",
+                agent.name, callback_context.invocation_id,
+            )
+
+    # --- models -------------------------------------------------------------
+    async def before_model_callback(
+        self, *, callback_context: CallbackContext, llm_request: LlmRequest
+    ) -> None:
+        if logger.isEnabledFor(logging.INFO):
+            logger.info(
+                "llm request agent=%s model=%s tools=%d",
+                callback_context.agent_name,
+                llm_request.model or "default",
+                len(llm_request.tools_dict),
+            )
+
+    async def after_model_callback(
+        self, *, callback_context: CallbackContext, llm_response: LlmResponse
+    ) -> None:
+        if llm_response.partial:
+            return None
+        if llm_response.error_code:
+            logger.warning(
+                "llm error agent=%s code=%s message=%s",
+                callback_context.agent_name,
+                llm_response.error_code,
+                _clip(llm_response.error_message or "", self.max_payload_chars),
+            )
+            return None
+        if not logger.isEnabledFor(logging.INFO):
+            return None
+
+        usage = llm_response.usage_metadata
+        logger.info(
+            "llm response agent=%s prompt_tokens=%s completion_tokens=%s",
+            callback_context.agent_name,
+            usage.prompt_token_count if usage else None,
+            usage.candidates_token_count if usage else None,
+        )
+        if self._verbose():
+            logger.info(
+                "llm content agent=%s content=%s",
+                callback_context.agent_name,
+                _clip_content(llm_response.content, self.max_payload_chars),
+            )
+
+    async def on_model_error_callback(
+        self,
+        *,
+        callback_context: CallbackContext,
+        llm_request: LlmRequest,
+        error: Exception,
+    ) -> None:
+        logger.warning(
+            "llm error agent=%s error=%s",
+            callback_context.agent_name,
+            _clip(f"{type(error).__name__}: {error}", self.max_payload_chars),
+        )
+
+    # --- tools --------------------------------------------------------------
+    async def before_tool_callback(
+        self, *, tool: BaseTool, tool_args: dict[str, Any], tool_context: ToolContext
+    ) -> None:
+        if not logger.isEnabledFor(logging.INFO):
+            return None
+        if self._verbose():
+            logger.info(
+                "tool start %s agent=%s call=%s args=%s",
+                tool.name, tool_context.agent_name, tool_context.function_call_id,
+                self._value(tool_args),
+            )
+        else:
+            logger.info(
+                "tool start %s agent=%s call=%s",
+                tool.name, tool_context.agent_name, tool_context.function_call_id,
+            )
+
+    async def after_tool_callback(
+        self,
+        *,
+        tool: BaseTool,
+        tool_args: dict[str, Any],
+        tool_context: ToolContext,
+        result: dict,
+    ) -> None:
+        if not logger.isEnabledFor(logging.INFO):
+            return None
+        if self._verbose():
+            logger.info(
+                "tool done %s agent=%s call=%s result=%s",
+                tool.name, tool_context.agent_name, tool_context.function_call_id,
+                self._value(result),
+            )
+        else:
+            logger.info(
+                "tool done %s agent=%s call=%s",
+                tool.name, tool_context.agent_name, tool_context.function_call_id,
+            )
+
+    async def on_tool_error_callback(
+        self,
+        *,
+        tool: BaseTool,
+        tool_args: dict[str, Any],
+        tool_context: ToolContext,
+        error: Exception,
+    ) -> None:
+        logger.warning(
+            "tool error %s agent=%s call=%s args=%s error=%s",
+            tool.name, tool_context.agent_name, tool_context.function_call_id,
+            self._value(tool_args),
+            _clip(f"{type(error).__name__}: {error}", self.max_payload_chars),
+        )
+
+
+# --- Background writer ------------------------------------------------------
+_PLAIN_ARG_TYPES = frozenset((str, int, float, bool, type(None)))
+
+
+class DeferredQueueHandler(logging.handlers.QueueHandler):
+    """
+    `QueueHandler` that leaves message formatting to the listener thread.
+
+    The stock handler formats every record on the caller's thread before
+    enqueueing it. Records whose arguments are plain immutable values (all
+    of `SampledLoggingPlugin`'s) are enqueued as-is instead; anything else
+    (mutable args, exception info) is still formatted here, where it is safe.
+    """
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        if record.exc_info or record.stack_info:
+            return super().prepare(record)
+        if record.name == logger.name:
+            return record
+        args = record.args
+        if isinstance(args, tuple) and all(type(a) in _PLAIN_ARG_TYPES for a in args):
+            return record
+        return super().prepare(record)
+
+
+_listener: Optional[logging.handlers.QueueListener] = None
+
+
+def configure_background_logging(
+    level: Optional[str] = None, fmt: str = LOG_FORMAT
+) -> logging.handlers.QueueListener:
+    """
+    Route the root logger through a `QueueHandler` / `QueueListener` pair, so
+    formatting and writing happen on a background thread instead of the
+    event loop. A drop-in replacement for `logging.basicConfig`.
+
+    Existing root handlers are moved behind the listener; if there are none,
+    a stderr `StreamHandler` with `fmt` is used. The level defaults to
+    ML_LOG_LEVEL (INFO). Idempotent; the listener is flushed at exit.
+    """
+    global _listener
+    if _listener is not None:
+        return _listener
+
+    root = logging.getLogger()
+    root.setLevel(level or os.getenv("ML_LOG_LEVEL", "INFO").upper())
+
+    handlers = list(root.handlers)
+    if not handlers:
+        stream = logging.StreamHandler()
+        stream.setFormatter(logging.Formatter(fmt))
+        handlers = [stream]
+
+    log_queue: queue.SimpleQueue = queue.SimpleQueue()
+    root.handlers = [DeferredQueueHandler(log_queue)]
+    _listener = logging.handlers.QueueListener(
+        log_queue, *handlers, respect_handler_level=True
+    )
+    _listener.start()
+    atexit.register(_listener.stop)
+    return _listener
+
+
+def get_logging_plugin() -> BasePlugin:
+    """
+    Build the logging plugin from the environment.
+
+    ML_LOG_MAX_CHARS    payload truncation length (default 200)
+    ML_LOG_SAMPLE_RATE  fraction of verbose payload lines kept at INFO (default 0.1)
+    ML_LOG_PLUGIN       "adk" to use ADK's full `LoggingPlugin` instead
+    """
+    if os.getenv("ML_LOG_PLUGIN", "").lower() == "adk":
+        from google.adk.plugins.logging_plugin import LoggingPlugin
+        return LoggingPlugin()
+
+    return SampledLoggingPlugin(
+        max_payload_chars=int(os.getenv("ML_LOG_MAX_CHARS", "200")),
+        sample_rate=float(os.getenv("ML_LOG_SAMPLE_RATE", "0.1")),
+    )
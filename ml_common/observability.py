@@ -1,24 +1,24 @@
 import os
 import logging
 
-from dotenv import load_dotenv
-import agentops
-
-# Load .env from the *caller’s* directory when imported
-load_dotenv(override=False)
-
 _initialized = False
 
 def init_agentops(trace_name: str | None = None):
     """
     Idempotent AgentOps initialization.
 
-    Call this at import time from each agent module.
-    Multiple calls are safe.
+    `dotenv` and `agentops` are imported here rather than at module level,
+    so importing an app does not pay for them. Multiple calls are safe.
     """
     global _initialized
     if _initialized:
         return
+    _initialized = True
+
+    from dotenv import load_dotenv
+
+    # Load .env from the *caller’s* directory on first use
+    load_dotenv(override=False)
 
     api_key = os.getenv("AGENTOPS_API_KEY")
 
@@ -29,6 +29,8 @@ def init_agentops(trace_name: str | None = None):
         )
         return
 
+    import agentops
+
     agentops.init(
         api_key=api_key,
         trace_name=trace_name or "ml-co-pilot",  # shows up in AgentOps UI
@@ -36,4 +38,18 @@ def init_agentops(trace_name: str | None = None):
     )
 
     logging.info(f"[AgentOps] Initialized with trace_name={trace_name or 'ml-co-pilot'}")
-    _initialized = True
\ No newline at end of file
+
+
+def agentops_callback(trace_name: str):
+    """
+    Return a `before_agent_callback` that initializes AgentOps on the
+    first invocation of the agent it is attached to.
+
+    Attach it to each app's root agent instead of calling `init_agentops`
+    at import time.
+    """
+    def _init_on_first_invocation(callback_context):
+        init_agentops(trace_name=trace_name)
+        return None
+
+    return _init_on_first_invocation
@@ -5,7 +5,12 @@ from google.adk.agents.base_agent import BaseAgent
 from google.adk.agents.callback_context import CallbackContext
 from google.adk.models.llm_request import LlmRequest
 from google.adk.tools.base_tool import BaseTool
-from google.adk.plugins.logging_plugin import LoggingPlugin
+from google.adk.tools.tool_context import ToolContext
+
+from ml_common.logging_plugin import get_logging_plugin
+from ml_common.telemetry import get_telemetry_plugin
+from ml_common.budget import get_budget_plugin
+from ml_common.cassette import get_cassette_plugin
 
 
 class InvocationMetricsPlugin(BasePlugin):
@@ -41,8 +46,8 @@ class InvocationMetricsPlugin(BasePlugin):
         self,
         *,
         tool: BaseTool,
-        callback_context: CallbackContext,
-        tool_input,
+        tool_args: dict,
+        tool_context: ToolContext,
     ) -> None:
         self.tool_count += 1
         logging.info(
@@ -68,10 +73,33 @@ class InvocationMetricsPlugin(BasePlugin):
 def get_common_plugins():
     """
     Return the standard plugin stack you can attach to any runner.
-    - LoggingPlugin: structured traces/logs for all agents & tools
+    - SampledLoggingPlugin: compact logs for all agents & tools, with
+      truncated, sampled payloads (ML_LOG_PLUGIN=adk for ADK's LoggingPlugin)
     - InvocationMetricsPlugin: simple counters on top
+    - TelemetryPlugin: batched background export to a local JSONL/Parquet
+      file, only when ML_TELEMETRY_PATH is set
+    - BudgetPlugin: per-session token / cost budget, only when
+      ML_BUDGET_MAX_TOKENS or ML_BUDGET_MAX_COST_USD is set
+    - CassetteRecordPlugin / CassetteReplayPlugin: record sessions to, or
+      replay them from, a cassette file (ML_CASSETTE_RECORD / ML_CASSETTE_REPLAY)
     """
-    return [
-        LoggingPlugin(),
+    plugins = [
+        get_logging_plugin(),
         InvocationMetricsPlugin(),
-    ]
\ No newline at end of file
+    ]
+
+    telemetry = get_telemetry_plugin()
+    if telemetry is not None:
+        plugins.append(telemetry)
+
+    # Budget metrics go to the same telemetry sink when there is one.
+    budget = get_budget_plugin(exporter=telemetry.exporter if telemetry else None)
+    if budget is not None:
+        plugins.append(budget)
+
+    # Last, so the other plugins still see every request it records or serves.
+    cassette = get_cassette_plugin()
+    if cassette is not None:
+        plugins.append(cassette)
+
+    return plugins
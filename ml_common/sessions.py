@@ -0,0 +1,347 @@
+import os
+import json
+import time
+import logging
+import contextlib
+from collections import Counter, OrderedDict
+from dataclasses import dataclass
+from typing import Any, AsyncGenerator, Optional
+
+from google.adk.artifacts.base_artifact_service import BaseArtifactService
+from google.adk.events import Event, EventActions
+from google.adk.runners import InMemoryRunner
+from google.adk.sessions import InMemorySessionService, Session, State
+
+SESSION_MARKER = "[Sessions]"
+
+
+@dataclass
+class _Entry:
+    bytes: int
+    last_access: float
+    compacted: bool = False
+
+
+def _event_bytes(event: Event) -> int:
+    return len(event.model_dump_json(exclude_none=True))
+
+
+def _state_bytes(state: dict) -> int:
+    return len(json.dumps(state, default=str))
+
+
+def _keep_when_compacted(event: Event) -> bool:
+    """User messages and final text answers: the conversation, minus the work."""
+    if event.author == "user":
+        return True
+    return event.is_final_response() and bool(
+        event.content and event.content.parts and any(p.text for p in event.content.parts)
+    )
+
+
+class BoundedSessionService(InMemorySessionService):
+    """
+    `InMemorySessionService` that keeps its memory bounded, for servers
+    that run for days.
+
+    Sessions are tracked in LRU order (by `get_session` / `append_event`)
+    with an estimate of their size (serialized events + state). After each
+    new session or event:
+
+    - sessions idle for more than `ttl_s` are dropped;
+    - finished sessions (last event is a final response) idle for more
+      than `compact_after_s` are compacted: only user messages and final
+      answers are kept, without their state deltas, since the session
+      state already holds the result;
+    - while there are more than `max_sessions` sessions or more than
+      `max_bytes` in total, the least recently used session that is not
+      in the middle of a run is dropped.
+
+    A session with a run in flight must not be dropped: ADK would silently
+    discard its later events and the next turn would find no session.
+    Whatever the runner, a session is not compacted or LRU-dropped from a
+    user message until its final response (e.g. during a long tool call);
+    only the TTL drops it. Sessions pinned with `in_flight`, as
+    `BoundedInMemoryRunner` does around each run (covering the gaps
+    between sub-agents), are never dropped. Should a session still be
+    dropped while its run goes on, its next event restores it from the
+    runner's copy.
+
+    Dropped sessions also lose their session-scoped artifacts when an
+    `artifact_service` is given. Counters are available from `stats()`,
+    logged with a "[Sessions]" prefix and, with an `exporter`, sent to the
+    telemetry sink (kind "session_memory").
+    """
+
+    def __init__(
+        self,
+        max_sessions: Optional[int] = 1000,
+        max_bytes: Optional[int] = 512 * 2**20,
+        ttl_s: Optional[float] = 24 * 3600,
+        compact_after_s: Optional[float] = 15 * 60,
+        artifact_service: Optional[BaseArtifactService] = None,
+        exporter=None,
+        metrics_interval_s: float = 60.0,
+    ) -> None:
+        super().__init__()
+        self.max_sessions = max_sessions
+        self.max_bytes = max_bytes
+        self.ttl_s = ttl_s
+        self.compact_after_s = compact_after_s
+        self.artifact_service = artifact_service
+        self.exporter = exporter
+        self.metrics_interval_s = metrics_interval_s
+        self._entries: "OrderedDict[tuple[str, str, str], _Entry]" = OrderedDict()
+        self._pinned: Counter = Counter()
+        self._total_bytes = 0
+        self._last_report = 0.0
+        self._last_sweep = 0.0
+        self.counters = {"evicted_ttl": 0, "evicted_lru": 0, "compacted": 0, "readmitted": 0, "reclaimed_bytes": 0}
+
+    # --- Tracking -----------------------------------------------------------
+    def _touch(self, key: tuple[str, str, str], added_bytes: int = 0) -> None:
+        entry = self._entries.get(key)
+        if entry is None:
+            return
+        entry.last_access = time.monotonic()
+        entry.bytes += added_bytes
+        self._total_bytes += added_bytes
+        self._entries.move_to_end(key)
+
+    @contextlib.contextmanager
+    def in_flight(self, app_name: str, user_id: str, session_id: str):
+        """Pin the session for the duration of an invocation."""
+        key = (app_name, user_id, session_id)
+        self._pinned[key] += 1
+        try:
+            yield
+        finally:
+            self._pinned[key] -= 1
+            if not self._pinned[key]:
+                del self._pinned[key]
+
+    def _forget(self, key: tuple[str, str, str]) -> int:
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return 0
+        self._total_bytes -= entry.bytes
+        return entry.bytes
+
+    async def create_session(
+        self,
+        *,
+        app_name: str,
+        user_id: str,
+        state: Optional[dict[str, Any]] = None,
+        session_id: Optional[str] = None,
+    ) -> Session:
+        session = await super().create_session(
+            app_name=app_name, user_id=user_id, state=state, session_id=session_id
+        )
+        key = (app_name, user_id, session.id)
+        size = _state_bytes(session.state)
+        self._entries[key] = _Entry(bytes=size, last_access=time.monotonic())
+        self._total_bytes += size
+        await self._enforce(protect=key)
+        return session
+
+    async def get_session(self, *, app_name: str, user_id: str, session_id: str, config=None) -> Optional[Session]:
+        session = await super().get_session(
+            app_name=app_name, user_id=user_id, session_id=session_id, config=config
+        )
+        if session is not None:
+            self._touch((app_name, user_id, session_id))
+        return session
+
+    def _readmit(self, session: Session) -> None:
+        """Put a session dropped mid-run back, from the runner's copy of it."""
+        stored = session.model_copy(deep=True)
+        # The runner's copy merges app / user state in; storage keeps only the session's.
+        stored.state = {
+            k: v for k, v in stored.state.items()
+            if not k.startswith((State.APP_PREFIX, State.USER_PREFIX, State.TEMP_PREFIX))
+        }
+        self.sessions.setdefault(session.app_name, {}).setdefault(session.user_id, {})[session.id] = stored
+        size = _state_bytes(stored.state) + sum(_event_bytes(e) for e in stored.events)
+        self._entries[(session.app_name, session.user_id, session.id)] = _Entry(
+            bytes=size, last_access=time.monotonic()
+        )
+        self._total_bytes += size
+        self.counters["readmitted"] += 1
+        logging.warning("%s Session %s was dropped during a run; restored it", SESSION_MARKER, session.id)
+
+    async def append_event(self, session: Session, event: Event) -> Event:
+        if not event.partial and (session.app_name, session.user_id, session.id) not in self._entries:
+            self._readmit(session)
+        event = await super().append_event(session=session, event=event)
+        if not event.partial:
+            key = (session.app_name, session.user_id, session.id)
+            self._touch(key, _event_bytes(event))
+            entry = self._entries.get(key)
+            if entry is not None:
+                entry.compacted = False
+            await self._enforce(protect=key)
+        return event
+
+    async def delete_session(self, *, app_name: str, user_id: str, session_id: str) -> None:
+        await super().delete_session(app_name=app_name, user_id=user_id, session_id=session_id)
+        self._forget((app_name, user_id, session_id))
+
+    # --- Eviction / compaction ----------------------------------------------
+    async def _evict(self, key: tuple[str, str, str], reason: str) -> None:
+        app_name, user_id, session_id = key
+        freed = self._forget(key)
+        users = self.sessions.get(app_name, {})
+        users.get(user_id, {}).pop(session_id, None)
+        if user_id in users and not users[user_id]:
+            del users[user_id]
+        if self.artifact_service is not None:
+            filenames = await self.artifact_service.list_artifact_keys(
+                app_name=app_name, user_id=user_id, session_id=session_id
+            )
+            for filename in filenames:
+                if not filename.startswith("user:"):  # user-scoped: shared by sessions
+                    await self.artifact_service.delete_artifact(
+                        app_name=app_name, user_id=user_id, session_id=session_id, filename=filename
+                    )
+        self.counters[f"evicted_{reason}"] += 1
+        self.counters["reclaimed_bytes"] += freed
+        logging.info("%s Evicted session %s (%s, %.1f KB)", SESSION_MARKER, session_id, reason, freed / 1024)
+
+    def _compact(self, key: tuple[str, str, str], entry: _Entry) -> None:
+        app_name, user_id, session_id = key
+        session = self.sessions[app_name][user_id][session_id]
+        session.events = [
+            event.model_copy(update={"actions": EventActions()})
+            for event in session.events
+            if _keep_when_compacted(event)
+        ]
+        size = _state_bytes(session.state) + sum(_event_bytes(e) for e in session.events)
+        freed = entry.bytes - size
+        entry.bytes = size
+        entry.compacted = True
+        self._total_bytes -= freed
+        self.counters["compacted"] += 1
+        self.counters["reclaimed_bytes"] += freed
+
+    def _is_finished(self, key: tuple[str, str, str]) -> bool:
+        app_name, user_id, session_id = key
+        events = self.sessions[app_name][user_id][session_id].events
+        return bool(events) and events[-1].author != "user" and events[-1].is_final_response()
+
+    def _in_run(self, key: tuple[str, str, str]) -> bool:
+        """A run started (there are events) and has not given its final response yet."""
+        app_name, user_id, session_id = key
+        return bool(self.sessions[app_name][user_id][session_id].events) and not self._is_finished(key)
+
+    async def _enforce(self, protect: tuple[str, str, str]) -> None:
+        """Apply TTL, compaction and the count / byte budgets; never drops `protect`."""
+        now = time.monotonic()
+        changed = False
+        # Entries are in LRU order, so idle sessions form a prefix.
+        # Idle sessions only change state slowly: sweep them at most once a second.
+        min_idle = min(t for t in (self.ttl_s, self.compact_after_s, float("inf")) if t)
+        idle_prefix = []
+        for key, entry in self._entries.items() if now - self._last_sweep >= 1.0 else ():
+            if now - entry.last_access <= min_idle:
+                break
+            if key != protect and key not in self._pinned:
+                idle_prefix.append((key, entry))
+        if idle_prefix:
+            self._last_sweep = now
+        for key, entry in idle_prefix:
+            idle = now - entry.last_access
+            if self.ttl_s and idle > self.ttl_s:
+                await self._evict(key, "ttl")
+                changed = True
+            elif self.compact_after_s and idle > self.compact_after_s:
+                if not entry.compacted and self._is_finished(key):
+                    self._compact(key, entry)
+                    changed = True
+            else:
+                break
+
+        while (
+            (self.max_sessions and len(self._entries) > self.max_sessions)
+            or (self.max_bytes and self._total_bytes > self.max_bytes)
+        ):
+            oldest = next(
+                (
+                    key for key in self._entries
+                    if key != protect and key not in self._pinned and not self._in_run(key)
+                ),
+                None,
+            )
+            if oldest is None:
+                break
+            await self._evict(oldest, "lru")
+            changed = True
+
+        if changed or now - self._last_report >= self.metrics_interval_s:
+            self._report(now)
+
+    # --- Metrics ------------------------------------------------------------
+    def stats(self) -> dict[str, Any]:
+        return {
+            "sessions": len(self._entries),
+            "in_flight": len(self._pinned),
+            "bytes": self._total_bytes,
+            "compacted_sessions": sum(entry.compacted for entry in self._entries.values()),
+            **self.counters,
+        }
+
+    def _report(self, now: float) -> None:
+        self._last_report = now
+        stats = self.stats()
+        logging.info(
+            "%s sessions=%d memory=%.1fMB compacted=%d evicted_ttl=%d evicted_lru=%d reclaimed=%.1fMB",
+            SESSION_MARKER, stats["sessions"], stats["bytes"] / 2**20, stats["compacted"],
+            stats["evicted_ttl"], stats["evicted_lru"], stats["reclaimed_bytes"] / 2**20,
+        )
+        if self.exporter is not None:
+            self.exporter.emit({
+                "ts": time.time(),
+                "kind": "session_memory",
+                "session_id": None,
+                "agent": None,
+                "name": "sessions",
+                "duration_ms": None,
+                **stats,
+            })
+
+
+def get_session_service(artifact_service=None, exporter=None) -> BoundedSessionService:
+    """
+    Build a `BoundedSessionService` from the environment:
+
+    ML_SESSION_MAX_COUNT        max sessions kept (default 1000, 0 = unlimited)
+    ML_SESSION_MAX_MB           max estimated memory in MB (default 512, 0 = unlimited)
+    ML_SESSION_TTL_S            drop sessions idle this long (default 86400, 0 = never)
+    ML_SESSION_COMPACT_AFTER_S  compact finished sessions idle this long (default 900, 0 = never)
+    """
+    return BoundedSessionService(
+        max_sessions=int(os.getenv("ML_SESSION_MAX_COUNT", "1000")),
+        max_bytes=int(float(os.getenv("ML_SESSION_MAX_MB", "512")) * 2**20),
+        ttl_s=float(os.getenv("ML_SESSION_TTL_S", str(24 * 3600))),
+        compact_after_s=float(os.getenv("ML_SESSION_COMPACT_AFTER_S", "900")),
+        artifact_service=artifact_service,
+        exporter=exporter,
+    )
+
+
+class BoundedInMemoryRunner(InMemoryRunner):
+    """
+    `InMemoryRunner` whose sessions live in a `BoundedSessionService`,
+    pinned while an invocation runs on them.
+    """
+
+    def __init__(self, agent=None, *, app_name=None, plugins=None, **kwargs) -> None:
+        super().__init__(agent, app_name=app_name, plugins=plugins, **kwargs)
+        # Session metrics go to the same telemetry sink as the plugins, if any.
+        exporter = next((getattr(p, "exporter", None) for p in plugins or [] if p.name == "telemetry"), None)
+        self.session_service = get_session_service(self.artifact_service, exporter)
+
+    async def run_async(self, *, user_id: str, session_id: str, **kwargs) -> AsyncGenerator[Event, None]:
+        with self.session_service.in_flight(self.app_name, user_id, session_id):
+            async for event in super().run_async(user_id=user_id, session_id=session_id, **kwargs):
+                yield event
@@ -0,0 +1,160 @@
+import os
+import re
+import logging
+from collections import OrderedDict
+from typing import Any, AsyncGenerator
+
+from google.adk.agents import LlmAgent
+from google.adk.agents.callback_context import CallbackContext
+from google.adk.agents.invocation_context import InvocationContext
+from google.adk.agents.readonly_context import ReadonlyContext
+from google.adk.events import Event
+from google.adk.utils.context_utils import Aclosing
+from google.adk.utils.instructions_utils import inject_session_state
+from google.genai import types
+
+# String state values longer than this are stored as artifacts (0 disables).
+OFFLOAD_CHARS = int(os.getenv("ML_STATE_OFFLOAD_CHARS", "4096"))
+
+# Key marking a state value as a handle to an artifact.
+HANDLE_KEY = "state_artifact"
+
+_TEMPLATE_VAR = re.compile(r"{+[^{}]*}+")
+
+# Resolved artifact texts, keyed by (app, user, session, filename, version).
+# Artifact versions never change, so entries never go stale.
+_resolved: "OrderedDict[tuple, str]" = OrderedDict()
+_RESOLVED_MAX = 32
+
+
+def is_handle(value: Any) -> bool:
+    return isinstance(value, dict) and HANDLE_KEY in value
+
+
+def _artifact_name(state_key: str) -> str:
+    # "user:notes" -> "user:state_notes.txt": user-scoped state goes to a
+    # user-scoped artifact, everything else to a session artifact.
+    prefix, _, name = state_key.rpartition(":")
+    filename = f"state_{name}.txt"
+    return f"user:{filename}" if prefix == "user" else filename
+
+
+def should_offload(state_key: str, value: Any) -> bool:
+    return (
+        OFFLOAD_CHARS > 0
+        and isinstance(value, str)
+        and len(value) > OFFLOAD_CHARS
+        and not state_key.startswith("temp:")
+    )
+
+
+# --- Offload / resolve ------------------------------------------------------
+async def offload_value(callback_context: CallbackContext, state_key: str, value: Any) -> Any:
+    """
+    Store `value` as an artifact and return a handle to put in state instead.
+
+    Small values, non-strings and sessions without an artifact service get
+    `value` back unchanged.
+    """
+    if not should_offload(state_key, value):
+        return value
+    if callback_context._invocation_context.artifact_service is None:
+        return value
+
+    filename = _artifact_name(state_key)
+    version = await callback_context.save_artifact(filename, types.Part(text=value))
+    return {HANDLE_KEY: filename, "version": version, "chars": len(value)}
+
+
+async def offload_state_delta(event: Event, ctx: InvocationContext) -> None:
+    """Replace large values in `event.actions.state_delta` with handles, in place."""
+    delta = event.actions.state_delta
+    if not any(should_offload(key, value) for key, value in delta.items()):
+        return
+    callback_context = CallbackContext(ctx, event_actions=event.actions)
+    for key, value in list(delta.items()):
+        handle = await offload_value(callback_context, key, value)
+        if handle is not value:
+            delta[key] = handle
+            logging.debug("[StateOffload] %s -> %s v%s", key, handle[HANDLE_KEY], handle["version"])
+
+
+async def resolve_value(ctx: InvocationContext, value: Any) -> Any:
+    """The stored text for a handle; any other value is returned unchanged."""
+    if not is_handle(value):
+        return value
+
+    session = ctx.session
+    cache_key = (session.app_name, session.user_id, session.id, value[HANDLE_KEY], value["version"])
+    if cache_key in _resolved:
+        _resolved.move_to_end(cache_key)
+        return _resolved[cache_key]
+
+    part = None
+    if ctx.artifact_service is not None:
+        part = await ctx.artifact_service.load_artifact(
+            app_name=session.app_name,
+            user_id=session.user_id,
+            session_id=session.id,
+            filename=value[HANDLE_KEY],
+            version=value["version"],
+        )
+    if part is None or part.text is None:
+        logging.warning("[StateOffload] Artifact %s v%s is missing", value[HANDLE_KEY], value["version"])
+        return ""
+
+    _resolved[cache_key] = part.text
+    if len(_resolved) > _RESOLVED_MAX:
+        _resolved.popitem(last=False)
+    return part.text
+
+
+async def resolve_instruction(template: str, readonly_context: ReadonlyContext) -> str:
+    """
+    ADK's `{state}` templating, except that variables holding a handle are
+    replaced by the artifact's text. Artifacts are loaded only for the
+    variables the template actually uses.
+    """
+    ctx = readonly_context._invocation_context
+    state = readonly_context.state
+    parts = []
+    last_end = 0
+    for match in _TEMPLATE_VAR.finditer(template):
+        parts.append(template[last_end:match.start()])
+        name = match.group().lstrip("{").rstrip("}").strip().removesuffix("?")
+        value = state.get(name)
+        if is_handle(value):
+            parts.append(await resolve_value(ctx, value))
+        else:
+            parts.append(await inject_session_state(match.group(), readonly_context))
+        last_end = match.end()
+    parts.append(template[last_end:])
+    return "".join(parts)
+
+
+# --- Agent ------------------------------------------------------------------
+class OffloadingLlmAgent(LlmAgent):
+    """
+    `LlmAgent` whose large state values live in the artifact service.
+
+    - State deltas it emits (its `output_key`, tool writes) are checked
+      before the runner persists them: strings over `ML_STATE_OFFLOAD_CHARS`
+      (default 4096) are saved once as an artifact and replaced by a small
+      handle, so events and stored sessions stay the same size however
+      long the notes are.
+    - String instructions are templated by `resolve_instruction`, which
+      loads a handle's text only when the instruction interpolates it.
+
+    Without an artifact service the agent behaves exactly like `LlmAgent`.
+    """
+
+    async def canonical_instruction(self, ctx: ReadonlyContext) -> tuple[str, bool]:
+        if isinstance(self.instruction, str):
+            return await resolve_instruction(self.instruction, ctx), True
+        return await super().canonical_instruction(ctx)
+
+    async def _run_async_impl(self, ctx: InvocationContext) -> AsyncGenerator[Event, None]:
+        async with Aclosing(super()._run_async_impl(ctx)) as agen:
+            async for event in agen:
+                await offload_state_delta(event, ctx)
+                yield event
@@ -0,0 +1,375 @@
+import os
+import json
+import atexit
+import asyncio
+import time
+import queue
+import random
+import logging
+import threading
+from typing import Any, Optional
+
+from google.adk.plugins.base_plugin import BasePlugin
+from google.adk.agents.base_agent import BaseAgent
+from google.adk.agents.callback_context import CallbackContext
+from google.adk.models.llm_request import LlmRequest
+from google.adk.models.llm_response import LlmResponse
+from google.adk.tools.base_tool import BaseTool
+from google.adk.tools.tool_context import ToolContext
+
+
+# --- Sinks ------------------------------------------------------------------
+class JsonlSink:
+    """Appends each event as one JSON line to a local file."""
+
+    def __init__(self, path: str) -> None:
+        self.path = path
+        self._file = open(path, "a", encoding="utf-8")
+
+    def write(self, batch: list[dict]) -> None:
+        self._file.write(
+            "".join(json.dumps(event, default=str) + "\n" for event in batch)
+        )
+        self._file.flush()
+
+    def flush(self, force: bool = True) -> None:
+        pass  # every batch is flushed as it is written
+
+    def close(self) -> None:
+        self._file.close()
+
+
+class ParquetSink:
+    """
+    Writes events to a Parquet dataset: `path` is a directory of complete
+    part files, readable as one table (`pyarrow.parquet.read_table(path)`).
+
+    Batches are buffered and written as a new part once `rows_per_file`
+    events or `roll_interval_s` seconds have accumulated, and on close.
+    Each part is written to a temp name and renamed, so a crash loses at
+    most the buffered events, never a file; parts are named by process,
+    so several processes can share `path`.
+
+    Fixed columns: ts, kind, session_id, agent, name, duration_ms.
+    Everything else goes into a JSON-encoded `attrs` column.
+    """
+
+    COLUMNS = ("ts", "kind", "session_id", "agent", "name", "duration_ms")
+
+    def __init__(self, path: str, rows_per_file: int = 50_000, roll_interval_s: float = 60.0) -> None:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        self.path = path
+        self.rows_per_file = rows_per_file
+        self.roll_interval_s = roll_interval_s
+        self._pa = pa
+        self._pq = pq
+        self._tables: list = []
+        self._rows = 0
+        self._first_buffered: Optional[float] = None
+        self._parts = 0
+        os.makedirs(path, exist_ok=True)
+        self._schema = pa.schema([
+            ("ts", pa.float64()),
+            ("kind", pa.string()),
+            ("session_id", pa.string()),
+            ("agent", pa.string()),
+            ("name", pa.string()),
+            ("duration_ms", pa.float64()),
+            ("attrs", pa.string()),
+        ])
+
+    def write(self, batch: list[dict]) -> None:
+        columns = {col: [event.get(col) for event in batch] for col in self.COLUMNS}
+        columns["attrs"] = [
+            json.dumps(
+                {k: v for k, v in event.items() if k not in self.COLUMNS},
+                default=str,
+            )
+            for event in batch
+        ]
+        self._tables.append(self._pa.Table.from_pydict(columns, schema=self._schema))
+        self._rows += len(batch)
+        self._first_buffered = self._first_buffered or time.monotonic()
+        self.flush(force=False)
+
+    def flush(self, force: bool = True) -> None:
+        """Write the buffered events as a part file (if due, unless `force`)."""
+        if not self._tables:
+            return
+        if not force and self._rows < self.rows_per_file \
+                and time.monotonic() - self._first_buffered < self.roll_interval_s:
+            return
+        self._parts += 1
+        name = f"part-{os.getpid()}-{int(time.time() * 1000)}-{self._parts:05d}.parquet"
+        tmp = os.path.join(self.path, f".{name}.tmp")
+        self._pq.write_table(self._pa.concat_tables(self._tables), tmp)
+        os.replace(tmp, os.path.join(self.path, name))
+        self._tables, self._rows, self._first_buffered = [], 0, None
+
+    def close(self) -> None:
+        self.flush()
+
+
+def make_sink(path: str):
+    """Pick a sink from the file extension (.parquet, otherwise JSONL)."""
+    if path.endswith(".parquet"):
+        return ParquetSink(path)
+    return JsonlSink(path)
+
+
+# --- Background exporter ----------------------------------------------------
+class TelemetryExporter:
+    """
+    Non-blocking, batched telemetry pipeline.
+
+    `emit()` only does a `put_nowait` on a bounded queue, so the agent hot
+    path never waits on export. A daemon thread drains the queue and hands
+    batches of up to `batch_size` events (or whatever arrived within
+    `flush_interval` seconds) to the sinks.
+
+    Under load (queue at least `load_threshold` full) events are kept with
+    probability `sample_rate`; when the queue is full they are dropped.
+    Both kinds of drops are counted in `stats()`.
+    """
+
+    def __init__(
+        self,
+        sinks: list,
+        max_queue_size: int = 10_000,
+        batch_size: int = 256,
+        flush_interval: float = 1.0,
+        sample_rate: float = 0.1,
+        load_threshold: float = 0.5,
+    ) -> None:
+        self.sinks = sinks
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.sample_rate = sample_rate
+        self._queue: queue.Queue = queue.Queue(maxsize=max_queue_size)
+        self._high_water = int(max_queue_size * load_threshold)
+
+        self.emitted = 0
+        self.exported = 0
+        self.dropped_sampled = 0
+        self.dropped_full = 0
+
+        self._stop = threading.Event()
+        self._thread = threading.Thread(
+            target=self._run, name="telemetry-exporter", daemon=True
+        )
+        self._thread.start()
+        # The daemon thread dies with the interpreter: drain and close first.
+        atexit.register(self.close)
+
+    def emit(self, event: dict) -> None:
+        self.emitted += 1
+        if (
+            self._queue.qsize() >= self._high_water
+            and random.random() >= self.sample_rate
+        ):
+            self.dropped_sampled += 1
+            return
+        try:
+            self._queue.put_nowait(event)
+        except queue.Full:
+            self.dropped_full += 1
+
+    def _drain(self, timeout: float) -> list[dict]:
+        batch = []
+        deadline = time.monotonic() + timeout
+        while len(batch) < self.batch_size:
+            remaining = deadline - time.monotonic()
+            try:
+                if remaining <= 0:
+                    batch.append(self._queue.get_nowait())
+                else:
+                    batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _export(self, batch: list[dict]) -> None:
+        for sink in self.sinks:
+            try:
+                sink.write(batch)
+            except Exception:
+                logging.exception("[Telemetry] Sink %r failed", sink)
+        self.exported += len(batch)
+        for _ in batch:
+            self._queue.task_done()
+
+    def _run(self) -> None:
+        while not self._stop.is_set():
+            batch = self._drain(self.flush_interval)
+            if batch:
+                self._export(batch)
+            else:
+                self._flush_sinks(force=False)
+        # Flush whatever is left on shutdown.
+        while batch := self._drain(0):
+            self._export(batch)
+
+    def _flush_sinks(self, force: bool) -> None:
+        for sink in self.sinks:
+            try:
+                sink.flush(force=force)
+            except Exception:
+                logging.exception("[Telemetry] Sink %r failed", sink)
+
+    def stats(self) -> dict:
+        return {
+            "emitted": self.emitted,
+            "exported": self.exported,
+            "queued": self._queue.qsize(),
+            "dropped_sampled": self.dropped_sampled,
+            "dropped_full": self.dropped_full,
+        }
+
+    @property
+    def closed(self) -> bool:
+        return self._stop.is_set()
+
+    def flush(self) -> None:
+        """Block until every queued event has been handed to the sinks."""
+        if self._thread.is_alive():
+            self._queue.join()
+
+    def close(self) -> None:
+        """Export what is queued and close the sinks; safe to call twice."""
+        if self._stop.is_set():
+            return
+        self._stop.set()
+        self._thread.join()
+        for sink in self.sinks:
+            sink.close()
+        atexit.unregister(self.close)
+        logging.info("[Telemetry] Exporter closed: %s", self.stats())
+
+
+# --- Plugin -----------------------------------------------------------------
+class TelemetryPlugin(BasePlugin):
+    """
+    Emits one compact event per agent run, model call and tool call
+    (with durations and token counts) into a `TelemetryExporter`.
+    """
+
+    def __init__(self, exporter: TelemetryExporter) -> None:
+        super().__init__(name="telemetry")
+        self.exporter = exporter
+        self._started: dict[Any, float] = {}
+
+    def _event(self, kind: str, context, name: str, started_key=None, **attrs) -> None:
+        now = time.time()
+        started = self._started.pop(started_key, None)
+        self.exporter.emit({
+            "ts": now,
+            "kind": kind,
+            "session_id": context.session.id,
+            "agent": context.agent_name,
+            "name": name,
+            "duration_ms": (now - started) * 1000 if started else None,
+            **attrs,
+        })
+
+    async def before_agent_callback(
+        self, *, agent: BaseAgent, callback_context: CallbackContext
+    ) -> None:
+        self._started[("agent", callback_context.invocation_id, agent.name)] = time.time()
+
+    async def after_agent_callback(
+        self, *, agent: BaseAgent, callback_context: CallbackContext
+    ) -> None:
+        self._event(
+            "agent", callback_context, agent.name,
+            started_key=("agent", callback_context.invocation_id, agent.name),
+        )
+
+    async def before_model_callback(
+        self, *, callback_context: CallbackContext, llm_request: LlmRequest
+    ) -> None:
+        key = ("model", callback_context.invocation_id, callback_context.agent_name)
+        self._started[key] = time.time()
+
+    async def after_model_callback(
+        self, *, callback_context: CallbackContext, llm_response: LlmResponse
+    ) -> None:
+        if llm_response.partial:
+            return
+        usage = llm_response.usage_metadata
+        self._event(
+            "model", callback_context, llm_response.model_version or "",
+            started_key=("model", callback_context.invocation_id, callback_context.agent_name),
+            prompt_tokens=usage.prompt_token_count if usage else None,
+            completion_tokens=usage.candidates_token_count if usage else None,
+            error_code=llm_response.error_code,
+        )
+
+    async def before_tool_callback(
+        self, *, tool: BaseTool, tool_args: dict[str, Any], tool_context: ToolContext
+    ) -> None:
+        self._started[("tool", tool_context.function_call_id)] = time.time()
+
+    async def after_tool_callback(
+        self,
+        *,
+        tool: BaseTool,
+        tool_args: dict[str, Any],
+        tool_context: ToolContext,
+        result: dict,
+    ) -> None:
+        self._event(
+            "tool", tool_context, tool.name,
+            started_key=("tool", tool_context.function_call_id),
+        )
+
+    async def on_tool_error_callback(
+        self,
+        *,
+        tool: BaseTool,
+        tool_args: dict[str, Any],
+        tool_context: ToolContext,
+        error: Exception,
+    ) -> None:
+        self._event(
+            "tool", tool_context, tool.name,
+            started_key=("tool", tool_context.function_call_id),
+            error=f"{type(error).__name__}: {error}",
+        )
+
+    async def close(self) -> None:
+        # The exporter may be shared with other runners (see
+        # `get_telemetry_plugin`); it is closed at interpreter exit.
+        await asyncio.to_thread(self.exporter.flush)
+
+
+_exporters: dict[str, TelemetryExporter] = {}
+
+
+def get_telemetry_plugin() -> Optional[TelemetryPlugin]:
+    """
+    Build a `TelemetryPlugin` writing to the local sink in ML_TELEMETRY_PATH
+    (a `.jsonl` file, or a `.parquet` directory of part files), or return
+    None if the variable is not set.
+
+    Tuning knobs: ML_TELEMETRY_SAMPLE_RATE, ML_TELEMETRY_QUEUE_SIZE,
+    ML_TELEMETRY_BATCH_SIZE, ML_TELEMETRY_FLUSH_INTERVAL.
+    """
+    path = os.getenv("ML_TELEMETRY_PATH")
+    if not path:
+        return None
+
+    # One exporter (and sink) per path and process, shared by every runner.
+    exporter = _exporters.get(path)
+    if exporter is not None and not exporter.closed:
+        return TelemetryPlugin(exporter)
+    exporter = _exporters[path] = TelemetryExporter(
+        sinks=[make_sink(path)],
+        max_queue_size=int(os.getenv("ML_TELEMETRY_QUEUE_SIZE", "10000")),
+        batch_size=int(os.getenv("ML_TELEMETRY_BATCH_SIZE", "256")),
+        flush_interval=float(os.getenv("ML_TELEMETRY_FLUSH_INTERVAL", "1.0")),
+        sample_rate=float(os.getenv("ML_TELEMETRY_SAMPLE_RATE", "0.1")),
+    )
+    logging.info("[Telemetry] Exporting events to %s", path)
+    return TelemetryPlugin(exporter)
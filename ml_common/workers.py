@@ -0,0 +1,621 @@
+import os
+import sys
+import json
+import time
+import uuid
+import signal
+import socket
+import sqlite3
+import asyncio
+import logging
+import argparse
+import importlib
+import threading
+import subprocess
+from dataclasses import dataclass
+from typing import AsyncGenerator, Optional
+
+from google.adk.events import Event
+from google.genai import types
+
+# Everything the front process and the workers share lives here: the job
+# queue, the session database and the artifact directory.
+WORKER_DIR = os.getenv("ML_WORKER_DIR", "ml_workers")
+
+# Seconds a claimed job stays leased without a heartbeat. A worker that
+# dies loses its jobs to another worker after at most this long.
+LEASE_S = float(os.getenv("ML_WORKER_LEASE_S", "30"))
+
+# Claims per job before it is failed (worker deaths, not agent errors).
+MAX_ATTEMPTS = int(os.getenv("ML_WORKER_MAX_ATTEMPTS", "3"))
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id TEXT PRIMARY KEY,
+    app TEXT NOT NULL,
+    user_id TEXT NOT NULL,
+    session_id TEXT NOT NULL,
+    message TEXT NOT NULL,
+    status TEXT NOT NULL,             -- queued | running | done | failed
+    attempts INTEGER NOT NULL DEFAULT 0,
+    max_attempts INTEGER NOT NULL,
+    worker TEXT,
+    lease_expires REAL,
+    error TEXT,
+    checkpoint TEXT,                  -- the session before the first attempt (JSON)
+    created REAL NOT NULL,
+    updated REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS jobs_status ON jobs (status, created);
+CREATE TABLE IF NOT EXISTS job_events (
+    job_id TEXT NOT NULL,
+    seq INTEGER NOT NULL,
+    attempt INTEGER NOT NULL,
+    event TEXT NOT NULL,
+    PRIMARY KEY (job_id, seq)
+);
+"""
+
+
+class JobFailed(RuntimeError):
+    pass
+
+
+@dataclass
+class Job:
+    id: str
+    app: str
+    user_id: str
+    session_id: str
+    message: str
+    status: str
+    attempts: int
+    max_attempts: int
+    error: Optional[str] = None
+
+
+# --- Queue ------------------------------------------------------------------
+class JobQueue:
+    """
+    Durable job queue in a local SQLite file, shared by the front process
+    and every worker (WAL mode, one connection per process / thread).
+
+    A worker `claim`s the oldest queued job and holds it under a lease it
+    must `renew`. A job whose lease expires (the worker died or hung) is
+    queued again, up to `max_attempts` claims, then failed. Jobs of the
+    same session never run concurrently, so conversation turns stay in
+    submission order. Result events are appended per job and read back by
+    the front process with `events`.
+    """
+
+    def __init__(self, path: str) -> None:
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self.path = path
+        self._db = sqlite3.connect(path, timeout=30, isolation_level=None)
+        self._db.row_factory = sqlite3.Row
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.executescript(_SCHEMA)
+
+    def close(self) -> None:
+        self._db.close()
+
+    def submit(
+        self,
+        app: str,
+        message: str,
+        user_id: str = "user",
+        session_id: Optional[str] = None,
+        max_attempts: int = MAX_ATTEMPTS,
+    ) -> Job:
+        now = time.time()
+        job = Job(
+            id=uuid.uuid4().hex,
+            app=app,
+            user_id=user_id,
+            session_id=session_id or uuid.uuid4().hex,
+            message=message,
+            status="queued",
+            attempts=0,
+            max_attempts=max_attempts,
+        )
+        self._db.execute(
+            "INSERT INTO jobs (id, app, user_id, session_id, message, status, max_attempts, created, updated)"
+            " VALUES (?, ?, ?, ?, ?, 'queued', ?, ?, ?)",
+            (job.id, app, user_id, job.session_id, message, max_attempts, now, now),
+        )
+        return job
+
+    def claim(self, worker: str, lease_s: float = LEASE_S) -> Optional[Job]:
+        """Lease the oldest runnable job to `worker`, or None if there is none."""
+        now = time.time()
+        self._db.execute("BEGIN IMMEDIATE")
+        try:
+            self._expire_leases(now)
+            row = self._db.execute(
+                "SELECT * FROM jobs WHERE status = 'queued' AND session_id NOT IN"
+                " (SELECT session_id FROM jobs WHERE status = 'running')"
+                " ORDER BY created LIMIT 1"
+            ).fetchone()
+            if row is not None:
+                self._db.execute(
+                    "UPDATE jobs SET status = 'running', worker = ?, attempts = attempts + 1,"
+                    " lease_expires = ?, updated = ? WHERE id = ?",
+                    (worker, now + lease_s, now, row["id"]),
+                )
+            self._db.execute("COMMIT")
+        except BaseException:
+            self._db.execute("ROLLBACK")
+            raise
+        return self.get(row["id"]) if row is not None else None
+
+    def _expire_leases(self, now: float) -> None:
+        expired = self._db.execute(
+            "SELECT id, worker, attempts, max_attempts FROM jobs"
+            " WHERE status = 'running' AND lease_expires < ?",
+            (now,),
+        ).fetchall()
+        for row in expired:
+            if row["attempts"] >= row["max_attempts"]:
+                status, error = "failed", f"Lease expired on {row['attempts']} attempts (last worker {row['worker']})"
+            else:
+                status, error = "queued", None
+            logging.warning("[Workers] Lease of job %s on %s expired; job %s", row["id"], row["worker"], status)
+            self._db.execute(
+                "UPDATE jobs SET status = ?, error = ?, worker = NULL, lease_expires = NULL, updated = ?"
+                " WHERE id = ?",
+                (status, error, now, row["id"]),
+            )
+
+    def renew(self, job_id: str, worker: str, lease_s: float = LEASE_S) -> bool:
+        """Extend the lease; False if `worker` no longer holds the job."""
+        now = time.time()
+        cursor = self._db.execute(
+            "UPDATE jobs SET lease_expires = ?, updated = ?"
+            " WHERE id = ? AND worker = ? AND status = 'running'",
+            (now + lease_s, now, job_id, worker),
+        )
+        return cursor.rowcount == 1
+
+    def append_event(self, job_id: str, worker: str, attempt: int, event_json: str) -> bool:
+        """Store one result event; False (nothing stored) if the lease was lost."""
+        self._db.execute("BEGIN IMMEDIATE")
+        try:
+            held = self._db.execute(
+                "SELECT 1 FROM jobs WHERE id = ? AND worker = ? AND status = 'running'",
+                (job_id, worker),
+            ).fetchone()
+            if held:
+                self._db.execute(
+                    "INSERT INTO job_events (job_id, seq, attempt, event) VALUES"
+                    " (?, (SELECT COALESCE(MAX(seq), 0) + 1 FROM job_events WHERE job_id = ?), ?, ?)",
+                    (job_id, job_id, attempt, event_json),
+                )
+            self._db.execute("COMMIT")
+        except BaseException:
+            self._db.execute("ROLLBACK")
+            raise
+        return bool(held)
+
+    def finish(self, job_id: str, worker: str, error: Optional[str] = None) -> None:
+        self._db.execute(
+            "UPDATE jobs SET status = ?, error = ?, lease_expires = NULL, updated = ?"
+            " WHERE id = ? AND worker = ? AND status = 'running'",
+            ("failed" if error else "done", error, time.time(), job_id, worker),
+        )
+
+    def checkpoint(self, job_id: str) -> Optional[str]:
+        row = self._db.execute("SELECT checkpoint FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return row["checkpoint"] if row is not None else None
+
+    def set_checkpoint(self, job_id: str, worker: str, checkpoint: str) -> None:
+        self._db.execute(
+            "UPDATE jobs SET checkpoint = ? WHERE id = ? AND worker = ? AND status = 'running'",
+            (checkpoint, job_id, worker),
+        )
+
+    def get(self, job_id: str) -> Optional[Job]:
+        row = self._db.execute(
+            "SELECT id, app, user_id, session_id, message, status, attempts, max_attempts, error"
+            " FROM jobs WHERE id = ?",
+            (job_id,),
+        ).fetchone()
+        return Job(**dict(row)) if row is not None else None
+
+    def events(self, job_id: str, after_seq: int = 0) -> list[tuple[int, int, str]]:
+        """`(seq, attempt, event_json)` of the job's events after `after_seq`."""
+        return [
+            tuple(row)
+            for row in self._db.execute(
+                "SELECT seq, attempt, event FROM job_events WHERE job_id = ? AND seq > ? ORDER BY seq",
+                (job_id, after_seq),
+            )
+        ]
+
+    def counts(self) -> dict[str, int]:
+        return dict(self._db.execute("SELECT status, COUNT(*) FROM jobs GROUP BY status").fetchall())
+
+
+def default_queue() -> JobQueue:
+    return JobQueue(os.path.join(WORKER_DIR, "queue.db"))
+
+
+# --- Front process ----------------------------------------------------------
+async def stream_events(
+    queue: JobQueue, job_id: str, poll_s: float = 0.2
+) -> AsyncGenerator[Event, None]:
+    """
+    Yield the job's result events as workers push them, until it finishes.
+
+    If a worker dies mid-job the job is retried from the start, on the
+    session as it was before the first attempt. Events of the dead attempt
+    not yet yielded are dropped; those already yielded are followed by the
+    new attempt's (an attempt change is logged). Raises `JobFailed` if the
+    job fails.
+    """
+    seq = 0
+    attempt = 0
+    while True:
+        job = queue.get(job_id)  # read before the events, so none are missed
+        for seq, event_attempt, event_json in queue.events(job_id, seq):
+            if event_attempt < max(attempt, job.attempts if job else 0):
+                continue  # a dead attempt's, superseded by a retry
+            if event_attempt != attempt:
+                if attempt:
+                    logging.warning("[Workers] Job %s retried (attempt %d)", job_id, event_attempt)
+                attempt = event_attempt
+            yield Event.model_validate_json(event_json)
+        if job is None:
+            raise JobFailed(f"Unknown job {job_id}")
+        if job.status == "failed":
+            raise JobFailed(job.error or "failed")
+        if job.status == "done":
+            return
+        await asyncio.sleep(poll_s)
+
+
+# --- Worker -----------------------------------------------------------------
+def load_agent(app: str):
+    """
+    The root agent for `app`: an app package name ("ml_team" ->
+    `ml_team.agent.root_agent`) or an explicit "module:attribute".
+    """
+    module, _, attribute = app.partition(":")
+    if not attribute:
+        module, attribute = f"{app}.agent", "root_agent"
+    return getattr(importlib.import_module(module), attribute)
+
+
+class _LeaseKeeper(threading.Thread):
+    """
+    Renews the leases of a worker's running jobs from a thread, so a job
+    that blocks the event loop (e.g. an in-process `run_python`) does not
+    lose its lease while it is still alive.
+    """
+
+    def __init__(self, queue_path: str, worker: str, lease_s: float) -> None:
+        super().__init__(name="lease-keeper", daemon=True)
+        self.queue_path = queue_path
+        self.worker = worker
+        self.lease_s = lease_s
+        self.held: dict[str, bool] = {}
+        self._stop = threading.Event()
+
+    def run(self) -> None:
+        queue = JobQueue(self.queue_path)
+        try:
+            while not self._stop.wait(self.lease_s / 3):
+                for job_id in list(self.held):
+                    if self.held.get(job_id) and not queue.renew(job_id, self.worker, self.lease_s):
+                        logging.warning("[Workers] %s lost the lease of job %s", self.worker, job_id)
+                        self.held[job_id] = False
+        finally:
+            queue.close()
+
+    def stop(self) -> None:
+        self._stop.set()
+
+
+class Worker:
+    """
+    Claims jobs from the queue and runs them with a Runner per app.
+
+    Sessions and artifacts live in `WORKER_DIR` (ADK's SQLite session
+    service and file artifact service), so any worker can take the next
+    turn of any session. Before a job's first attempt its session is
+    checkpointed (last event and session state); a retry rolls the session
+    back to that checkpoint, so the dead attempt's message and events are
+    not replayed. App- and user-scoped state are shared across sessions
+    and are not rolled back. Up to `concurrency` jobs run at once on the
+    worker's event loop.
+    """
+
+    def __init__(
+        self,
+        queue_path: str,
+        worker_id: Optional[str] = None,
+        concurrency: int = 1,
+        lease_s: float = LEASE_S,
+        poll_s: float = 0.5,
+    ) -> None:
+        self.queue = JobQueue(queue_path)
+        self.sessions_path = os.path.join(WORKER_DIR, "sessions.db")
+        self.worker_id = worker_id or f"{socket.gethostname()}:{os.getpid()}"
+        self.concurrency = concurrency
+        self.lease_s = lease_s
+        self.poll_s = poll_s
+        self.leases = _LeaseKeeper(queue_path, self.worker_id, lease_s)
+        self._runners: dict = {}
+        self._stopping = False
+
+    def _runner(self, app: str):
+        if app not in self._runners:
+            from google.adk.artifacts import FileArtifactService
+            from google.adk.runners import Runner
+            from google.adk.sessions.sqlite_session_service import SqliteSessionService
+
+            from ml_common.plugins import get_common_plugins
+
+            self._runners[app] = Runner(
+                app_name=app.partition(":")[0],
+                agent=load_agent(app),
+                session_service=SqliteSessionService(self.sessions_path),
+                artifact_service=FileArtifactService(os.path.join(WORKER_DIR, "artifacts")),
+                plugins=get_common_plugins(),
+            )
+        return self._runners[app]
+
+    def _checkpoint_or_rollback(self, app_name: str, job: Job) -> None:
+        """
+        Record the session's checkpoint on the job, or, if an earlier
+        attempt recorded one, roll the session back to it.
+        """
+        db = sqlite3.connect(self.sessions_path, timeout=30, isolation_level=None)
+        try:
+            key = (app_name, job.user_id, job.session_id)
+            checkpoint = self.queue.checkpoint(job.id)
+            if checkpoint is None:
+                last_rowid, = db.execute(
+                    "SELECT COALESCE(MAX(rowid), 0) FROM events"
+                    " WHERE app_name = ? AND user_id = ? AND session_id = ?",
+                    key,
+                ).fetchone()
+                state, = db.execute(
+                    "SELECT state FROM sessions WHERE app_name = ? AND user_id = ? AND id = ?", key
+                ).fetchone()
+                self.queue.set_checkpoint(
+                    job.id, self.worker_id, json.dumps({"last_rowid": last_rowid, "state": state})
+                )
+                return
+
+            checkpoint = json.loads(checkpoint)
+            db.execute("BEGIN IMMEDIATE")
+            try:
+                dropped = db.execute(
+                    "DELETE FROM events WHERE app_name = ? AND user_id = ? AND session_id = ? AND rowid > ?",
+                    (*key, checkpoint["last_rowid"]),
+                ).rowcount
+                # A newer update_time also makes a stale in-memory copy of the
+                # session (a hung worker waking up) fail on its next append.
+                db.execute(
+                    "UPDATE sessions SET state = ?, update_time = ? WHERE app_name = ? AND user_id = ? AND id = ?",
+                    (checkpoint["state"], time.time(), *key),
+                )
+                db.execute("COMMIT")
+            except BaseException:
+                db.execute("ROLLBACK")
+                raise
+            logging.warning(
+                "[Workers] Job %s attempt %d: rolled session %s back by %d event(s)",
+                job.id, job.attempts, job.session_id, dropped,
+            )
+        finally:
+            db.close()
+
+    async def _run_job(self, job: Job) -> None:
+        self.leases.held[job.id] = True
+        logging.info("[Workers] %s running job %s (%s, attempt %d)", self.worker_id, job.id, job.app, job.attempts)
+        try:
+            runner = self._runner(job.app)
+            session_service = runner.session_service
+            if await session_service.get_session(
+                app_name=runner.app_name, user_id=job.user_id, session_id=job.session_id
+            ) is None:
+                await session_service.create_session(
+                    app_name=runner.app_name, user_id=job.user_id, session_id=job.session_id
+                )
+            self._checkpoint_or_rollback(runner.app_name, job)
+            async for event in runner.run_async(
+                user_id=job.user_id,
+                session_id=job.session_id,
+                new_message=types.Content(role="user", parts=[types.Part(text=job.message)]),
+            ):
+                event_json = event.model_dump_json(exclude_none=True, by_alias=True)
+                if not self.leases.held[job.id] or not self.queue.append_event(
+                    job.id, self.worker_id, job.attempts, event_json
+                ):
+                    logging.warning("[Workers] Abandoning job %s: lease lost", job.id)
+                    return
+            self.queue.finish(job.id, self.worker_id)
+        except Exception as e:
+            logging.exception("[Workers] Job %s failed", job.id)
+            self.queue.finish(job.id, self.worker_id, error=f"{type(e).__name__}: {e}")
+        finally:
+            self.leases.held.pop(job.id, None)
+
+    async def run(self) -> None:
+        self.leases.start()
+        running: set[asyncio.Task] = set()
+        try:
+            while not self._stopping:
+                job = self.queue.claim(self.worker_id, self.lease_s) if len(running) < self.concurrency else None
+                if job is None:
+                    if running:
+                        _, running = await asyncio.wait(running, timeout=self.poll_s)
+                    else:
+                        await asyncio.sleep(self.poll_s)
+                    continue
+                task = asyncio.create_task(self._run_job(job))
+                running.add(task)
+            if running:
+                await asyncio.wait(running)  # drain: finish claimed jobs
+        finally:
+            self.leases.stop()
+
+    def stop(self) -> None:
+        """Stop claiming new jobs; `run` returns once running ones finish."""
+        self._stopping = True
+
+
+# --- Supervisor -------------------------------------------------------------
+def _cpu_slices(cores: list[int], n: int) -> list[list[int]]:
+    """Split `cores` into `n` disjoint, contiguous slices (shared round-robin if n > cores)."""
+    if n >= len(cores):
+        return [[cores[i % len(cores)]] for i in range(n)]
+    size, extra = divmod(len(cores), n)
+    slices, start = [], 0
+    for i in range(n):
+        end = start + size + (i < extra)
+        slices.append(cores[start:end])
+        start = end
+    return slices
+
+
+class WorkerPool:
+    """
+    Starts `workers` worker processes (default: one per core) and restarts
+    any that die. Jobs a dead worker held are picked up by the others once
+    their leases expire.
+
+    Each worker is pinned to its own slice of the host's cores, so the
+    per-process execution scheduler (ml_engineer/scheduler.py) of every
+    worker hands out different cores; the memory budget is split the same
+    way when a per-job memory limit is set.
+    """
+
+    def __init__(
+        self,
+        workers: Optional[int] = None,
+        concurrency: int = 1,
+        queue_path: Optional[str] = None,
+    ) -> None:
+        self.workers = workers or len(os.sched_getaffinity(0))
+        self.concurrency = concurrency
+        self.queue_path = queue_path or os.path.join(WORKER_DIR, "queue.db")
+        self.processes: list[subprocess.Popen] = []
+        self.cpusets = _cpu_slices(sorted(os.sched_getaffinity(0)), self.workers)
+
+    def _env(self) -> dict[str, str]:
+        from ml_engineer.scheduler import _physical_memory_mb
+
+        env = dict(os.environ)
+        if os.getenv("ML_ENGINEER_JOB_MEM_MB"):
+            total = int(os.getenv("ML_ENGINEER_MEM_BUDGET_MB", "0")) or int((_physical_memory_mb() or 0) * 0.8)
+            if total:
+                env["ML_ENGINEER_MEM_BUDGET_MB"] = str(max(1, total // self.workers))
+        return env
+
+    def _spawn(self, index: int) -> subprocess.Popen:
+        return subprocess.Popen([
+            sys.executable, "-m", "ml_common.workers", "worker",
+            "--queue", self.queue_path,
+            "--concurrency", str(self.concurrency),
+            "--cpuset", ",".join(map(str, self.cpusets[index])),
+        ], env=self._env())
+
+    def start(self) -> None:
+        JobQueue(self.queue_path).close()  # create the schema once, up front
+        self.processes = [self._spawn(i) for i in range(self.workers)]
+        logging.info("[Workers] Started %d workers on %s", self.workers, self.queue_path)
+
+    def supervise(self) -> None:
+        """Restart dead workers; call periodically."""
+        for i, process in enumerate(self.processes):
+            if process.poll() is not None:
+                logging.warning("[Workers] Worker pid %d exited with %s; restarting", process.pid, process.returncode)
+                self.processes[i] = self._spawn(i)
+
+    def stop(self, timeout_s: float = 30.0) -> None:
+        for process in self.processes:
+            if process.poll() is None:
+                process.send_signal(signal.SIGTERM)
+        deadline = time.monotonic() + timeout_s
+        for process in self.processes:
+            try:
+                process.wait(max(0.0, deadline - time.monotonic()))
+            except subprocess.TimeoutExpired:
+                process.kill()
+
+
+# --- CLI --------------------------------------------------------------------
+def _serve(args) -> None:
+    pool = WorkerPool(args.workers, args.concurrency, args.queue)
+    pool.start()
+    try:
+        while True:
+            time.sleep(1.0)
+            pool.supervise()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        pool.stop()
+
+
+def _work(args) -> None:
+    if args.cpuset:
+        # Before anything reads the affinity: the execution scheduler
+        # schedules on exactly this slice.
+        os.sched_setaffinity(0, [int(core) for core in args.cpuset.split(",")])
+    worker = Worker(args.queue, concurrency=args.concurrency)
+    loop = asyncio.new_event_loop()
+    loop.add_signal_handler(signal.SIGTERM, worker.stop)
+    loop.add_signal_handler(signal.SIGINT, worker.stop)
+    loop.run_until_complete(worker.run())
+
+
+async def _submit(args) -> None:
+    queue = JobQueue(args.queue)
+    job = queue.submit(args.app, args.message, user_id=args.user, session_id=args.session)
+    print(f"job {job.id} (session {job.session_id})", file=sys.stderr)
+    async for event in stream_events(queue, job.id):
+        if event.content and event.content.parts and not event.partial:
+            text = "".join(p.text or "" for p in event.content.parts if not p.thought)
+            if text:
+                print(f"[{event.author}] {text}\n")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Run agent sessions on local worker processes.")
+    parser.add_argument("--queue", default=os.path.join(WORKER_DIR, "queue.db"))
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    serve = commands.add_parser("serve", help="start and supervise worker processes")
+    serve.add_argument("--workers", type=int, default=None, help="default: one per core")
+    serve.add_argument("--concurrency", type=int, default=1, help="jobs per worker at once")
+
+    worker = commands.add_parser("worker", help="run a single worker (started by serve)")
+    worker.add_argument("--concurrency", type=int, default=1)
+    worker.add_argument("--cpuset", default=None, help="cores to pin this worker to, e.g. 0,1")
+
+    submit = commands.add_parser("submit", help="queue a message and stream the replies")
+    submit.add_argument("app", help='app package ("ml_team") or "module:attribute"')
+    submit.add_argument("message")
+    submit.add_argument("--user", default="user")
+    submit.add_argument("--session", default=None, help="continue an existing session")
+
+    # `--queue` is accepted before or after the command.
+    for sub in (serve, worker, submit):
+        sub.add_argument("--queue", default=argparse.SUPPRESS)
+
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s [%(levelname)s] %(message)s")
+    if args.command == "serve":
+        _serve(args)
+    elif args.command == "worker":
+        _work(args)
+    else:
+        asyncio.run(_submit(args))
+
+
+if __name__ == "__main__":
+    main()
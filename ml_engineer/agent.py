@@ -1,54 +1,125 @@
-from ml_common.observability import init_agentops
-init_agentops(trace_name="ml_engineer")
+from ml_common.observability import agentops_callback
+from ml_common.state_offload import OffloadingLlmAgent
+from ml_common.hedging import apply_call_policy
 
 STATE_FEEDBACK = "last_feedback"  # keep only what we actually use
 
 import io
+import os
+import json
+import time
 import contextlib
 import traceback
 
-from google.adk.agents import LlmAgent, LoopAgent
-from google.adk.models import Gemini
+from google.adk.agents import LoopAgent
 from google.adk.tools.function_tool import FunctionTool
 from google.adk.tools.exit_loop_tool import exit_loop
+from google.adk.tools.tool_context import ToolContext
+
+from ml_engineer.errors import failure_log, register_source
+from ml_engineer.experiments import run_experiments
+from ml_engineer.preflight import preflight
+from ml_engineer.profiling import Profiler, new_profile_path
+from ml_engineer.results import (
+    STATE_LAST_RUN,
+    Reporter,
+    RunResult,
+    failed_run_precheck,
+    peak_rss_mb,
+)
+from ml_engineer.watchdog import EarlyStop, Progress, log_stop
 
 # --- Local Python executor as a tool ----------------------------------------
-def run_python(code: str) -> str:
+def run_python(code: str, tool_context: ToolContext, profile: bool = False) -> dict:
     """
-    Execute arbitrary Python code in the current venv and return
-    status + captured stdout/stderr as a single string.
+    Execute a complete Python script in the current venv and return a
+    structured result: status, exit_code, error, duration_s, peak_rss_mb,
+    metrics, artifacts and a truncated log of stdout/stderr.
+
+    Inside the script, call `report(metric=value, ..., artifact="path")`
+    to put key results into `metrics` / `artifacts`.
+
+    With `profile=True` the run is profiled (cProfile + tracemalloc) and the
+    result gets a `profile` field: the slowest functions by cumulative
+    time, peak traced memory, the biggest allocation sites, and the path of
+    the full `.prof` file.
+
+    The script is checked statically first (syntax, missing modules,
+    package installs, large downloads); if that fails it is not run and
+    the result has status "REJECTED" and the findings under `preflight`.
+
+    In training loops, call `progress(step=..., loss=...)` as well: the
+    run is stopped early when a value becomes NaN / inf, the loss diverges
+    or the heartbeats stop (see `ml_engineer/watchdog.py`). The result then
+    has the reason under `stopped`; `progress` holds the last heartbeat.
 
     WARNING: This is intentionally unsafe, for local dev use only.
     """
+    rejection, warnings = preflight(code, tool_context.state, scope=tool_context.agent_name)
+    if rejection:
+        return rejection
+
     buf_out = io.StringIO()
     buf_err = io.StringIO()
-    ns = {}
-    status = "OK"
+    reporter = Reporter()
+    progress = Progress()
+    ns = {"report": reporter, "progress": progress}
+    exit_code = 0
+    error = None
+
+    profiler = Profiler(new_profile_path()) if profile else None
 
+    started = time.perf_counter()
+    register_source("<ml_engineer>", code)
     try:
         with contextlib.redirect_stdout(buf_out), contextlib.redirect_stderr(buf_err):
             compiled = compile(code, "<ml_engineer>", "exec")
-            exec(compiled, ns, ns)
+            with progress, profiler or contextlib.nullcontext():
+                exec(compiled, ns, ns)
+    except EarlyStop:
+        exit_code = 1
+        error = f"EarlyStop: {progress.watchdog.stopped['reason']}"
+        log_stop(tool_context.session.id, progress.watchdog)
+    except SystemExit as e:
+        # sys.exit() in the script must not take the agent process down.
+        exit_code = e.code if isinstance(e.code, int) else int(e.code is not None)
+        if exit_code:
+            error = f"SystemExit: {e.code}"
     except Exception as e:
-        status = f"ERROR: {type(e).__name__}: {e}"
+        exit_code = 1
+        error = f"{type(e).__name__}: {e}"
         traceback.print_exc(file=buf_err)
 
-    stdout = buf_out.getvalue()
-    stderr = buf_err.getvalue()
-
-    return (
-        f"STATUS: {status}\n\n"
-        f"STDOUT:\n{stdout}\n\n"
-        f"STDERR:\n{stderr}"
+    duration = time.perf_counter() - started
+    log, repeated = failure_log(
+        tool_context.state, buf_out.getvalue(), buf_err.getvalue(), error, tool_context.agent_name
+    )
+    result = RunResult(
+        status="OK" if exit_code == 0 else "ERROR",
+        exit_code=exit_code,
+        duration_s=round(duration, 3),
+        error=error,
+        repeated=repeated,
+        # In-process: this is the peak of the agent process itself.
+        peak_rss_mb=peak_rss_mb(),
+        metrics=reporter.metrics,
+        artifacts=reporter.artifacts,
+        profile=profiler.summary if profiler else None,
+        preflight=warnings,
+        progress=progress.watchdog.summary(),
+        stopped=progress.watchdog.stopped,
+        log=log,
     )
+    tool_context.state[STATE_LAST_RUN] = json.dumps(result.summary())
+    return result.to_dict()
 
 # --- ML Engineer agent ------------------------------------------------------
 
 
-ml_engineer = LlmAgent(
+ml_engineer = OffloadingLlmAgent(
     name="ML_Engineer",
-    model=Gemini(model="gemini-2.5-flash"),
-    tools=[run_python],
+    model="gemini-2.5-flash",
+    tools=[run_python, run_experiments],
     instruction=f"""
 You are an ML Engineer. Your job is to implement and run Python code
 for a single task.
@@ -86,7 +157,7 @@ If these conditions are NOT met, you MUST reply exactly with:
 
 [ML_Engineer] Waiting for finalized research/plan; no code executed.
 
-and you MUST NOT call the `run_python` tool in that case.
+and you MUST NOT call the `run_python` or `run_experiments` tools in that case.
 
 --- NORMAL BEHAVIOR WHEN PLAN IS READY ---
 
@@ -107,18 +178,53 @@ In each attempt you MUST:
    - Keep training short (few epochs, small subsets).
    - Ensure the script prints the key result(s) needed to verify the task:
      e.g. a sum, an accuracy, a path to a saved model, etc.
+   - Also pass them to `report(...)`, which is predefined when the script
+     runs through the tools (do NOT import or define it), e.g.:
+       report(accuracy=acc, f1=f1, artifact="best_model.pth")
+     Keyword arguments become `metrics`; `artifact` adds a saved file path.
+   - In training loops, also call `progress(...)`, predefined the same
+     way, once per step or epoch, e.g.:
+       progress(step=epoch, loss=loss.item())
+     A run whose loss becomes NaN / inf, diverges, or that stops reporting
+     progress is stopped early instead of using up its time.
 
 3. Call the `run_python` tool EXACTLY ONCE, passing your full script
    as the `code` argument.
    - Do NOT execute code in any other way.
    - Do NOT call `run_python` multiple times in a single attempt.
-
-4. After the tool result comes back, read its STATUS / STDOUT / STDERR
-   and write a short summary of what happened (success or failure)
-   and what was printed.
+   - Pass `profile=True` when the task is about speed or memory, or the
+     previous run was too slow. The result then has a `profile` field with
+     the slowest functions ("top_functions", by cumulative time), peak
+     traced memory and the biggest allocation sites: optimize those
+     hotspots first and compare against the previous attempt's profile.
+   - EXCEPTION: if the task asks to compare several models or
+     hyperparameter settings on the same data, call `run_experiments`
+     EXACTLY ONCE instead of `run_python`:
+       * `prep_code` loads / splits the data once and assigns a dict to `data`,
+       * `experiment_code` trains and evaluates ONE config (it sees `data`
+         and `config`) and assigns a dict of metrics to `result`,
+       * `configs` is a list of dicts, each with a short "name".
+     The configs then run in parallel on all cores and their `result`
+     dicts come back as `metrics`, keyed by config name. If a model must
+     be saved, save each config's model to its own path and put that path
+     in `result` under the key "artifact".
+
+4. After the tool result comes back, read its `status`, `error`,
+   `metrics`, `artifacts` and `log` fields and write a short summary of
+   what happened (success or failure) and the key results.
 
 If the previous attempt failed or the judge gave hints, use that feedback
-to improve this attempt.
+to improve this attempt. A failed result's "log" shows only your script's
+frames and the exception; library frames are collapsed. If "repeated" is
+above 0, your last fix did not change the error: take a different approach
+instead of patching the same line again. A "REJECTED" status means the
+script was checked before running and not executed: its "preflight"
+findings name the line and the problem (syntax error, module that is not
+installed, package install, large download). Non-blocking findings, e.g.
+network access, are listed under "preflight" of a normal result.
+A run stopped early has "EarlyStop" in "error", the rule and reason under
+"stopped" and the log up to that point; "progress" holds the last
+heartbeat it reported.
 
 You MUST NOT:
 - Start unrelated experiments or train many different models.
@@ -131,10 +237,13 @@ You MUST NOT:
 # --- Judge agent ------------------------------------------------------------
 
 
-judge = LlmAgent(
+judge = OffloadingLlmAgent(
     name="EngineerJudge",
-    model=Gemini(model="gemini-2.5-flash"),  # keep this as flash, NOT lite
+    model="gemini-2.5-flash",  # keep this as flash, NOT lite
     tools=[FunctionTool(exit_loop)],
+    # Failed runs get RETRY feedback from the structured result, without
+    # a model call.
+    before_agent_callback=failed_run_precheck(STATE_FEEDBACK),
     instruction=f"""
 You are a strict judge for an ML coding task.
 
@@ -164,8 +273,7 @@ If ANY of the following are true:
    (or a very similar waiting message).
 
 2) There is NO `run_python` tool result in the context:
-   - i.e. you do not see a block starting with
-     "STATUS:" followed by "STDOUT:" and "STDERR:".
+   - i.e. you do not see a tool result with a "status" field.
 
 then you MUST:
 
@@ -193,7 +301,16 @@ NORMAL EVALUATION BEHAVIOR (WHEN CODE HAS RUN)
 Available context:
 - Task description: {{+ user_input +}}
 - Engineer's latest message (plan + `run_python` tool call + summary).
-- The `run_python` tool result, which includes STATUS, STDOUT and STDERR.
+- The `run_python` tool result: a structured object with "status"
+  ("OK" / "ERROR" / "REJECTED" = not run, failed the static check),
+  "exit_code", "error", "duration_s", "peak_rss_mb",
+  "metrics" and "artifacts" (reported by the script), "repeated" (how
+  many earlier runs failed with this same error), "profile" (hotspots,
+  only for profiled runs), "progress" / "stopped" (last training
+  heartbeat, and why the run was stopped early, if it was) and "log"
+  (truncated stdout/stderr). A `run_experiments` result has the same
+  fields, with "metrics" keyed by config name, and counts as a
+  `run_python` result everywhere below.
 - Your previous feedback (if any): {{+ {STATE_FEEDBACK} +}}
 
 Your job:
@@ -204,18 +321,16 @@ Your job:
    The attempt is ACCEPTABLE if and only if ALL of the following hold:
 
    - The script was actually executed via `run_python` and you see
-     a tool result with lines like:
-       "STATUS: OK"
-       "STDOUT:"
-       "STDERR:"
+     its tool result.
 
    - The correct dataset / library family was used
      (e.g. Iris when the task is about Iris, MNIST when the task is about MNIST).
 
-   - The STATUS starts with "OK" (no unhandled exceptions / tracebacks).
+   - "status" is "OK" (no unhandled exceptions / tracebacks).
 
-   - The key requested outputs were clearly printed in STDOUT
-     (sum, accuracy, F1, model path, etc. as requested by the task).
+   - The key requested outputs are present (sum, accuracy, F1, model
+     path, etc. as requested by the task): check "metrics" and
+     "artifacts" first, and the "log" only for what is not reported there.
 
    Low accuracy is acceptable as long as the pipeline and dataset
    match the request.
@@ -258,8 +373,38 @@ Constraints:
 
 # --- Root agent for ADK web / CLI -------------------------------------------
 
-root_agent = LoopAgent(
-    name="EngineerLoop",
-    sub_agents=[ml_engineer, judge],
-    max_iterations=3,  # hard cap
-)
\ No newline at end of file
+# ML_ENGINEER_PARALLEL_K > 1 switches to parallel candidate attempts:
+# K scripts are generated and executed concurrently, first accepted run wins.
+# The single engineer's scripts run in child processes by default;
+# ML_ENGINEER_EXECUTOR=inprocess runs them in this process, without limits.
+# Child processes and `run_experiments` go through the shared execution
+# scheduler (ml_engineer/scheduler.py), which ML_ENGINEER_CPU_BUDGET,
+# ML_ENGINEER_JOB_* and ML_ENGINEER_MEM_BUDGET_MB configure.
+PARALLEL_K = int(os.getenv("ML_ENGINEER_PARALLEL_K", "1"))
+EXECUTOR = os.getenv("ML_ENGINEER_EXECUTOR", "subprocess").lower()
+
+if PARALLEL_K > 1:
+    from ml_engineer.parallel import build_parallel_engineer_loop
+
+    root_agent = build_parallel_engineer_loop(
+        ml_engineer,
+        judge,
+        k=PARALLEL_K,
+        max_iterations=3,  # hard cap
+    )
+else:
+    if EXECUTOR == "subprocess":
+        from ml_engineer.parallel import SubprocessExecutor
+
+        ml_engineer.tools = [SubprocessExecutor().run_python, run_experiments]
+    root_agent = LoopAgent(
+        name="EngineerLoop",
+        sub_agents=[ml_engineer, judge],
+        max_iterations=3,  # hard cap
+    )
+
+# Telemetry is set up on the first invocation, not at import time.
+root_agent.before_agent_callback = agentops_callback("ml_engineer")
+
+# Per-call deadlines and hedging for the model calls (see ml_common/hedging.py).
+apply_call_policy(root_agent)
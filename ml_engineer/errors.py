@@ -0,0 +1,170 @@
+import os
+import re
+import linecache
+from typing import Optional
+
+from ml_engineer.results import truncate_log
+
+# Session state: {error signature: number of failed runs with it}. Cleared
+# by the next successful run.
+STATE_ERROR_HISTORY = "error_history"
+
+# Filenames of code written by the engineer: in-process `compile()` names
+# and the temp scripts of the subprocess executor.
+USER_FILENAMES = ("<ml_engineer>", "<prep>", "<experiment>")
+USER_SCRIPT_PREFIX = "ml_engineer_"
+
+# Characters of exception message kept per traceback.
+MESSAGE_CHARS = 1500
+
+_FRAME = re.compile(r'^  File "(?P<file>[^"]+)", line \d+')
+_CHAIN_LINES = (
+    "During handling of the above exception, another exception occurred:",
+    "The above exception was the direct cause of the following exception:",
+)
+
+
+def register_source(filename: str, code: str) -> None:
+    """Make `code` compiled as `filename` show its source lines in tracebacks."""
+    linecache.cache[filename] = (len(code), None, code.splitlines(True), filename)
+
+
+def _is_user_frame(filename: str) -> bool:
+    base = os.path.basename(filename)
+    return filename in USER_FILENAMES or (base.startswith(USER_SCRIPT_PREFIX) and base.endswith(".py"))
+
+
+def _package(filename: str) -> str:
+    """Top-level package a library frame belongs to, e.g. "torch"."""
+    parts = filename.replace("\\", "/").split("/")
+    for marker in ("site-packages", "dist-packages"):
+        if marker in parts:
+            i = parts.index(marker)
+            if i + 1 < len(parts):
+                return parts[i + 1].removesuffix(".py")
+    for i, part in enumerate(parts):
+        if re.fullmatch(r"python3\.\d+", part) and i + 1 < len(parts):
+            return parts[i + 1].removesuffix(".py")  # stdlib
+    return os.path.basename(filename).removesuffix(".py") or filename
+
+
+def _collapse(frames: list[tuple[str, list[str]]]) -> list[str]:
+    """Keep user frames and the innermost frame; fold the rest into one line each run."""
+    out: list[str] = []
+    skipped: list[str] = []
+
+    def flush() -> None:
+        if skipped:
+            packages = ", ".join(dict.fromkeys(_package(f) for f in skipped))
+            noun = "frame" if len(skipped) == 1 else "frames"
+            out.append(f"  [... {len(skipped)} library {noun}: {packages} ...]")
+            skipped.clear()
+
+    for i, (filename, lines) in enumerate(frames):
+        if _is_user_frame(filename) or i == len(frames) - 1:
+            flush()
+            out.extend(lines)
+        else:
+            skipped.append(filename)
+    flush()
+    return out
+
+
+def minimize_traceback(text: str) -> str:
+    """
+    Shorten every Python traceback in `text` (e.g. a script's stderr).
+
+    User-script frames, the innermost frame (where the error was raised)
+    and the exception message are kept; runs of library frames (torch,
+    sklearn, runpy, the executor itself, ...) become one summary line.
+    Lines outside tracebacks are left as they are.
+    """
+    lines = text.splitlines()
+    out: list[str] = []
+    i = 0
+    while i < len(lines):
+        if lines[i] != "Traceback (most recent call last):":
+            out.append(lines[i])
+            i += 1
+            continue
+
+        out.append(lines[i])
+        i += 1
+        frames: list[tuple[str, list[str]]] = []
+        while i < len(lines) and lines[i].startswith("  "):
+            match = _FRAME.match(lines[i])
+            if match:
+                frames.append((match["file"], [lines[i]]))
+            elif frames:
+                frames[-1][1].append(lines[i])  # source line / carets
+            i += 1
+        out.extend(_collapse(frames))
+
+        # The exception message runs until the next traceback or chain line.
+        message: list[str] = []
+        while (
+            i < len(lines)
+            and lines[i] != "Traceback (most recent call last):"
+            and lines[i] not in _CHAIN_LINES
+        ):
+            message.append(lines[i])
+            i += 1
+        message_text = "\n".join(message).rstrip()
+        if len(message_text) > MESSAGE_CHARS:
+            message_text = f"{message_text[:MESSAGE_CHARS]}... [{len(message_text) - MESSAGE_CHARS} more chars]"
+        out.append(message_text)
+        if i < len(lines) and lines[i] in _CHAIN_LINES:
+            out.extend(["", lines[i], ""])
+            i += 1
+    return "\n".join(out)
+
+
+# --- Repeated errors --------------------------------------------------------
+def error_signature(error: str) -> str:
+    """
+    `error` ("Type: message") with run-specific details (numbers, hex
+    addresses, temp paths) masked, so the same failure matches across
+    attempts even if shapes, line numbers or file names changed.
+    """
+    sig = re.sub(r"0x[0-9a-fA-F]+", "0x_", error)
+    sig = re.sub(r"/\S*/" + USER_SCRIPT_PREFIX + r"\w+\.py", "<script>", sig)
+    sig = re.sub(r"\d+(\.\d+)?", "N", sig)
+    return sig.strip()[:300]
+
+
+def failure_log(
+    state,
+    stdout: str,
+    stderr: str,
+    error: Optional[str],
+    scope: str = "",
+) -> tuple[str, int]:
+    """
+    Build a run's log and count earlier runs that failed the same way.
+
+    Tracebacks in `stderr` are minimized. When `error` was already seen in
+    this session by the same `scope` (the calling agent, so that parallel
+    candidates do not see each other's attempts as their own), its
+    traceback is not sent again: the log keeps stdout and a one-line
+    "same error" note instead. A successful run (`error` None) clears the
+    scope's history. Returns `(log, repeated)`.
+    """
+    histories = dict(state.get(STATE_ERROR_HISTORY) or {})
+    history = dict(histories.get(scope) or {})
+    if error is None:
+        if history:
+            histories.pop(scope)
+            state[STATE_ERROR_HISTORY] = histories
+        return truncate_log(stdout, minimize_traceback(stderr)), 0
+
+    signature = error_signature(error)
+    repeated = history.get(signature, 0)
+    history[signature] = repeated + 1
+    histories[scope] = history
+    state[STATE_ERROR_HISTORY] = histories
+
+    if repeated:
+        runs = "run" if repeated == 1 else "runs"
+        note = f"Same error as {repeated} earlier {runs}, traceback omitted: {error}"
+        return truncate_log(stdout, note), repeated
+    return truncate_log(stdout, minimize_traceback(stderr)), 0
@@ -0,0 +1,296 @@
+import io
+import os
+import asyncio
+import json
+import time
+import shutil
+import tempfile
+import contextlib
+import traceback
+from typing import Optional
+
+from google.adk.tools.tool_context import ToolContext
+
+from ml_engineer.errors import failure_log, register_source
+from ml_engineer.preflight import preflight
+from ml_engineer.results import (
+    STATE_LAST_RUN,
+    RunResult,
+    peak_rss_mb,
+    to_jsonable,
+    truncate_log,
+)
+from ml_engineer.scheduler import THREAD_ENV_VARS, Lease, get_scheduler
+from ml_engineer.watchdog import EarlyStop, Progress
+
+# Worker processes for `run_experiments`; -1 means all cores the scheduler has.
+N_JOBS = int(os.getenv("ML_ENGINEER_EXPERIMENT_JOBS", "-1"))
+
+# Output kept per config, so one chatty config cannot crowd out the others.
+ROW_LOG_CHARS = 1000
+
+
+def _init_worker(cores: tuple[int, ...], mem_mb: Optional[int]) -> None:
+    """Pin a pool worker to the lease's cores and cap its memory."""
+    if hasattr(os, "sched_setaffinity"):
+        os.sched_setaffinity(0, cores)
+    if mem_mb:
+        try:
+            import resource
+
+            _, hard = resource.getrlimit(resource.RLIMIT_DATA)
+            limit = mem_mb * 1024 * 1024
+            if hard != resource.RLIM_INFINITY:
+                limit = min(limit, hard)
+            resource.setrlimit(resource.RLIMIT_DATA, (limit, hard))
+        except (ImportError, ValueError, OSError):
+            pass
+
+
+def _run_one(experiment_code: str, config: dict, data_path: str) -> dict:
+    """
+    Run one experiment config inside a pool worker.
+
+    The prepared data is memory-mapped from `data_path`, so numpy arrays
+    are shared between workers instead of being copied into each of them.
+    """
+    import joblib
+
+    started = time.perf_counter()
+    progress = Progress()
+    ns = {"data": joblib.load(data_path, mmap_mode="r"), "config": config, "progress": progress}
+    buf = io.StringIO()
+    row = {"name": config.get("name", ""), "status": "OK", "metrics": {}}
+
+    register_source("<experiment>", experiment_code)
+    try:
+        with contextlib.redirect_stdout(buf), contextlib.redirect_stderr(buf), progress:
+            exec(compile(experiment_code, "<experiment>", "exec"), ns, ns)
+        result = ns.get("result")
+        if not isinstance(result, dict):
+            raise ValueError("experiment_code must assign a dict to `result`")
+        row["metrics"] = result
+    except EarlyStop:
+        row["status"] = f"ERROR: EarlyStop: {progress.watchdog.stopped['reason']}"
+        row["traceback"] = ""
+    except Exception as e:
+        row["status"] = f"ERROR: {type(e).__name__}: {e}"
+        row["traceback"] = traceback.format_exc()
+
+    row["stdout"] = truncate_log(buf.getvalue(), "", ROW_LOG_CHARS)
+    row["seconds"] = time.perf_counter() - started
+    row["peak_rss_mb"] = peak_rss_mb()
+    return row
+
+
+def _format_value(value) -> str:
+    if isinstance(value, float):
+        return f"{value:.4f}"
+    return str(value)
+
+
+def _results_table(rows: list[dict]) -> str:
+    metric_names = []
+    for row in rows:
+        for key in row["metrics"]:
+            if key not in metric_names:
+                metric_names.append(key)
+
+    header = ["name", "status", "seconds"] + metric_names
+    lines = [
+        "| " + " | ".join(header) + " |",
+        "|" + "---|" * len(header),
+    ]
+    for row in rows:
+        status = "OK" if row["status"] == "OK" else "ERROR"
+        cells = [row["name"], status, f"{row['seconds']:.1f}"]
+        cells += [_format_value(row["metrics"].get(m, "")) for m in metric_names]
+        lines.append("| " + " | ".join(cells) + " |")
+    return "\n".join(lines)
+
+
+def _prep(prep_code: str, data_path: str) -> dict:
+    """
+    Run `prep_code` inside a pool worker, under the lease's limits, and
+    dump the `data` it assigns to `data_path` for the experiment workers.
+    """
+    import joblib
+
+    buf_out = io.StringIO()
+    buf_err = io.StringIO()
+    progress = Progress()
+    ns = {"progress": progress}
+    error = None
+
+    register_source("<prep>", prep_code)
+    try:
+        with contextlib.redirect_stdout(buf_out), contextlib.redirect_stderr(buf_err), progress:
+            exec(compile(prep_code, "<prep>", "exec"), ns, ns)
+        if not isinstance(ns.get("data"), dict):
+            raise ValueError("prep_code must assign a dict to `data`")
+        joblib.dump(ns["data"], data_path)
+    except EarlyStop:
+        error = f"EarlyStop: {progress.watchdog.stopped['reason']}"
+    except Exception as e:
+        error = f"{type(e).__name__}: {e}"
+        traceback.print_exc(file=buf_err)
+
+    return {
+        "stdout": buf_out.getvalue(),
+        "stderr": buf_err.getvalue(),
+        "error": error,
+        "stopped": progress.watchdog.stopped,
+        "peak_rss_mb": peak_rss_mb(),
+    }
+
+
+def _execute(prep_code: str, experiment_code: str, configs: list[dict], lease: Lease) -> dict:
+    """
+    The blocking part of `run_experiments`, run in a thread: prep, then the
+    configs, all on a loky pool sized, pinned and limited to `lease`. The
+    job's wall-clock limit covers both steps.
+    """
+    from joblib.externals import loky
+
+    rows = []
+    prep = {"stdout": "", "stderr": "", "error": None, "stopped": None, "peak_rss_mb": None}
+    error = None
+    deadline = time.monotonic() + lease.timeout_s if lease.timeout_s else None
+
+    def remaining() -> Optional[float]:
+        return max(0.0, deadline - time.monotonic()) if deadline else None
+
+    tmp_dir = tempfile.mkdtemp(prefix="ml_engineer_data_")
+    # Each worker gets the per-job memory limit; the lease holds it for all of them.
+    worker_mem_mb = lease.mem_mb // len(lease.cores) if lease.mem_mb else None
+    # A pool of its own, even for one worker, so neither user code nor the
+    # limits ever run in this process, and a run past the deadline can be
+    # killed. One BLAS/OpenMP thread per worker: parallelism comes from the pool.
+    executor = loky.ProcessPoolExecutor(
+        max_workers=len(lease.cores),
+        initializer=_init_worker,
+        initargs=(lease.cores, worker_mem_mb),
+        env={var: "1" for var in THREAD_ENV_VARS},
+    )
+    try:
+        data_path = os.path.join(tmp_dir, "data.joblib")
+        prep = executor.submit(_prep, prep_code, data_path).result(timeout=remaining())
+        error = prep["error"]
+        if error is None:
+            for row in executor.map(
+                _run_one,
+                [experiment_code] * len(configs),
+                configs,
+                [data_path] * len(configs),
+                timeout=remaining(),
+            ):
+                rows.append(row)
+    except loky.TimeoutError:
+        error = f"TimeoutError: the experiments exceeded the {lease.timeout_s:g}s wall-clock limit"
+    except loky.BrokenProcessPool as e:
+        error = f"BrokenProcessPool: {e}"
+    finally:
+        executor.shutdown(wait=error is None, kill_workers=error is not None)
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+
+    stderr = prep["stderr"]
+    failed = [row for row in rows if row["status"] != "OK"]
+    if failed and error is None:
+        error = f"{len(failed)}/{len(rows)} experiments failed; first: [{failed[0]['name']}] {failed[0]['status']}"
+    for row in failed:
+        stderr += f"[{row['name']}] {row['status']}\n{row['traceback']}\n"
+
+    return {
+        "stdout": prep["stdout"],
+        "stderr": stderr,
+        "error": error,
+        "rows": rows,
+        "stopped": prep["stopped"],
+        "peak_rss_mb": prep["peak_rss_mb"],
+    }
+
+
+async def run_experiments(
+    prep_code: str, experiment_code: str, configs: list[dict], tool_context: ToolContext
+) -> dict:
+    """
+    Run several model / hyperparameter configs concurrently on shared data
+    and return a structured result like `run_python`'s, with `metrics`
+    keyed by config name and a compact results table in the log.
+
+    - `prep_code` runs once, in a worker process, and must assign a dict
+      of prepared inputs (e.g. X_train, X_test, y_train, y_test) to `data`.
+    - `experiment_code` runs once per config, in parallel worker processes.
+      It sees `data` and `config` (one entry of `configs`) and must assign
+      a dict of metrics to `result`, e.g. {"f1": 0.97, "accuracy": 0.98}.
+      A saved model path can be put in `result` under "artifact".
+    - Each config should have a short "name" used in the results table.
+
+    Both code strings are checked statically before anything runs, and
+    may call `progress(step=..., loss=...)`, as in `run_python`: a config
+    the watchdog stops early fails on its own, the others keep running.
+
+    The run holds a lease from the shared execution scheduler: one core per
+    worker (up to one per config), with the per-job memory limit applied to
+    each worker and the wall-clock limit to the whole run. Each config's
+    output is kept, truncated, in the log above the results table.
+
+    WARNING: This is intentionally unsafe, for local dev use only.
+    """
+    warnings = []
+    for label, code in (("prep_code", prep_code), ("experiment_code", experiment_code)):
+        rejection, found = preflight(code, tool_context.state, label, tool_context.agent_name)
+        if rejection:
+            return rejection
+        warnings += found or []
+
+    scheduler = get_scheduler()
+    workers = min(len(configs) or 1, N_JOBS if N_JOBS > 0 else len(scheduler.cores))
+    mem_mb = scheduler.job_mem_mb * workers if scheduler.job_mem_mb else None
+
+    async with scheduler.lease(tool_context.session.id, cores=workers, mem_mb=mem_mb) as lease:
+        # Timed from admission, like `run_python`: queueing is not runtime.
+        started = time.perf_counter()
+        # Off the event loop: other sessions keep running meanwhile.
+        run = await asyncio.to_thread(_execute, prep_code, experiment_code, configs, lease)
+        duration = time.perf_counter() - started
+
+    rows = run["rows"]
+    stdout = run["stdout"]
+    for row in rows:
+        if row["stdout"].strip():
+            stdout += f"\n[{row['name']}] output:\n{row['stdout'].rstrip()}\n"
+    if rows:
+        # Last, so the table survives when the log is truncated.
+        stdout += f"\nRESULTS:\n{_results_table(rows)}\n"
+
+    metrics = {}
+    artifacts = []
+    for row in rows:
+        row_metrics = {k: to_jsonable(v) for k, v in row["metrics"].items()}
+        if row_metrics.get("artifact"):
+            artifacts.append(str(row_metrics.pop("artifact")))
+        metrics[row["name"]] = row_metrics
+
+    error = run["error"]
+    log, repeated = failure_log(
+        tool_context.state, stdout, run["stderr"], error, tool_context.agent_name
+    )
+    result = RunResult(
+        status="ERROR" if error else "OK",
+        exit_code=1 if error else 0,
+        duration_s=round(duration, 3),
+        error=error,
+        repeated=repeated,
+        peak_rss_mb=max(
+            (r for r in [run["peak_rss_mb"]] + [row["peak_rss_mb"] for row in rows] if r is not None),
+            default=None,
+        ),
+        metrics=metrics,
+        artifacts=artifacts,
+        preflight=warnings or None,
+        stopped=run["stopped"],
+        log=log,
+    )
+    tool_context.state[STATE_LAST_RUN] = json.dumps(result.summary(), default=str)
+    return result.to_dict()
@@ -0,0 +1,322 @@
+import os
+import re
+import sys
+import json
+import time
+import signal
+import asyncio
+import logging
+import tempfile
+import contextlib
+from typing import AsyncGenerator
+
+from google.adk.agents import BaseAgent, LlmAgent, LoopAgent, SequentialAgent
+from google.adk.agents.invocation_context import InvocationContext
+from google.adk.events import Event
+from google.adk.tools.tool_context import ToolContext
+from google.genai import types
+
+from ml_common.branches import ConcurrentBranches
+from ml_engineer import profiling
+from ml_engineer.errors import failure_log
+from ml_engineer.preflight import preflight
+from ml_engineer.profiling import new_profile_path
+from ml_engineer.results import (
+    STATE_LAST_RUN,
+    SUBPROCESS_BOOTSTRAP,
+    Reporter,
+    RunResult,
+    failed_run_precheck,
+    last_error_line,
+)
+from ml_engineer.scheduler import ExecutionScheduler, get_scheduler
+from ml_engineer.watchdog import POLL_S, HeartbeatReader, Watchdog, log_stop
+
+# One (temperature, hint) pair per candidate; cycled if K is larger.
+DEFAULT_CANDIDATE_STYLES = [
+    (0.2, "Prefer the simplest, most standard solution that satisfies the task."),
+    (0.7, "Prefer a robust solution: defensive data loading, explicit dtypes, "
+          "and printing every requested output clearly."),
+    (1.0, "Try a different library or approach than the most obvious one, "
+          "as long as it still satisfies the task."),
+]
+
+
+# --- Subprocess executor ----------------------------------------------------
+def _kill_group(proc: asyncio.subprocess.Process) -> None:
+    # The child runs in its own session, so this also takes down any
+    # DataLoader workers / joblib pools it started.
+    try:
+        os.killpg(proc.pid, signal.SIGKILL)
+    except (ProcessLookupError, PermissionError):
+        pass
+
+
+async def _supervise(
+    communicate: asyncio.Future,
+    watchdog: Watchdog,
+    heartbeats: HeartbeatReader,
+    timeout_s: float | None,
+) -> bool:
+    """
+    Wait for the child to exit while feeding its heartbeats to `watchdog`.
+    Returns early when the watchdog stops the run; True if `timeout_s` ran out.
+    """
+    loop = asyncio.get_running_loop()
+    deadline = None if timeout_s is None else loop.time() + timeout_s
+    while True:
+        wait = POLL_S if deadline is None else max(0.0, min(POLL_S, deadline - loop.time()))
+        done, _ = await asyncio.wait({communicate}, timeout=wait)
+        if done:
+            return False
+        for beat in heartbeats.read():
+            watchdog.beat(beat)
+        if watchdog.poll():
+            return False
+        if deadline is not None and loop.time() >= deadline:
+            return True
+
+
+class SubprocessExecutor:
+    """
+    Runs scripts in child processes, admitted through an `ExecutionScheduler`.
+
+    - Each run waits for a lease (cores + memory) from the scheduler, shared
+      fairly between sessions.
+    - The child is pinned to the leased cores, its BLAS/OpenMP/torch thread
+      counts match them, and the memory / CPU-time rlimits are applied.
+    - A run exceeding the scheduler's wall-clock limit is killed (with its
+      whole process group) and reported as a TimeoutError.
+    - The script's `progress(...)` heartbeats are followed by a `Watchdog`;
+      a run it stops (NaN / inf, diverging loss, no progress) is killed the
+      same way and its lease freed right away.
+
+    Cancelling the awaiting task kills the child process as well.
+    """
+
+    def __init__(
+        self,
+        scheduler: ExecutionScheduler | None = None,
+        cores_per_job: int | None = None,
+    ) -> None:
+        self.scheduler = scheduler or get_scheduler()
+        self.cores_per_job = cores_per_job
+
+    async def run_python(
+        self, code: str, tool_context: ToolContext, profile: bool = False
+    ) -> dict:
+        """
+        Execute a complete Python script in a separate process and return a
+        structured result: status, exit_code, error, duration_s, peak_rss_mb,
+        metrics, artifacts and a truncated log of stdout/stderr.
+
+        Inside the script, call `report(metric=value, ..., artifact="path")`
+        to put key results into `metrics` / `artifacts`.
+
+        With `profile=True` the run is profiled (cProfile + tracemalloc) and the
+        result gets a `profile` field: the slowest functions by cumulative
+        time, peak traced memory, the biggest allocation sites, and the path of
+        the full `.prof` file.
+
+        The script is checked statically first (syntax, missing modules,
+        package installs, large downloads); if that fails it is not run and
+        the result has status "REJECTED" and the findings under `preflight`.
+
+        In training loops, call `progress(step=..., loss=...)` as well: the
+        run is stopped early when a value becomes NaN / inf, the loss diverges
+        or the heartbeats stop (see `ml_engineer/watchdog.py`). The result then
+        has the reason under `stopped`; `progress` holds the last heartbeat.
+
+        WARNING: This is intentionally unsafe, for local dev use only.
+        """
+        # Before taking a lease: a rejected script never waits for cores.
+        rejection, warnings = preflight(code, tool_context.state, scope=tool_context.agent_name)
+        if rejection:
+            return rejection
+
+        reporter = Reporter()
+        watchdog = Watchdog()
+        timed_out = False
+        session_id = tool_context.session.id
+        async with self.scheduler.lease(session_id, cores=self.cores_per_job) as lease:
+            with tempfile.NamedTemporaryFile(
+                "w", suffix=".py", prefix="ml_engineer_", delete=False
+            ) as f:
+                f.write(code)
+                script_path = f.name
+            report_path = script_path + ".report.jsonl"
+            env = {**os.environ, **lease.env(), "ML_ENGINEER_REPORT_PATH": report_path}
+            if profile:
+                env["ML_ENGINEER_PROFILE_PATH"] = new_profile_path()
+                env["ML_ENGINEER_PROFILER_MODULE"] = profiling.__file__
+
+            started = time.perf_counter()
+            try:
+                proc = await asyncio.create_subprocess_exec(
+                    sys.executable, "-c", SUBPROCESS_BOOTSTRAP, script_path,
+                    stdout=asyncio.subprocess.PIPE,
+                    stderr=asyncio.subprocess.PIPE,
+                    env=env,
+                    start_new_session=True,
+                )
+                communicate = asyncio.ensure_future(proc.communicate())
+                heartbeats = HeartbeatReader(report_path)
+                try:
+                    timed_out = await _supervise(communicate, watchdog, heartbeats, lease.timeout_s)
+                    if timed_out or watchdog.stopped:
+                        _kill_group(proc)
+                    # Keep whatever the script printed before it was killed.
+                    out, err = await communicate
+                except asyncio.CancelledError:
+                    _kill_group(proc)
+                    communicate.cancel()
+                    await proc.wait()
+                    raise
+                duration = time.perf_counter() - started
+                # The run is over: count its last heartbeats without applying rules.
+                watchdog.enabled = False
+                for beat in heartbeats.read():
+                    watchdog.beat(beat)
+                trailer = reporter.read_file(report_path)
+            finally:
+                os.unlink(script_path)
+                if os.path.exists(report_path):
+                    os.unlink(report_path)
+
+        stdout = out.decode(errors="replace")
+        stderr = err.decode(errors="replace")
+
+        failed = timed_out or watchdog.stopped or proc.returncode != 0
+        if timed_out:
+            error = f"TimeoutError: exceeded the {lease.timeout_s:g}s wall-clock limit"
+            logging.warning("[Scheduler] Session %s: %s", session_id, error)
+        elif watchdog.stopped:
+            error = f"EarlyStop: {watchdog.stopped['reason']}"
+            log_stop(session_id, watchdog)
+        elif failed:
+            error = last_error_line(stderr, f"exit code {proc.returncode}")
+        else:
+            error = None
+        log, repeated = failure_log(tool_context.state, stdout, stderr, error, tool_context.agent_name)
+        result = RunResult(
+            status="ERROR" if failed else "OK",
+            exit_code=proc.returncode,
+            duration_s=round(duration, 3),
+            error=error,
+            repeated=repeated,
+            peak_rss_mb=round(trailer["peak_rss_mb"], 1) if trailer else None,
+            metrics=reporter.metrics,
+            artifacts=reporter.artifacts,
+            profile=reporter.profile,
+            preflight=warnings,
+            progress=watchdog.summary(),
+            stopped=watchdog.stopped,
+            log=log,
+        )
+        tool_context.state[STATE_LAST_RUN] = json.dumps(result.summary())
+        return result.to_dict()
+
+
+# --- First-pass parallel agent ----------------------------------------------
+class FirstPassParallelAgent(BaseAgent):
+    """
+    Runs its sub-agents concurrently, each on its own conversation branch.
+
+    As soon as one branch yields an escalating event (the judge calling
+    `exit_loop`), that event is forwarded and every other branch is
+    cancelled. If no branch escalates, all of them run to completion, and
+    the error of a branch that crashed is re-raised.
+    """
+
+    async def _run_async_impl(
+        self, ctx: InvocationContext
+    ) -> AsyncGenerator[Event, None]:
+        if not self.sub_agents:
+            return
+
+        def branch(sub_agent: BaseAgent) -> str:
+            suffix = f"{self.name}.{sub_agent.name}"
+            return f"{ctx.branch}.{suffix}" if ctx.branch else suffix
+
+        branches = ConcurrentBranches(ctx, {sub.name: (sub, branch(sub)) for sub in self.sub_agents})
+        async with contextlib.aclosing(branches.events()) as events:
+            async for _, event in events:
+                if event is None:
+                    continue
+                yield event
+                if event.actions.escalate:
+                    logging.info(
+                        "[%s] '%s' passed; cancelling remaining candidates.",
+                        self.name,
+                        event.author,
+                    )
+                    return
+        # No candidate passed: a branch that crashed (model or tool error)
+        # must fail the run, not look like "no candidate passed".
+        branches.raise_errors()
+
+
+def build_parallel_engineer_loop(
+    engineer: LlmAgent,
+    judge: LlmAgent,
+    k: int,
+    scheduler: ExecutionScheduler | None = None,
+    max_iterations: int = 3,
+    candidate_styles: list[tuple[float, str]] | None = None,
+) -> LoopAgent:
+    """
+    Build an `EngineerLoop` that tries K candidate scripts per iteration.
+
+    Each candidate is a copy of `engineer` with its own temperature and hint,
+    paired with a copy of `judge`. Candidates run concurrently and execute
+    through a `SubprocessExecutor` on `scheduler` (default: the shared
+    `get_scheduler()`), each leasing an equal share of its cores; the first
+    judge to accept a run ends the loop and cancels the others. Each pair
+    keeps its own feedback under `<judge.output_key>_<i>`, so concurrent
+    judges never overwrite each other's and every candidate retries on
+    its own judge's feedback.
+    """
+    scheduler = scheduler or get_scheduler()
+    styles = candidate_styles or DEFAULT_CANDIDATE_STYLES
+    executor = SubprocessExecutor(
+        scheduler,
+        cores_per_job=max(1, len(scheduler.cores) // k),
+    )
+
+    feedback = re.compile(rf"\b{re.escape(judge.output_key)}\b")
+    branches = []
+    for i in range(k):
+        temperature, hint = styles[i % len(styles)]
+        feedback_key = f"{judge.output_key}_{i + 1}"
+        candidate = engineer.clone(update={
+            "name": f"{engineer.name}_{i + 1}",
+            "tools": [executor.run_python] + [
+                tool for tool in engineer.tools
+                if getattr(tool, "__name__", None) != "run_python"
+            ],
+            "generate_content_config": types.GenerateContentConfig(
+                temperature=temperature,
+            ),
+            "instruction": feedback.sub(feedback_key, engineer.instruction) + f"\nCandidate hint: {hint}\n",
+            # Concurrent candidates must not overwrite the shared feedback.
+            "output_key": None,
+        })
+        candidate_judge = judge.clone(update={
+            "name": f"{judge.name}_{i + 1}",
+            "instruction": feedback.sub(feedback_key, judge.instruction),
+            "output_key": feedback_key,
+            "before_agent_callback": failed_run_precheck(feedback_key),
+        })
+        branches.append(SequentialAgent(
+            name=f"EngineerCandidate_{i + 1}",
+            sub_agents=[candidate, candidate_judge],
+        ))
+
+    return LoopAgent(
+        name="EngineerLoop",
+        sub_agents=[FirstPassParallelAgent(
+            name="EngineerCandidates",
+            sub_agents=branches,
+        )],
+        max_iterations=max_iterations,
+    )
@@ -0,0 +1,286 @@
+import os
+import re
+import sys
+import ast
+import json
+import time
+import importlib.util
+from dataclasses import asdict, dataclass, field
+from typing import Optional
+
+from ml_engineer.errors import failure_log
+from ml_engineer.results import STATE_LAST_RUN, RunResult
+
+# "0" / "off" skips the preflight entirely.
+PREFLIGHT = os.getenv("ML_ENGINEER_PREFLIGHT", "on").lower() not in ("0", "off", "false")
+
+# Datasets too big to download inside an attempt, matched (case-insensitive)
+# against dataset class names and string arguments of download calls.
+# ML_ENGINEER_PREFLIGHT_LARGE adds comma-separated names.
+LARGE_DATASETS = {
+    "imagenet", "imagenet21k", "places365", "kinetics", "lsun", "laion",
+    "c4", "the_pile", "pile", "openwebtext", "redpajama", "fineweb",
+    "common_voice", "coco", "cocodetection", "cococaptions", "openimages",
+    *filter(None, os.getenv("ML_ENGINEER_PREFLIGHT_LARGE", "").lower().split(",")),
+}
+
+# Calls that reach the network (dotted names after resolving import aliases).
+NETWORK_CALLS = {
+    "urllib.request.urlopen", "urllib.request.urlretrieve", "wget.download",
+    "gdown.download", "torch.hub.load", "torch.hub.download_url_to_file",
+    "huggingface_hub.hf_hub_download", "huggingface_hub.snapshot_download",
+    "datasets.load_dataset", "tensorflow.keras.utils.get_file",
+    "keras.utils.get_file", "socket.create_connection",
+}
+NETWORK_PREFIXES = ("requests.", "httpx.", "urllib3.", "aiohttp.", "kaggle.")
+NETWORK_SUFFIXES = (".from_pretrained",)
+DOWNLOAD_FUNCTIONS = re.compile(r"^sklearn\.datasets\.fetch_|^tensorflow_datasets\.load$")
+
+# Calls that run a shell command, checked for `pip install`, `wget`, ...
+SHELL_CALLS = ("subprocess.", "os.system", "os.popen", "get_ipython.system")
+
+_INSTALL = re.compile(r"\b(?:pip3?|conda|mamba)\s+install\b|-m\s+pip\s+install\b")
+_SHELL_DOWNLOAD = re.compile(r"\b(?:wget|curl)\s")
+_IMPORT_ERRORS = {"ImportError", "ModuleNotFoundError", "Exception", "BaseException"}
+
+
+@dataclass
+class Finding:
+    rule: str          # syntax | missing_module | install | large_download | network
+    line: int
+    message: str
+    blocking: bool
+
+
+@dataclass
+class Preflight:
+    findings: list[Finding] = field(default_factory=list)
+    duration_ms: float = 0.0
+
+    @property
+    def blocking(self) -> list[Finding]:
+        return [f for f in self.findings if f.blocking]
+
+    @property
+    def warnings(self) -> list[Finding]:
+        return [f for f in self.findings if not f.blocking]
+
+
+# --- Import check (cached per environment) ----------------------------------
+_module_cache: dict[str, bool] = {}
+_fingerprint: Optional[tuple] = None
+
+
+def _environment_fingerprint() -> tuple:
+    """Interpreter, import path and the mtimes of its directories: installing
+    or removing a package changes the mtime of its site-packages directory."""
+    mtimes = []
+    for entry in sys.path:
+        try:
+            mtimes.append(os.stat(entry or ".").st_mtime_ns)
+        except OSError:
+            mtimes.append(None)
+    return (sys.executable, tuple(sys.path), tuple(mtimes))
+
+
+def _refresh_module_cache() -> None:
+    global _fingerprint
+    fingerprint = _environment_fingerprint()
+    if fingerprint != _fingerprint:
+        _module_cache.clear()
+        _fingerprint = fingerprint
+
+
+def module_available(name: str) -> bool:
+    """Whether top-level module `name` can be imported, without importing it."""
+    if name not in _module_cache:
+        _module_cache[name] = (
+            name in sys.modules
+            or name in sys.builtin_module_names
+            or importlib.util.find_spec(name) is not None
+            # Local modules next to where the script runs.
+            or os.path.exists(f"{name}.py")
+            or os.path.isdir(name)
+        )
+    return _module_cache[name]
+
+
+# --- AST checks -------------------------------------------------------------
+def _dotted(node: ast.AST) -> Optional[str]:
+    parts = []
+    while isinstance(node, ast.Attribute):
+        parts.append(node.attr)
+        node = node.value
+    if isinstance(node, ast.Call):  # e.g. get_ipython().system(...)
+        node = node.func
+        while isinstance(node, ast.Attribute):
+            node = node.value
+    if not isinstance(node, ast.Name):
+        return None
+    parts.append(node.id)
+    return ".".join(reversed(parts))
+
+
+def _strings(node: ast.AST) -> list[str]:
+    return [
+        n.value for n in ast.walk(node)
+        if isinstance(n, ast.Constant) and isinstance(n.value, str)
+    ]
+
+
+def _guarded(node: ast.AST, parents: dict) -> bool:
+    """Inside a `try` whose handlers catch ImportError (optional dependency)?"""
+    while node in parents:
+        child, node = node, parents[node]
+        if isinstance(node, ast.Try) and child in node.body:
+            for handler in node.handlers:
+                names = [handler.type] if not isinstance(handler.type, ast.Tuple) else handler.type.elts
+                if handler.type is None or any(_dotted(n) in _IMPORT_ERRORS for n in names):
+                    return True
+    return False
+
+
+def _large_dataset(call: ast.Call, name: str) -> Optional[str]:
+    candidates = [name.rsplit(".", 1)[-1], *_strings(call)]
+    for candidate in candidates:
+        tokens = re.split(r"[^a-z0-9_]+", candidate.lower())
+        hit = next((t for t in tokens if t in LARGE_DATASETS), None)
+        if hit:
+            return hit
+    return None
+
+
+def check(code: str) -> Preflight:
+    """Statically check a script; nothing in it is imported or executed."""
+    started = time.perf_counter()
+    report = Preflight()
+    try:
+        tree = ast.parse(code)
+    except SyntaxError as e:
+        report.findings.append(Finding(
+            "syntax", e.lineno or 0, f"SyntaxError: {e.msg} (line {e.lineno}: {(e.text or '').strip()})", True,
+        ))
+        report.duration_ms = round((time.perf_counter() - started) * 1000, 2)
+        return report
+
+    _refresh_module_cache()
+    imports: list[ast.AST] = []
+    calls: list[ast.Call] = []
+    for node in ast.walk(tree):
+        if isinstance(node, (ast.Import, ast.ImportFrom)):
+            imports.append(node)
+        elif isinstance(node, ast.Call):
+            calls.append(node)
+
+    aliases: dict[str, str] = {}
+    missing: set[str] = set()
+    parents: dict = {}
+
+    def need(module: str, node: ast.AST) -> None:
+        top = module.split(".")[0]
+        if not top or top in missing or module_available(top):
+            return
+        if not parents:  # only needed for the rare missing import
+            parents.update((child, n) for n in ast.walk(tree) for child in ast.iter_child_nodes(n))
+        if not _guarded(node, parents):
+            missing.add(top)
+            report.findings.append(Finding(
+                "missing_module", node.lineno,
+                f"No module named '{top}' is installed. Use an installed library "
+                "instead; packages cannot be installed.",
+                True,
+            ))
+
+    for node in imports:
+        if isinstance(node, ast.Import):
+            for alias in node.names:
+                need(alias.name, node)
+                if alias.asname:
+                    aliases[alias.asname] = alias.name
+        elif node.level == 0 and node.module:
+            need(node.module, node)
+            for alias in node.names:
+                aliases[alias.asname or alias.name] = f"{node.module}.{alias.name}"
+
+    for node in calls:
+        name = _dotted(node.func) or ""
+        root, _, rest = name.partition(".")
+        resolved = f"{aliases[root]}.{rest}".rstrip(".") if root in aliases else name
+        shell = " ".join(_strings(node)) if resolved.startswith(SHELL_CALLS) else ""
+
+        if resolved in ("importlib.import_module", "__import__") and node.args:
+            if isinstance(node.args[0], ast.Constant) and isinstance(node.args[0].value, str):
+                need(node.args[0].value, node)
+        if _INSTALL.search(shell) or resolved in ("pip.main", "pip._internal.main"):
+            report.findings.append(Finding(
+                "install", node.lineno,
+                "Installs packages from inside the script; only already installed libraries may be used.",
+                True,
+            ))
+            continue
+
+        downloads = (
+            resolved in NETWORK_CALLS
+            or resolved.startswith(NETWORK_PREFIXES)
+            or resolved.endswith(NETWORK_SUFFIXES)
+            or DOWNLOAD_FUNCTIONS.search(resolved)
+            or any(kw.arg == "download" and getattr(kw.value, "value", None) is True for kw in node.keywords)
+            or _SHELL_DOWNLOAD.search(shell)
+        )
+        if not downloads:
+            continue
+        dataset = _large_dataset(node, resolved)
+        if dataset:
+            report.findings.append(Finding(
+                "large_download", node.lineno,
+                f"Downloads '{dataset}', a large dataset; use a small dataset that is "
+                "available locally or downloads quickly instead.",
+                True,
+            ))
+        else:
+            report.findings.append(Finding(
+                "network", node.lineno, f"`{resolved or name}(...)` needs network access.", False,
+            ))
+
+    report.findings.sort(key=lambda f: f.line)
+    report.duration_ms = round((time.perf_counter() - started) * 1000, 2)
+    return report
+
+
+# --- Tool integration -------------------------------------------------------
+def preflight(
+    code: str, state, label: str = "", scope: str = ""
+) -> tuple[Optional[dict], Optional[list[dict]]]:
+    """
+    Run `check` for a tool call. Returns `(rejection, warnings)`:
+    `rejection` is the tool result to return instead of running the script
+    (None if it may run), `warnings` the non-blocking findings to attach to
+    the run's result. `scope` is passed on to `failure_log`.
+    """
+    if not PREFLIGHT:
+        return None, None
+    report = check(code)
+    where = f"{label} " if label else ""
+    warnings = [
+        {**asdict(f), "message": f"{where}line {f.line}: {f.message}"} for f in report.warnings
+    ] or None
+    if not report.blocking:
+        return None, warnings
+
+    first = report.blocking[0]
+    lines = [f"{where}line {f.line}: [{f.rule}] {f.message}" for f in report.blocking]
+    error = f"PreflightError: {first.message}"
+    log, repeated = failure_log(
+        state, "", "Script rejected before running:\n" + "\n".join(lines), error, scope
+    )
+    result = RunResult(
+        status="REJECTED",
+        exit_code=None,
+        duration_s=round(report.duration_ms / 1000, 3),
+        error=error,
+        repeated=repeated,
+        preflight=[asdict(f) for f in report.findings],
+        log=log,
+    )
+    state[STATE_LAST_RUN] = json.dumps(result.summary())
+    return result.to_dict(), warnings
@@ -0,0 +1,156 @@
+# Standard library only: the subprocess bootstrap loads this file by path,
+# without importing the `ml_engineer` package (and ADK with it).
+import os
+import time
+import uuid
+import pstats
+import cProfile
+import tracemalloc
+from typing import Optional
+
+# Where full `.prof` files are written; one per profiled run.
+PROFILE_DIR = os.getenv("ML_ENGINEER_PROFILE_DIR", "ml_engineer_profiles")
+
+# Entries kept in each top-N list of the summary.
+PROFILE_TOP = int(os.getenv("ML_ENGINEER_PROFILE_TOP", "10"))
+
+# Call-stack depth recorded per allocation, so library allocations can be
+# attributed to the script line that triggered them.
+_TRACE_FRAMES = 8
+
+# Frames of the profiling harness and import machinery, left out of the summary.
+_HARNESS_FUNCTIONS = {
+    "<built-in method builtins.exec>",
+    "<built-in method builtins.__import__>",
+    "run_path", "_run_module_code", "_run_code",
+}
+
+
+def new_profile_path(directory: str = PROFILE_DIR) -> str:
+    os.makedirs(directory, exist_ok=True)
+    name = f"run_{time.strftime('%Y%m%d-%H%M%S')}_{uuid.uuid4().hex[:6]}.prof"
+    return os.path.abspath(os.path.join(directory, name))
+
+
+def _short(filename: str) -> str:
+    """`.../site-packages/sklearn/base.py` -> `sklearn/base.py`."""
+    normalized = filename.replace("\\", "/")
+    for marker in ("/site-packages/", "/dist-packages/"):
+        if marker in normalized:
+            return normalized.split(marker, 1)[1]
+    if normalized.startswith("<"):
+        return normalized
+    return os.path.basename(normalized)
+
+
+def _is_script(filename: str) -> bool:
+    base = os.path.basename(filename)
+    return filename in ("<ml_engineer>", "<prep>", "<experiment>") or (
+        base.startswith("ml_engineer_") and base.endswith(".py")
+    )
+
+
+def _is_harness(func: tuple) -> bool:
+    filename, _, name = func
+    return (
+        name in _HARNESS_FUNCTIONS
+        or "_lsprof.Profiler" in name
+        or filename.startswith("<frozen importlib")
+        # Library module bodies: import time, already counted in the
+        # script's own import line.
+        or (name == "<module>" and not _is_script(filename))
+    )
+
+
+def _function_label(func: tuple) -> str:
+    filename, lineno, name = func
+    if filename == "~":  # built-ins: name is already "<built-in method ...>"
+        return name
+    return f"{_short(filename)}:{lineno}({name})"
+
+
+class Profiler:
+    """
+    Context manager that runs a block under `cProfile` and `tracemalloc`.
+
+    On exit the full profile is dumped to `path` (open it with `pstats`,
+    snakeviz, etc.) and `summary` holds a compact view for the model:
+    the top functions by cumulative time, peak traced memory and the
+    source lines holding the most memory at the end.
+
+    Tracing slows allocation-heavy code down, so timings under profiling
+    are relative, not absolute.
+    """
+
+    def __init__(self, path: str, top: int = PROFILE_TOP) -> None:
+        self.path = path
+        self.top = top
+        self.summary: Optional[dict] = None
+        self._profile = cProfile.Profile()
+        self._own_tracemalloc = False
+        self._started = 0.0
+
+    def __enter__(self) -> "Profiler":
+        if not tracemalloc.is_tracing():
+            tracemalloc.start(_TRACE_FRAMES)
+            self._own_tracemalloc = True
+        tracemalloc.reset_peak()
+        self._started = time.perf_counter()
+        self._profile.enable()
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self._profile.disable()
+        wall = time.perf_counter() - self._started
+        _, peak = tracemalloc.get_traced_memory()
+        snapshot = tracemalloc.take_snapshot().filter_traces([
+            tracemalloc.Filter(False, tracemalloc.__file__),
+            tracemalloc.Filter(False, __file__),
+        ])
+        if self._own_tracemalloc:
+            tracemalloc.stop()
+
+        self._profile.dump_stats(self.path)
+        self.summary = {
+            "prof_path": self.path,
+            "wall_s": round(wall, 3),
+            "top_functions": self._top_functions(),
+            "peak_traced_mb": round(peak / 2**20, 1),
+            "top_allocations": self._top_allocations(snapshot),
+        }
+
+    def _top_allocations(self, snapshot: tracemalloc.Snapshot) -> list[dict]:
+        # Group by the innermost script line on each allocation's stack
+        # (falling back to the innermost frame), so "np.ones" inside a
+        # user function shows up as that function's line, not numpy's.
+        sites: dict[str, list[int]] = {}
+        for stat in snapshot.statistics("traceback"):
+            frames = list(stat.traceback)  # oldest first
+            frame = next((f for f in reversed(frames) if _is_script(f.filename)), frames[-1])
+            if frame.filename.startswith("<frozen importlib"):
+                continue
+            site = sites.setdefault(f"{_short(frame.filename)}:{frame.lineno}", [0, 0])
+            site[0] += stat.size
+            site[1] += stat.count
+        top = sorted(sites.items(), key=lambda item: item[1][0], reverse=True)[: self.top]
+        return [
+            {"site": site, "size_mb": round(size / 2**20, 2), "count": count}
+            for site, (size, count) in top
+        ]
+
+    def _top_functions(self) -> list[dict]:
+        stats = pstats.Stats(self._profile).sort_stats(pstats.SortKey.CUMULATIVE)
+        rows = []
+        for func in stats.fcn_list:
+            _, ncalls, tottime, cumtime, _ = stats.stats[func]
+            if _is_harness(func):
+                continue
+            rows.append({
+                "function": _function_label(func),
+                "ncalls": ncalls,
+                "tottime_s": round(tottime, 3),
+                "cumtime_s": round(cumtime, 3),
+            })
+            if len(rows) == self.top:
+                break
+        return rows
@@ -0,0 +1,300 @@
+import os
+import sys
+import json
+from dataclasses import asdict, dataclass, field
+from typing import Any, Optional
+
+from google.genai import types
+
+# Compact summary of the latest run (everything but the log), for the
+# team reporter.
+STATE_LAST_RUN = "last_run"
+
+# Tools whose results follow the `RunResult` protocol.
+RUN_TOOLS = ("run_python", "run_experiments")
+
+# Characters of combined stdout/stderr kept in `RunResult.log`.
+LOG_CHARS = int(os.getenv("ML_ENGINEER_LOG_CHARS", "4000"))
+
+
+@dataclass
+class RunResult:
+    """
+    What `run_python` / `run_experiments` return to the model.
+
+    `metrics` and `artifacts` come from `report(...)` calls in the script,
+    so judges can check them without reading the log. Tracebacks in the
+    log are minimized, and left out when `repeated` > 0 (see
+    `ml_engineer/errors.py`).
+    """
+
+    status: str                      # "OK", "ERROR" or "REJECTED" (not run, see `preflight`)
+    exit_code: Optional[int]         # None when the script was not run
+    duration_s: float
+    error: Optional[str] = None      # last "Type: message" line on failure
+    repeated: int = 0                # earlier runs that failed with the same error
+    peak_rss_mb: Optional[float] = None
+    metrics: dict[str, Any] = field(default_factory=dict)
+    artifacts: list[str] = field(default_factory=list)
+    profile: Optional[dict] = None   # `Profiler.summary` when run with profile=True
+    preflight: Optional[list[dict]] = None  # static check findings (ml_engineer/preflight.py)
+    progress: Optional[dict] = None  # heartbeat count and the last `progress(...)` heartbeat
+    stopped: Optional[dict] = None   # watchdog rule and reason, when stopped early
+    log: str = ""
+
+    def to_dict(self) -> dict:
+        return asdict(self)
+
+    def summary(self) -> dict:
+        """The structured part only, without the log."""
+        return {k: v for k, v in self.to_dict().items() if k != "log"}
+
+
+# --- Side channel -----------------------------------------------------------
+class Reporter:
+    """
+    Collects `report(...)` calls made by a script.
+
+        report(accuracy=0.97, f1=0.96)
+        report(artifact="best_model.pth")
+
+    Keyword arguments become metrics (later calls overwrite earlier ones);
+    `artifact` / `artifacts` add file paths.
+    """
+
+    def __init__(self) -> None:
+        self.metrics: dict[str, Any] = {}
+        self.artifacts: list[str] = []
+        self.profile: Optional[dict] = None
+
+    def __call__(self, artifact=None, artifacts=(), **metrics) -> None:
+        self.add({
+            "metrics": metrics,
+            "artifacts": ([artifact] if artifact else []) + list(artifacts),
+        })
+
+    def add(self, record: dict) -> None:
+        self.metrics.update({k: to_jsonable(v) for k, v in record.get("metrics", {}).items()})
+        for path in record.get("artifacts", []):
+            if str(path) not in self.artifacts:
+                self.artifacts.append(str(path))
+
+    def read_file(self, path: str) -> dict:
+        """Merge the records a child process wrote; return its trailer record."""
+        trailer = {}
+        if not os.path.exists(path):
+            return trailer
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                record = json.loads(line)
+                if "peak_rss_mb" in record:
+                    trailer = record
+                elif "profile" in record:
+                    self.profile = record["profile"]
+                elif "progress" in record:
+                    continue  # heartbeats, read by ml_engineer/watchdog.py
+                else:
+                    self.add(record)
+        return trailer
+
+
+def to_jsonable(value):
+    # numpy / torch scalars -> plain Python numbers
+    if hasattr(value, "item") and callable(value.item):
+        try:
+            return value.item()
+        except (TypeError, ValueError):
+            pass
+    if isinstance(value, (str, int, float, bool)) or value is None:
+        return value
+    return str(value)
+
+
+# `python -c` bootstrap for scripts run in a child process: applies the
+# scheduler's core pinning and rlimits (ML_ENGINEER_CPUSET,
+# ML_ENGINEER_MEM_LIMIT_MB, ML_ENGINEER_CPU_LIMIT_S), defines the `report`
+# builtin (writing JSON lines to ML_ENGINEER_REPORT_PATH) and the `progress`
+# builtin (heartbeats to the same file, at most one per
+# ML_ENGINEER_PROGRESS_INTERVAL_S except the first NaN / inf one and the
+# last one at exit, flushing the script's output first so it survives an
+# early stop), records the
+# child's peak RSS at exit, then runs the script as __main__ (under
+# `ml_engineer/profiling.py`'s Profiler when ML_ENGINEER_PROFILE_PATH is set).
+SUBPROCESS_BOOTSTRAP = """
+import atexit, builtins, json, math, os, runpy, sys, time
+_cpuset = os.environ.get("ML_ENGINEER_CPUSET")
+if _cpuset and hasattr(os, "sched_setaffinity"):
+    os.sched_setaffinity(0, {int(c) for c in _cpuset.split(",")})
+try:
+    import resource
+    _mem = int(os.environ.get("ML_ENGINEER_MEM_LIMIT_MB", "0"))
+    if _mem:
+        resource.setrlimit(resource.RLIMIT_DATA, (_mem * 1024 * 1024,) * 2)
+    _cpu = int(os.environ.get("ML_ENGINEER_CPU_LIMIT_S", "0"))
+    if _cpu:
+        resource.setrlimit(resource.RLIMIT_CPU, (_cpu, _cpu + 5))
+except (ImportError, ValueError, OSError):
+    pass
+_path = os.environ["ML_ENGINEER_REPORT_PATH"]
+def _write(record):
+    with open(_path, "a", encoding="utf-8") as f:
+        f.write(json.dumps(record, default=str) + "\\n")
+def report(artifact=None, artifacts=(), **metrics):
+    metrics = {k: (v.item() if hasattr(v, "item") else v) for k, v in metrics.items()}
+    _write({"metrics": metrics, "artifacts": ([artifact] if artifact else []) + list(artifacts)})
+builtins.report = report
+_beat_s = float(os.environ.get("ML_ENGINEER_PROGRESS_INTERVAL_S", "0.25"))
+_beat = {"at": 0.0, "pending": None, "bad": False}
+def _send_beat():
+    if _beat["pending"] is not None:
+        sys.stdout.flush()
+        sys.stderr.flush()
+        _write({"progress": _beat["pending"]})
+        _beat["pending"] = None
+def progress(step=None, **values):
+    values = {k: (v.item() if hasattr(v, "item") else v) for k, v in values.items()}
+    _beat["pending"] = {"step": step, **values}
+    now = time.monotonic()
+    bad = not _beat["bad"] and any(isinstance(v, float) and not math.isfinite(v) for v in values.values())
+    if bad or now - _beat["at"] >= _beat_s:
+        _beat["at"] = now
+        _beat["bad"] = _beat["bad"] or bad
+        _send_beat()
+atexit.register(_send_beat)
+builtins.progress = progress
+def _trailer():
+    try:
+        with open("/proc/self/status") as f:
+            kb = next(int(l.split()[1]) for l in f if l.startswith("VmHWM:"))
+        _write({"peak_rss_mb": kb / 1024})
+    except (OSError, StopIteration):
+        try:
+            import resource
+            rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+            _write({"peak_rss_mb": rss / (1024 * 1024 if sys.platform == "darwin" else 1024)})
+        except ImportError:
+            pass
+atexit.register(_trailer)
+script = sys.argv[1]
+sys.argv = sys.argv[1:]
+_profile_path = os.environ.get("ML_ENGINEER_PROFILE_PATH")
+if _profile_path:
+    import importlib.util
+    _spec = importlib.util.spec_from_file_location("_ml_engineer_profiling", os.environ["ML_ENGINEER_PROFILER_MODULE"])
+    _profiling = importlib.util.module_from_spec(_spec)
+    _spec.loader.exec_module(_profiling)
+    _profiler = _profiling.Profiler(_profile_path)
+    atexit.register(lambda: _profiler.summary and _write({"profile": _profiler.summary}))
+    with _profiler:
+        runpy.run_path(script, run_name="__main__")
+else:
+    runpy.run_path(script, run_name="__main__")
+"""
+
+
+# --- Helpers ----------------------------------------------------------------
+def peak_rss_mb() -> Optional[float]:
+    """Peak resident memory of this process so far, or None if unavailable."""
+    # Linux keeps ru_maxrss across exec, so a freshly spawned worker would
+    # report its parent's peak; VmHWM starts over with the new image.
+    try:
+        with open("/proc/self/status") as f:
+            kb = next(int(line.split()[1]) for line in f if line.startswith("VmHWM:"))
+        return round(kb / 1024, 1)
+    except (OSError, StopIteration):
+        pass
+    try:
+        import resource
+    except ImportError:
+        return None
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return round(rss / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+
+def truncate_log(stdout: str, stderr: str, limit: int = LOG_CHARS) -> str:
+    """
+    Combine stdout and stderr into one log of at most ~`limit` characters.
+    The tail is kept over the head: final metrics and tracebacks are at the end.
+    """
+    log = stdout
+    if stderr.strip():
+        log = f"{log}\n[stderr]\n{stderr}" if log else f"[stderr]\n{stderr}"
+    if len(log) <= limit:
+        return log
+    head = limit // 4
+    tail = limit - head
+    return f"{log[:head]}\n... [{len(log) - limit} chars truncated] ...\n{log[-tail:]}"
+
+
+def last_error_line(stderr: str, default: str) -> str:
+    """The "Type: message" line an uncaught exception ends stderr with."""
+    lines = [line for line in stderr.splitlines() if line.strip()]
+    return lines[-1] if lines else default
+
+
+# --- Judge pre-check --------------------------------------------------------
+def _latest_run(callback_context) -> Optional[dict]:
+    """The latest run result on this branch since this agent last spoke."""
+    branch = callback_context._invocation_context.branch
+    for event in reversed(callback_context.session.events):
+        if event.branch != branch:
+            continue
+        if event.author in (callback_context.agent_name, "user"):
+            return None
+        for response in event.get_function_responses():
+            if response.name in RUN_TOOLS and isinstance(response.response, dict):
+                return response.response
+    return None
+
+
+# What to try next, per watchdog rule (see ml_engineer/watchdog.py).
+STOP_HINTS = {
+    "nonfinite": "A value became NaN / inf: lower the learning rate, clip gradients, "
+                 "normalize the inputs and check the data and loss for NaN, log(0) or "
+                 "division by zero.",
+    "diverged": "The loss diverged: lower the learning rate, add warmup or a scheduler, "
+                "and check the loss and label scaling.",
+    "stalled": "The run stopped making progress: look for a hung data loader "
+               "(use num_workers=0), a deadlock or one very slow step, and call "
+               "progress(...) at least once per step or batch.",
+    "no_progress": "The run reported no progress: make sure the training loop calls "
+                   "progress(step=..., loss=...) and that data loading finishes.",
+}
+
+
+def failed_run_precheck(feedback_key: str):
+    """
+    `before_agent_callback` for a judge: when the engineer's latest run
+    failed, write RETRY feedback from the structured result and skip the
+    judge's model call. Anything else goes to the judge as usual.
+    """
+    def _precheck(callback_context):
+        run = _latest_run(callback_context)
+        if not run or run.get("status") not in ("ERROR", "REJECTED"):
+            return None
+
+        stopped = run.get("stopped") or {}
+        if run["status"] == "REJECTED":
+            reason = f"The script was rejected before running: {run.get('error')}"
+            hints = [
+                "Fix every finding listed in the log (syntax, missing modules, package "
+                "installs, large downloads) and run the script again.",
+            ]
+        elif stopped:
+            reason = f"The run was stopped early by the watchdog: {stopped.get('reason')}"
+            hints = [STOP_HINTS.get(stopped.get("rule"), STOP_HINTS["stalled"])]
+        else:
+            reason = f"The script failed (exit code {run.get('exit_code')}): {run.get('error')}"
+            hints = ["Fix the error shown at the end of the log and run the script again."]
+        repeated = run.get("repeated") or 0
+        if repeated:
+            reason += f" This is the same error as {repeated} earlier attempt(s)."
+            hints = [
+                "The previous fix did not work. Do not repeat it: re-read the error and "
+                "change the approach (different API, library, data handling or model).",
+            ]
+        feedback = json.dumps({"status": "RETRY", "reason": reason, "hints": hints}, indent=2)
+        callback_context.state[feedback_key] = feedback
+        return types.Content(role="model", parts=[types.Part(text=feedback)])
+
+    return _precheck
@@ -1,18 +1,15 @@
-import logging
-from google.adk.runners import InMemoryRunner
 from google.genai import types
 
 from ml_engineer.agent import root_agent as engineer_root_agent
 from ml_common.plugins import get_common_plugins
+from ml_common.sessions import BoundedInMemoryRunner
+from ml_common.logging_plugin import configure_background_logging
 
 
 def build_runner():
-    logging.basicConfig(
-        level=logging.INFO,
-        format="%(asctime)s | %(levelname)s | %(name)s | %(message)s",
-    )
+    configure_background_logging()
 
-    runner = InMemoryRunner(
+    runner = BoundedInMemoryRunner(
         agent=engineer_root_agent,
         plugins=get_common_plugins(),
     )
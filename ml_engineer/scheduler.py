@@ -0,0 +1,247 @@
+import os
+import time
+import asyncio
+import logging
+import itertools
+import contextlib
+from collections import Counter, deque
+from dataclasses import dataclass, field
+from typing import AsyncIterator, Optional
+
+# Environment variables that control how many threads BLAS / OpenMP / torch
+# spin up inside a child process (torch sizes its intra-op pool from OMP).
+THREAD_ENV_VARS = (
+    "OMP_NUM_THREADS",
+    "MKL_NUM_THREADS",
+    "OPENBLAS_NUM_THREADS",
+    "NUMEXPR_NUM_THREADS",
+    "VECLIB_MAXIMUM_THREADS",
+    "BLIS_NUM_THREADS",
+)
+
+
+def available_cores() -> list[int]:
+    """Cores this process may run on (respects container cpusets)."""
+    if hasattr(os, "sched_getaffinity"):
+        return sorted(os.sched_getaffinity(0))
+    return list(range(os.cpu_count() or 1))
+
+
+@dataclass
+class Lease:
+    """Cores and memory granted to one job until it finishes."""
+
+    session_id: str
+    cores: tuple[int, ...]
+    mem_mb: Optional[int]
+    timeout_s: Optional[float]
+    waited_s: float = 0.0
+
+    def env(self) -> dict[str, str]:
+        """
+        Environment for the job's process: thread caps matching the core
+        count, plus the pinning and rlimits the executor's bootstrap applies
+        (ML_ENGINEER_CPUSET, ML_ENGINEER_MEM_LIMIT_MB, ML_ENGINEER_CPU_LIMIT_S).
+        """
+        env = {var: str(len(self.cores)) for var in THREAD_ENV_VARS}
+        env["ML_ENGINEER_CPUSET"] = ",".join(map(str, self.cores))
+        if self.mem_mb:
+            env["ML_ENGINEER_MEM_LIMIT_MB"] = str(self.mem_mb)
+        if self.timeout_s:
+            # CPU-time backstop in case the wall-clock kill never happens.
+            env["ML_ENGINEER_CPU_LIMIT_S"] = str(int(self.timeout_s * len(self.cores)) + 5)
+        return env
+
+
+@dataclass
+class _Waiter:
+    seq: int
+    cores: int
+    mem_mb: Optional[int]
+    future: asyncio.Future
+    enqueued: float = field(default_factory=time.monotonic)
+
+
+class ExecutionScheduler:
+    """
+    Admits code executions against a core and memory budget.
+
+    - Each job asks for `cores` (default `job_cores`) and `mem_mb`
+      (default `job_mem_mb`). It is admitted only when that many cores, and
+      that much of `memory_budget_mb`, are free; it is then pinned to a
+      specific core set and given matching thread caps (see `Lease.env`).
+    - Waiting jobs are queued per session. When capacity frees up, the
+      session with the fewest running jobs goes first (ties: oldest job),
+      so one busy session cannot starve the others.
+    - The head job is never skipped for a smaller one behind it, so large
+      jobs are not starved either.
+    """
+
+    def __init__(
+        self,
+        cores: Optional[list[int]] = None,
+        memory_budget_mb: Optional[int] = None,
+        job_cores: int = 1,
+        job_mem_mb: Optional[int] = None,
+        job_timeout_s: Optional[float] = None,
+    ) -> None:
+        self.cores = sorted(cores or available_cores())
+        self.memory_budget_mb = memory_budget_mb
+        self.job_cores = max(1, min(job_cores, len(self.cores)))
+        self.job_mem_mb = job_mem_mb
+        self.job_timeout_s = job_timeout_s
+
+        self._free_cores = set(self.cores)
+        self._free_mem = memory_budget_mb
+        self._waiting: dict[str, deque[_Waiter]] = {}
+        self._running: Counter = Counter()
+        self._seq = itertools.count()
+
+        self.admitted = 0
+        self.total_wait_s = 0.0
+
+    # --- admission ----------------------------------------------------------
+    def _fits(self, waiter: _Waiter) -> bool:
+        if waiter.cores > len(self._free_cores):
+            return False
+        if self._free_mem is not None and waiter.mem_mb:
+            return waiter.mem_mb <= self._free_mem
+        return True
+
+    def _dispatch(self) -> None:
+        while True:
+            heads = [
+                (self._running[session], queue[0].seq, session)
+                for session, queue in self._waiting.items()
+            ]
+            if not heads:
+                return
+            _, _, session = min(heads)
+            queue = self._waiting[session]
+            waiter = queue[0]
+            if waiter.future.cancelled():
+                queue.popleft()
+            elif self._fits(waiter):
+                queue.popleft()
+                waiter.future.set_result(self._grant(session, waiter))
+            else:
+                return
+            if not queue:
+                del self._waiting[session]
+
+    def _grant(self, session_id: str, waiter: _Waiter) -> Lease:
+        cores = tuple(sorted(self._free_cores)[: waiter.cores])
+        self._free_cores.difference_update(cores)
+        if self._free_mem is not None and waiter.mem_mb:
+            self._free_mem -= waiter.mem_mb
+        self._running[session_id] += 1
+
+        waited = time.monotonic() - waiter.enqueued
+        self.admitted += 1
+        self.total_wait_s += waited
+        if waited > 0.5:
+            logging.info(
+                "[Scheduler] Session %s admitted after %.1fs on cores %s",
+                session_id, waited, cores,
+            )
+        return Lease(session_id, cores, waiter.mem_mb, self.job_timeout_s, waited)
+
+    def _release(self, lease: Lease) -> None:
+        self._free_cores.update(lease.cores)
+        if self._free_mem is not None and lease.mem_mb:
+            self._free_mem += lease.mem_mb
+        self._running[lease.session_id] -= 1
+        if self._running[lease.session_id] <= 0:
+            del self._running[lease.session_id]
+        self._dispatch()
+
+    @contextlib.asynccontextmanager
+    async def lease(
+        self,
+        session_id: str,
+        cores: Optional[int] = None,
+        mem_mb: Optional[int] = None,
+    ) -> AsyncIterator[Lease]:
+        """Wait for capacity, then hold a `Lease` for the duration of the block."""
+        cores = max(1, min(cores or self.job_cores, len(self.cores)))
+        mem_mb = mem_mb or self.job_mem_mb
+        if self.memory_budget_mb is not None and mem_mb:
+            mem_mb = min(mem_mb, self.memory_budget_mb)
+
+        waiter = _Waiter(
+            next(self._seq), cores, mem_mb, asyncio.get_running_loop().create_future()
+        )
+        self._waiting.setdefault(session_id, deque()).append(waiter)
+        self._dispatch()
+
+        try:
+            lease = await waiter.future
+        except asyncio.CancelledError:
+            if waiter.future.done() and not waiter.future.cancelled():
+                self._release(waiter.future.result())
+            else:
+                self._dispatch()  # drop the cancelled waiter
+            raise
+
+        try:
+            yield lease
+        finally:
+            self._release(lease)
+
+    def stats(self) -> dict:
+        return {
+            "cores": len(self.cores),
+            "free_cores": len(self._free_cores),
+            "free_mem_mb": self._free_mem,
+            "running": dict(self._running),
+            "queued": {s: len(q) for s, q in self._waiting.items()},
+            "admitted": self.admitted,
+            "avg_wait_s": round(self.total_wait_s / self.admitted, 3) if self.admitted else 0.0,
+        }
+
+
+def _physical_memory_mb() -> Optional[int]:
+    try:
+        return os.sysconf("SC_PHYS_PAGES") * os.sysconf("SC_PAGE_SIZE") // (1024 * 1024)
+    except (ValueError, OSError, AttributeError):
+        return None
+
+
+_scheduler: Optional[ExecutionScheduler] = None
+
+
+def get_scheduler() -> ExecutionScheduler:
+    """
+    The process-wide scheduler shared by every session, built from the
+    environment on first use.
+
+    ML_ENGINEER_CPU_BUDGET      cores to schedule on (default: all available)
+    ML_ENGINEER_JOB_CORES       cores per job (default 1)
+    ML_ENGINEER_JOB_MEM_MB      memory limit per job (default: none)
+    ML_ENGINEER_MEM_BUDGET_MB   memory admitted across jobs (default: 80% of RAM,
+                                only used when ML_ENGINEER_JOB_MEM_MB is set)
+    ML_ENGINEER_JOB_TIMEOUT_S   wall-clock limit per job (default 600)
+    """
+    global _scheduler
+    if _scheduler is not None:
+        return _scheduler
+
+    cores = available_cores()
+    budget = int(os.getenv("ML_ENGINEER_CPU_BUDGET", "0"))
+    if budget:
+        cores = cores[:budget]
+
+    job_mem = int(os.getenv("ML_ENGINEER_JOB_MEM_MB", "0")) or None
+    mem_budget = int(os.getenv("ML_ENGINEER_MEM_BUDGET_MB", "0")) or None
+    if job_mem and mem_budget is None:
+        physical = _physical_memory_mb()
+        mem_budget = int(physical * 0.8) if physical else None
+
+    _scheduler = ExecutionScheduler(
+        cores=cores,
+        memory_budget_mb=mem_budget,
+        job_cores=int(os.getenv("ML_ENGINEER_JOB_CORES", "1")),
+        job_mem_mb=job_mem,
+        job_timeout_s=float(os.getenv("ML_ENGINEER_JOB_TIMEOUT_S", "600")) or None,
+    )
+    return _scheduler
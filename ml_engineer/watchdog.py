@@ -0,0 +1,236 @@
+import os
+import json
+import math
+import time
+import ctypes
+import logging
+import threading
+from dataclasses import dataclass
+from typing import Any, Optional
+
+from ml_engineer.results import to_jsonable
+
+WATCHDOG_MARKER = "[Watchdog]"
+
+# "0" / "off" disables the watchdog; `progress(...)` then only records heartbeats.
+WATCHDOG = os.getenv("ML_ENGINEER_WATCHDOG", "on").lower() not in ("0", "off", "false")
+
+# How often the executor looks at a running script's heartbeats.
+POLL_S = 0.5
+
+
+class EarlyStop(BaseException):
+    """
+    Raised inside an in-process script when the watchdog stops it. A
+    BaseException, like KeyboardInterrupt, so that `except Exception` in
+    the script's training loop does not swallow it.
+    """
+
+
+@dataclass
+class WatchdogRules:
+    """When to stop a run early; None / 0 turns a rule off."""
+
+    stall_s: Optional[float] = 120.0         # no heartbeat for this long after the first one
+    first_progress_s: Optional[float] = None  # no heartbeat at all within this long
+    nonfinite: bool = True                   # any reported value is NaN or inf
+    metric: str = "loss"                     # the value watched for divergence
+    diverge_factor: Optional[float] = 4.0    # `metric` above factor x its best so far ...
+    diverge_patience: int = 3                # ... on this many heartbeats in a row
+    warmup: int = 5                          # heartbeats before divergence is checked
+
+
+def get_rules() -> WatchdogRules:
+    """
+    Watchdog rules from the environment:
+
+    ML_ENGINEER_STALL_S           stop after this long without a heartbeat, once
+                                  the script sent one (default 120, 0 = off)
+    ML_ENGINEER_FIRST_PROGRESS_S  stop if no heartbeat arrives within this long
+                                  (default 0 = off: scripts need not call progress)
+    ML_ENGINEER_WATCHDOG_METRIC   heartbeat value checked for divergence (default "loss")
+    ML_ENGINEER_DIVERGE_FACTOR    stop when it exceeds this multiple of its best
+                                  value (default 4, 0 = off) ...
+    ML_ENGINEER_DIVERGE_PATIENCE  ... on this many heartbeats in a row (default 3)
+    """
+    return WatchdogRules(
+        stall_s=float(os.getenv("ML_ENGINEER_STALL_S", "120")) or None,
+        first_progress_s=float(os.getenv("ML_ENGINEER_FIRST_PROGRESS_S", "0")) or None,
+        metric=os.getenv("ML_ENGINEER_WATCHDOG_METRIC", "loss"),
+        diverge_factor=float(os.getenv("ML_ENGINEER_DIVERGE_FACTOR", "4")) or None,
+        diverge_patience=int(os.getenv("ML_ENGINEER_DIVERGE_PATIENCE", "3")),
+    )
+
+
+class Watchdog:
+    """
+    Follows one run's heartbeats and decides when to stop it.
+
+    Heartbeats are dicts such as `{"step": 120, "loss": 0.41}`, fed to
+    `beat` as they arrive; `poll` checks the time-based rules. Both return
+    the reason to stop, or None. Once a rule fired, `stopped` holds
+    `{"rule": ..., "reason": ...}` with rule one of "nonfinite",
+    "diverged", "stalled" or "no_progress".
+    """
+
+    def __init__(self, rules: Optional[WatchdogRules] = None, enabled: Optional[bool] = None) -> None:
+        self.rules = rules or get_rules()
+        self.enabled = WATCHDOG if enabled is None else enabled
+        self.started = time.monotonic()
+        self.beats = 0
+        self.last: Optional[dict] = None
+        self.last_at: Optional[float] = None
+        self.best: Optional[float] = None
+        self.over = 0
+        self.stopped: Optional[dict] = None
+
+    def _stop(self, rule: str, reason: str) -> str:
+        if self.stopped is None:
+            self.stopped = {"rule": rule, "reason": reason}
+        return self.stopped["reason"]
+
+    def beat(self, heartbeat: dict, now: Optional[float] = None) -> Optional[str]:
+        self.beats += 1
+        self.last = {k: to_jsonable(v) for k, v in heartbeat.items()}
+        self.last_at = time.monotonic() if now is None else now
+        if not self.enabled or self.stopped:
+            return self.stopped and self.stopped["reason"]
+
+        rules = self.rules
+        at = f" at step {self.last['step']}" if self.last.get("step") is not None else ""
+        if rules.nonfinite:
+            for name, value in self.last.items():
+                if isinstance(value, float) and not math.isfinite(value):
+                    return self._stop("nonfinite", f"{name} is {value}{at}")
+
+        value = self.last.get(rules.metric)
+        if rules.diverge_factor and isinstance(value, (int, float)) and not isinstance(value, bool):
+            if self.best is not None and self.beats > rules.warmup and self.best > 0 \
+                    and value > rules.diverge_factor * self.best:
+                self.over += 1
+                if self.over >= rules.diverge_patience:
+                    return self._stop(
+                        "diverged",
+                        f"{rules.metric} diverged{at}: {value:.4g}, more than "
+                        f"{rules.diverge_factor:g}x its best {self.best:.4g}",
+                    )
+            else:
+                self.over = 0
+            self.best = value if self.best is None else min(self.best, value)
+        return None
+
+    def poll(self, now: Optional[float] = None) -> Optional[str]:
+        if not self.enabled or self.stopped:
+            return self.stopped and self.stopped["reason"]
+        now = time.monotonic() if now is None else now
+        rules = self.rules
+        if self.last_at is None:
+            if rules.first_progress_s and now - self.started > rules.first_progress_s:
+                return self._stop("no_progress", f"no progress reported within {rules.first_progress_s:g}s")
+        elif rules.stall_s and now - self.last_at > rules.stall_s:
+            return self._stop(
+                "stalled",
+                f"no progress for {now - self.last_at:.0f}s (limit {rules.stall_s:g}s) "
+                f"after {self.beats} heartbeat(s)",
+            )
+        return None
+
+    def summary(self) -> Optional[dict[str, Any]]:
+        """
+        For `RunResult.progress`: heartbeats received and the last one.
+        Child processes send at most a few per second, so there this
+        counts samples, not `progress(...)` calls.
+        """
+        if not self.beats:
+            return None
+        return {"heartbeats": self.beats, "last": self.last}
+
+
+# --- In-process scripts -----------------------------------------------------
+class Progress:
+    """
+    The `progress(step=..., **values)` helper of an in-process script.
+
+    Each call is a heartbeat for the watchdog; when a rule fires it raises
+    `EarlyStop` in the script. Time-based rules (a hung data loader, a
+    deadlock) are enforced by a monitor thread, which raises `EarlyStop`
+    asynchronously in the script's thread. Like KeyboardInterrupt, that
+    takes effect at the next Python bytecode: a single blocking C call
+    is not interrupted (the subprocess executor kills those).
+    """
+
+    def __init__(self, watchdog: Optional[Watchdog] = None) -> None:
+        self.watchdog = watchdog or Watchdog()
+        self._thread_id = threading.get_ident()
+        self._lock = threading.Lock()
+        self._done = threading.Event()
+        self._fired = False
+        self._monitor: Optional[threading.Thread] = None
+
+    def __call__(self, step=None, **values) -> None:
+        if self.watchdog.beat({"step": step, **values}):
+            raise EarlyStop(self.watchdog.stopped["reason"])
+
+    def __enter__(self) -> "Progress":
+        rules = self.watchdog.rules
+        if self.watchdog.enabled and (rules.stall_s or rules.first_progress_s):
+            self._monitor = threading.Thread(target=self._watch, name="ml-watchdog", daemon=True)
+            self._monitor.start()
+        return self
+
+    def __exit__(self, *exc) -> None:
+        with self._lock:
+            self._done.set()
+            if self._fired:
+                # The script may have finished just before the exception
+                # was delivered: drop it rather than raise it later.
+                ctypes.pythonapi.PyThreadState_SetAsyncExc(ctypes.c_ulong(self._thread_id), None)
+        if self._monitor is not None:
+            self._monitor.join()
+
+    def _watch(self) -> None:
+        while not self._done.wait(POLL_S):
+            if self.watchdog.poll():
+                with self._lock:
+                    if not self._done.is_set():
+                        self._fired = True
+                        ctypes.pythonapi.PyThreadState_SetAsyncExc(
+                            ctypes.c_ulong(self._thread_id), ctypes.py_object(EarlyStop)
+                        )
+                return
+
+
+# --- Child processes --------------------------------------------------------
+class HeartbeatReader:
+    """Reads the heartbeats a child process appended to its report file so far."""
+
+    def __init__(self, path: str) -> None:
+        self.path = path
+        self.offset = 0
+
+    def read(self) -> list[dict]:
+        try:
+            with open(self.path, "rb") as f:
+                f.seek(self.offset)
+                chunk = f.read()
+        except OSError:
+            return []
+        # Only complete lines; a partly written record is read next time.
+        end = chunk.rfind(b"\n") + 1
+        self.offset += end
+        beats = []
+        for line in chunk[:end].splitlines():
+            try:
+                record = json.loads(line)
+            except ValueError:
+                continue
+            if "progress" in record:
+                beats.append(record["progress"])
+        return beats
+
+
+def log_stop(session_id: str, watchdog: Watchdog) -> None:
+    logging.warning(
+        "%s Session %s: stopped early (%s): %s",
+        WATCHDOG_MARKER, session_id, watchdog.stopped["rule"], watchdog.stopped["reason"],
+    )
@@ -1,16 +1,12 @@
-from ml_common.observability import init_agentops
-
-# initialize AgentOps for this process / agent tree
-init_agentops(trace_name="ml_researcher")
-
-from google.adk.agents import LlmAgent, LoopAgent
-from google.adk.models import Gemini
+from ml_common.observability import agentops_callback
+from ml_common.lazy import LazyToolset
+from ml_common.cassette import replayable_toolset
+from ml_common.hedging import apply_call_policy
+from ml_common.state_offload import OffloadingLlmAgent
+from ml_researcher.memory import get_research_memory_callbacks
+
+from google.adk.agents import LoopAgent
 from google.adk.tools import google_search
-from google.adk.tools.mcp_tool.mcp_toolset import (
-    MCPToolset,
-    StdioConnectionParams,
-    StdioServerParameters,
-)
 
 # ====== Shared state keys ======
 STATE_RESEARCH_TASK   = "research_task"
@@ -18,25 +14,43 @@ STATE_WEB_NOTES       = "web_notes"
 STATE_KAGGLE_NOTES    = "kaggle_notes"
 STATE_FINAL_SUMMARY   = "final_summary"
 
+# ====== Persistent research memory ======
+# Opt-in (ML_RESEARCH_MEMORY=on): Web/Kaggle agents reuse stored notes for
+# repeat topics instead of searching live; ResearchBrain stores every
+# finished research run.
+research_memory = get_research_memory_callbacks(task_key=STATE_RESEARCH_TASK)
+
 # ====== Kaggle MCP toolset (MCP-only tools) ======
-kaggle_mcp = MCPToolset(
-    connection_params=StdioConnectionParams(
-        server_params=StdioServerParameters(
-            command="npx",
-            args=[
-                "-y",
-                "mcp-remote",
-                "https://www.kaggle.com/mcp",
-            ],
-        ),
-        timeout=60,
+def build_kaggle_mcp():
+    # The MCP SDK is heavy to import; only pay for it on the first Kaggle call.
+    from google.adk.tools.mcp_tool.mcp_toolset import (
+        MCPToolset,
+        StdioConnectionParams,
+        StdioServerParameters,
     )
-)
+
+    return MCPToolset(
+        connection_params=StdioConnectionParams(
+            server_params=StdioServerParameters(
+                command="npx",
+                args=[
+                    "-y",
+                    "mcp-remote",
+                    "https://www.kaggle.com/mcp",
+                ],
+            ),
+            timeout=60,
+        )
+    )
+
+
+# When replaying a cassette, recorded stand-ins replace the live MCP server.
+kaggle_mcp = LazyToolset(replayable_toolset(build_kaggle_mcp, "KaggleResearchAgent"))
 
 # ====== 1) WebResearchAgent: google_search ONLY ======
-web_researcher = LlmAgent(
+web_researcher = OffloadingLlmAgent(
     name="WebResearchAgent",
-    model=Gemini(model="gemini-2.5-flash"),
+    model="gemini-2.5-flash",
     tools=[google_search],
     instruction=f"""
 You are a web research agent focused on ML research.
@@ -117,12 +131,13 @@ Additional rules:
 4. Do NOT mention Kaggle here.
 """,
     output_key=STATE_WEB_NOTES,
+    before_agent_callback=research_memory.reuse(STATE_WEB_NOTES),
 )
 
 # ====== 2) KaggleResearchAgent: Kaggle MCP ONLY ======
-kaggle_researcher = LlmAgent(
+kaggle_researcher = OffloadingLlmAgent(
     name="KaggleResearchAgent",
-    model=Gemini(model="gemini-2.5-flash-lite"),
+    model="gemini-2.5-flash-lite",
     tools=[kaggle_mcp],
     instruction=f"""
 You are a Kaggle-focused research agent.
@@ -204,12 +219,13 @@ Constraints:
 - Do NOT wrap your response in JSON or any other structure.
 """,
     output_key=STATE_KAGGLE_NOTES,
+    before_agent_callback=research_memory.reuse(STATE_KAGGLE_NOTES),
 )
 
 # ====== 3) ResearchBrain: merges web + Kaggle into final answer ======
-brain_agent = LlmAgent(
+brain_agent = OffloadingLlmAgent(
     name="ResearchBrain",
-    model=Gemini(model="gemini-2.5-flash"),
+    model="gemini-2.5-flash",
     tools=[],
     instruction=f"""
 You are the coordinator that merges all research into a concise, actionable answer.
@@ -293,6 +309,13 @@ Rules:
 - Be opinionated and practical: assume the reader has PyTorch / sklearn / HF / basic Kaggle skills.
 """,
     output_key=STATE_FINAL_SUMMARY,
+    after_agent_callback=research_memory.store(
+        required={
+            STATE_WEB_NOTES: "WEB_NOTES:",
+            STATE_FINAL_SUMMARY: "FINAL_SUMMARY:",
+        },
+        optional=(STATE_KAGGLE_NOTES,),
+    ),
 )
 
 # ====== Root agent: orchestrates Web -> Kaggle -> Brain ======
@@ -304,4 +327,9 @@ root_agent = LoopAgent(
         brain_agent,
     ],
     max_iterations=1,
+    # Telemetry is set up on the first invocation, not at import time.
+    before_agent_callback=agentops_callback("ml_researcher"),
 )
+
+# Per-call deadlines and hedging for the Gemini and Kaggle MCP calls.
+apply_call_policy(root_agent)
@@ -2,7 +2,6 @@ import asyncio
 import logging
 import os
 
-from google.adk.sessions import InMemorySessionService
 from google.adk.runners import Runner
 from google.adk.plugins.logging_plugin import LoggingPlugin
 from google.adk.plugins.base_plugin import BasePlugin
@@ -11,6 +10,7 @@ from google.adk.agents.callback_context import CallbackContext
 from google.adk.models.llm_request import LlmRequest
 
 from ml_researcher.agent import root_agent
+from ml_common.sessions import get_session_service
 
 
 # ---- Basic env loading (mimic ADK CLI behavior enough for local debug) ----
@@ -84,7 +84,8 @@ async def main():
 
     print("🚀 Running ml_researcher with observability plugins...\n")
 
-    session_service = InMemorySessionService()
+    # Bounded by ML_SESSION_* (count, memory, idle TTL); see ml_common/sessions.py.
+    session_service = get_session_service()
 
     runner = Runner(
         agent=root_agent,
@@ -98,12 +99,13 @@ async def main():
 
     query = "Find recent SOTA OCR models and relevant Kaggle datasets for invoices"
 
-    events = await runner.run_debug(
-        query,
-        user_id="debug_user_id",
-        session_id="debug_session_id",
-        verbose=True,
-    )
+    with session_service.in_flight("ml_researcher", "debug_user_id", "debug_session_id"):
+        events = await runner.run_debug(
+            query,
+            user_id="debug_user_id",
+            session_id="debug_session_id",
+            verbose=True,
+        )
 
     print("\n=== FINAL RESPONSE(S) ===")
     for e in events:
@@ -0,0 +1,399 @@
+import os
+import json
+import asyncio
+import sqlite3
+import threading
+import time
+import hashlib
+import logging
+import re
+from typing import Callable, Optional
+
+from google.genai import types
+
+from ml_common.state_offload import offload_value, resolve_value
+
+# numpy is imported inside the methods that need it, so importing the
+# research app does not pay for it until the memory is actually queried.
+
+STATE_MEMORY_HITS = "research_memory_hits"
+# Set while research must run live even for a remembered task (e.g. a
+# re-run after the plan diverged from speculative research).
+STATE_MEMORY_BYPASS = "research_memory_bypass"
+
+
+# ====== Embedders ======
+class HashingEmbedder:
+    """
+    Offline embedder: hashed word unigrams + bigrams into a fixed-size,
+    L2-normalized vector. No network, sub-millisecond per text.
+    """
+
+    def __init__(self, dim: int = 1024) -> None:
+        self.dim = dim
+        self.name = f"hashing-{dim}"
+
+    def __call__(self, text: str):
+        import numpy as np
+
+        words = re.findall(r"[a-z0-9]+", text.lower())
+        vec = np.zeros(self.dim, dtype=np.float32)
+        for token in words + [f"{a} {b}" for a, b in zip(words, words[1:])]:
+            h = int.from_bytes(hashlib.blake2b(token.encode(), digest_size=8).digest(), "little")
+            vec[h % self.dim] += 1.0 if (h >> 63) & 1 else -1.0
+        norm = np.linalg.norm(vec)
+        return vec / norm if norm else vec
+
+
+class GeminiEmbedder:
+    """Embeds text with a Gemini embedding model (one API call per text)."""
+
+    def __init__(self, model: str = "gemini-embedding-001") -> None:
+        self.model = model
+        self.name = f"gemini:{model}"
+        self._client = None
+
+    def __call__(self, text: str):
+        import numpy as np
+
+        if self._client is None:
+            from google import genai
+            self._client = genai.Client()
+        result = self._client.models.embed_content(model=self.model, contents=text)
+        vec = np.asarray(result.embeddings[0].values, dtype=np.float32)
+        return vec / np.linalg.norm(vec)
+
+
+# ====== Vector index ======
+class ResearchMemory:
+    """
+    Persistent store of past research outputs, keyed by task embedding.
+
+    Records live in `path`/memory.db (SQLite, WAL): one row per record
+    with its task, created_at, notes and normalized float32 embedding, so
+    a record and its vector are always written together. Each row also
+    names its embedder and dimension, and only rows of the current
+    embedder are loaded: switching embedders starts an empty index
+    instead of mixing incompatible vectors. Several processes (e.g.
+    worker mode) can share one store; each picks up the others' rows on
+    its next search. Calls block (embedding, SQLite) and are thread-safe,
+    so async callers run them in a thread.
+
+    Search is exact cosine similarity (one matrix-vector product). With
+    `approximate=True`, rows are first bucketed by random-hyperplane LSH
+    codes and only rows within `max_hamming` bits of the query are scored.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        embedder=None,
+        approximate: bool = False,
+        lsh_bits: int = 16,
+        max_hamming: int = 2,
+    ) -> None:
+        self.path = path
+        self.embedder = embedder or HashingEmbedder()
+        self.approximate = approximate
+        self.lsh_bits = lsh_bits
+        self.max_hamming = max_hamming
+        self._db: Optional[sqlite3.Connection] = None
+        self._last_id = 0
+        self._vectors = None
+        self._records: list[dict] = []
+        self._planes = None
+        self._codes = None
+        self._lock = threading.Lock()
+
+    @property
+    def embedder_name(self) -> str:
+        return getattr(self.embedder, "name", type(self.embedder).__name__)
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._db is None:
+            os.makedirs(self.path, exist_ok=True)
+            self._db = sqlite3.connect(
+                os.path.join(self.path, "memory.db"), timeout=30, isolation_level=None,
+                check_same_thread=False,
+            )
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS records ("
+                " id INTEGER PRIMARY KEY AUTOINCREMENT, task TEXT NOT NULL,"
+                " created_at REAL NOT NULL, notes TEXT NOT NULL, vector BLOB NOT NULL,"
+                " embedder TEXT, dim INTEGER)"
+            )
+            columns = {row[1] for row in self._db.execute("PRAGMA table_info(records)")}
+            for column, kind in (("embedder", "TEXT"), ("dim", "INTEGER")):
+                if column not in columns:  # a store from before embedders were recorded
+                    self._db.execute(f"ALTER TABLE records ADD COLUMN {column} {kind}")
+        return self._db
+
+    def _load(self) -> None:
+        """Append rows added since the last call (by any process) to the cache."""
+        import numpy as np
+
+        rows = self._connect().execute(
+            "SELECT id, task, created_at, notes, vector, dim FROM records"
+            " WHERE id > ? AND embedder = ? ORDER BY id",
+            (self._last_id, self.embedder_name),
+        ).fetchall()
+        if self._vectors is None:
+            self._vectors = np.zeros((0, 0), dtype=np.float32)
+        if not rows:
+            return
+        self._last_id = rows[-1][0]
+        dim = self._vectors.shape[1] if self._vectors.size else rows[0][5]
+        rows = [row for row in rows if row[5] == dim and len(row[4]) == 4 * dim]
+        if not rows:
+            return
+        vectors = np.stack([np.frombuffer(row[4], dtype=np.float32) for row in rows])
+        self._vectors = vectors if self._vectors.size == 0 else np.vstack([self._vectors, vectors])
+        self._records += [
+            {"task": task, "created_at": created_at, "notes": json.loads(notes)}
+            for _, task, created_at, notes, _, _ in rows
+        ]
+
+    def _lsh(self, vectors):
+        import numpy as np
+
+        if self._planes is None:
+            rng = np.random.default_rng(0)
+            self._planes = rng.standard_normal(
+                (vectors.shape[-1], self.lsh_bits)
+            ).astype(np.float32)
+        return (vectors @ self._planes) > 0
+
+    def _candidates(self, query):
+        import numpy as np
+
+        if not self.approximate:
+            return np.arange(len(self._records))
+        if self._codes is None or len(self._codes) != len(self._records):
+            self._codes = self._lsh(self._vectors)
+        hamming = (self._codes != self._lsh(query)).sum(axis=1)
+        return np.flatnonzero(hamming <= self.max_hamming)
+
+    def __len__(self) -> int:
+        with self._lock:
+            self._load()
+            return len(self._records)
+
+    def search(self, task: str, k: int = 1) -> list[tuple[float, dict]]:
+        """Return up to `k` (similarity, record) pairs, best first."""
+        import numpy as np
+
+        query = self.embedder(task)
+        with self._lock:
+            self._load()
+            if not self._records or self._vectors.shape[1] != query.shape[-1]:
+                return []
+            idx = self._candidates(query)
+            if idx.size == 0:
+                return []
+            scores = self._vectors[idx] @ query
+            order = np.argsort(-scores)[:k]
+            return [(float(scores[i]), self._records[idx[i]]) for i in order]
+
+    def lookup(self, task: str, threshold: float, max_age_s: float) -> Optional[dict]:
+        """Best stored record for `task` if it is similar and fresh enough."""
+        for score, record in self.search(task, k=1):
+            if score >= threshold and time.time() - record["created_at"] <= max_age_s:
+                return {**record, "similarity": score}
+        return None
+
+    def add(self, task: str, notes: dict[str, str]) -> None:
+        import numpy as np
+
+        vec = np.asarray(self.embedder(task), dtype=np.float32)
+        with self._lock:
+            self._connect().execute(
+                "INSERT INTO records (task, created_at, notes, vector, embedder, dim) VALUES (?, ?, ?, ?, ?, ?)",
+                (task, time.time(), json.dumps(notes), vec.tobytes(), self.embedder_name, vec.shape[-1]),
+            )
+            self._load()
+
+
+# ====== Agent callbacks ======
+_HITL_STATUS = re.compile(r"HITL_STATUS:\s*(\w+)")
+
+
+def _text(content) -> str:
+    if not content or not content.parts:
+        return ""
+    return "\n".join(p.text for p in content.parts if p.text).strip()
+
+
+def _task_text(callback_context, task_key: str) -> str:
+    """
+    The research task: the `task_key` state value if set, else the
+    session's first user message. Later messages ("APPROVE", "continue")
+    are replies within the same task, not new tasks.
+    """
+    task = callback_context.state.get(task_key)
+    if task:
+        return str(task).strip()
+    for event in callback_context.session.events:
+        if event.author == "user" and _text(event.content):
+            return _text(event.content)
+    return _text(callback_context.user_content)
+
+
+def _plan_approved(callback_context) -> bool:
+    """True unless the latest HITL_STATUS in the session is not PLAN_APPROVED
+    (standalone sessions have none)."""
+    for event in reversed(callback_context.session.events):
+        statuses = _HITL_STATUS.findall(_text(event.content))
+        if statuses:
+            return statuses[-1] == "PLAN_APPROVED"
+    return True
+
+
+def _hits(callback_context) -> list[str]:
+    """State keys reused from memory during the current invocation."""
+    hits = callback_context.state.get(STATE_MEMORY_HITS) or {}
+    if hits.get("invocation_id") != callback_context.invocation_id:
+        return []
+    return list(hits["keys"])
+
+
+class ResearchMemoryCallbacks:
+    """
+    Wires a `ResearchMemory` into the research agents.
+
+    - `reuse(state_key)` is a `before_agent_callback` for the Web/Kaggle
+      agents. On a fresh, similar-enough hit it writes the stored notes
+      into state and returns them as the agent's reply, so the live search
+      is skipped. It never does so while `STATE_MEMORY_BYPASS` is set or
+      a plan is waiting for approval: the agent then runs (and waits for
+      the approval) as usual.
+    - `store(required)` is an `after_agent_callback` for ResearchBrain. It
+      saves this run's research, keyed by the task (see `_task_text`), when every state
+      key in `required` contains its heading (i.e. it is real research, not
+      a waiting message) and at least one search actually ran live.
+
+    The memory itself is built on first use. With `memory_factory=None`
+    both callbacks are no-ops.
+    """
+
+    def __init__(
+        self,
+        memory_factory: Optional[Callable[[], ResearchMemory]],
+        threshold: float = 0.9,
+        max_age_s: float = 72 * 3600,
+        task_key: str = "research_task",
+    ) -> None:
+        self._memory_factory = memory_factory
+        self.task_key = task_key
+        self._memory: Optional[ResearchMemory] = None
+        self._reusable_keys: set[str] = set()
+        self.threshold = threshold
+        self.max_age_s = max_age_s
+
+    @property
+    def memory(self) -> Optional[ResearchMemory]:
+        if self._memory is None and self._memory_factory is not None:
+            self._memory = self._memory_factory()
+        return self._memory
+
+    def reuse(self, state_key: str):
+        self._reusable_keys.add(state_key)
+
+        async def _reuse_from_memory(callback_context):
+            if self.memory is None or callback_context.state.get(STATE_MEMORY_BYPASS):
+                return None
+            task = _task_text(callback_context, self.task_key)
+            if not task or not _plan_approved(callback_context):
+                return None
+
+            started = time.perf_counter()
+            # Embedding (a network call with Gemini) and SQLite block: keep
+            # them off the event loop shared by every session.
+            hit = await asyncio.to_thread(self.memory.lookup, task, self.threshold, self.max_age_s)
+            if hit is None or not hit["notes"].get(state_key):
+                return None
+
+            notes = hit["notes"][state_key]
+            callback_context.state[state_key] = await offload_value(callback_context, state_key, notes)
+            callback_context.state[STATE_MEMORY_HITS] = {
+                "invocation_id": callback_context.invocation_id,
+                "keys": _hits(callback_context) + [state_key],
+            }
+            logging.info(
+                "[ResearchMemory] Reusing %s (similarity %.3f, %.0fs old) in %.1f ms",
+                state_key,
+                hit["similarity"],
+                time.time() - hit["created_at"],
+                (time.perf_counter() - started) * 1000,
+            )
+            return types.Content(role="model", parts=[types.Part(text=notes)])
+
+        return _reuse_from_memory
+
+    def store(self, required: dict[str, str], optional: tuple[str, ...] = ()):
+        async def _store_in_memory(callback_context):
+            state = callback_context.state
+            task = _task_text(callback_context, self.task_key)
+            if self.memory is None or not task:
+                return None
+
+            if self._reusable_keys <= set(_hits(callback_context)):
+                return None  # nothing new was researched in this run
+
+            ctx = callback_context._invocation_context
+            notes = {
+                key: await resolve_value(ctx, state.get(key)) or ""
+                for key in (*required, *optional)
+            }
+            if any(heading not in notes[key] for key, heading in required.items()):
+                return None
+
+            await asyncio.to_thread(self.memory.add, task, notes)
+            logging.info("[ResearchMemory] Stored research (%d entries)", await asyncio.to_thread(len, self.memory))
+            return None
+
+        return _store_in_memory
+
+
+def get_research_memory_callbacks(task_key: str = "research_task") -> ResearchMemoryCallbacks:
+    """
+    Build the research-memory callbacks from the environment. Entries are
+    keyed by the `task_key` state value, or the session's first user message.
+
+    ML_RESEARCH_MEMORY            "on" enables the memory (default "off"; always
+                                  off while ML_CASSETTE_RECORD/REPLAY is set)
+    ML_RESEARCH_MEMORY_DIR        index location (default ~/.cache/ml_copilot/research_memory)
+    ML_RESEARCH_MEMORY_THRESHOLD  minimum cosine similarity to reuse (default 0.9)
+    ML_RESEARCH_MEMORY_MAX_AGE_H  maximum age of a reusable entry in hours (default 72)
+    ML_RESEARCH_MEMORY_EMBEDDER   "hashing" (offline, default) or "gemini"
+    ML_RESEARCH_MEMORY_APPROX     "1" to use LSH approximate search
+    """
+    if os.getenv("ML_RESEARCH_MEMORY", "off").lower() not in ("1", "on", "true"):
+        return ResearchMemoryCallbacks(None)
+    if os.getenv("ML_CASSETTE_RECORD") or os.getenv("ML_CASSETTE_REPLAY"):
+        # Memory hits skip searches, so recorded and replayed runs would diverge.
+        logging.info("[ResearchMemory] Disabled while recording or replaying a cassette")
+        return ResearchMemoryCallbacks(None)
+
+    def build_memory() -> ResearchMemory:
+        path = os.getenv(
+            "ML_RESEARCH_MEMORY_DIR",
+            os.path.join(os.path.expanduser("~"), ".cache", "ml_copilot", "research_memory"),
+        )
+        embedder = (
+            GeminiEmbedder()
+            if os.getenv("ML_RESEARCH_MEMORY_EMBEDDER", "hashing") == "gemini"
+            else HashingEmbedder()
+        )
+        return ResearchMemory(
+            path,
+            embedder=embedder,
+            approximate=os.getenv("ML_RESEARCH_MEMORY_APPROX", "0") == "1",
+        )
+
+    return ResearchMemoryCallbacks(
+        build_memory,
+        threshold=float(os.getenv("ML_RESEARCH_MEMORY_THRESHOLD", "0.9")),
+        max_age_s=float(os.getenv("ML_RESEARCH_MEMORY_MAX_AGE_H", "72")) * 3600,
+        task_key=task_key,
+    )
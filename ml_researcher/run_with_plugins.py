@@ -1,19 +1,16 @@
-import logging
-from google.adk.runners import InMemoryRunner
 from google.genai import types
 
 from ml_researcher.agent import root_agent as research_root_agent
 from ml_common.plugins import get_common_plugins
+from ml_common.sessions import BoundedInMemoryRunner
+from ml_common.logging_plugin import configure_background_logging
 
 
 def build_runner():
-    # Configure logging as you like (for production you’d often use INFO)
-    logging.basicConfig(
-        level=logging.INFO,
-        format="%(asctime)s | %(levelname)s | %(name)s | %(message)s",
-    )
+    # Logs are written on a background thread; set ML_LOG_LEVEL to change the level.
+    configure_background_logging()
 
-    runner = InMemoryRunner(
+    runner = BoundedInMemoryRunner(
         agent=research_root_agent,
         plugins=get_common_plugins(),
     )
@@ -1,18 +1,32 @@
-from ml_common.observability import init_agentops
-init_agentops(trace_name="ml_team")
+import os
 
-from google.adk.agents import LoopAgent, LlmAgent
-from google.adk.models import Gemini
+from ml_common.observability import agentops_callback
+from ml_common.hedging import apply_call_policy
+from ml_common.state_offload import OffloadingLlmAgent
+
+from google.adk.agents import LoopAgent
 
 from project_planner.agent import root_agent as project_planner_agent
-from ml_researcher.agent import root_agent as research_orchestrator
+from ml_researcher.agent import (
+    STATE_FINAL_SUMMARY,
+    STATE_KAGGLE_NOTES,
+    STATE_WEB_NOTES,
+    root_agent as research_orchestrator,
+)
 from ml_engineer.agent import root_agent as engineer_loop
+from ml_team.speculative import SpeculativeResearchAgent
 
+# ML_TEAM_SPECULATIVE_RESEARCH=1 starts research on the raw task in parallel
+# with the planner and reconciles it with the plan afterwards.
+SPECULATIVE_RESEARCH = os.getenv("ML_TEAM_SPECULATIVE_RESEARCH", "0") == "1"
 
-# Optional: a small "reporter" that summarizes everything at the end
-team_reporter = LlmAgent(
+
+# Optional: a small "reporter" that summarizes everything at the end.
+# `last_run` is written by the engineer's tools and may be offloaded to an
+# artifact, so the reporter must resolve handles in its instruction too.
+team_reporter = OffloadingLlmAgent(
     name="MLTeamReporter",
-    model=Gemini(model="gemini-2.5-flash"),
+    model="gemini-2.5-flash",
     tools=[],
     instruction="""
 You are the team reporter.
@@ -34,6 +48,10 @@ You see the full conversation between:
 - A 'WebResearchAgent' / 'KaggleResearchAgent' / 'ResearchBrain' cluster
 - An 'ML_Engineer' + 'EngineerJudge' loop that actually runs code.
 
+The latest code run, in compact structured form (empty if nothing ran yet):
+{last_run?}
+Take metrics and saved model paths from it rather than from run logs.
+
 Your job:
 
 1. If the project plan is NOT yet approved (you see
@@ -52,7 +70,8 @@ Your job:
 
 3. If research is done (you see something like 'FINAL_SUMMARY:' and/or
    concrete model/dataset suggestions), but no executed code from the
-   ML_Engineer yet (no 'STATUS:' and no printed metrics / saved model),
+   ML_Engineer yet (no run result with a "status" field, no metrics /
+   saved model),
    you MUST reply exactly:
 
    TEAM_REPORT: WAITING_FOR_ENGINEER
@@ -60,8 +79,9 @@ Your job:
 4. If all 3 are present:
    - Plan approved
    - Research summary with concrete models / datasets / metrics
-   - ML_Engineer has executed code (you see a 'STATUS: OK' with STDOUT
-     including metrics and possibly a saved model path),
+   - ML_Engineer has executed code (you see a run result with
+     "status": "OK", its "metrics" and possibly a saved model path in
+     "artifacts"),
 
    THEN you produce a short human-facing report:
 
@@ -84,11 +104,17 @@ root_agent = LoopAgent(
     name="MLTeamOrchestrator",
     sub_agents=[
         # 1) Project planner keeps HITL and high-level design
-        project_planner_agent,
-
         # 2) Research orchestrator (web + Kaggle + brain).
         #    It will respect plan approval based on its own instructions.
-        research_orchestrator,
+        *([SpeculativeResearchAgent(
+            name="PlanAndResearch",
+            sub_agents=[project_planner_agent, research_orchestrator],
+            notes_keys=(STATE_WEB_NOTES, STATE_KAGGLE_NOTES, STATE_FINAL_SUMMARY),
+            min_coverage=float(os.getenv("ML_TEAM_SPECULATION_MIN_COVERAGE", "0.5")),
+        )] if SPECULATIVE_RESEARCH else [
+            project_planner_agent,
+            research_orchestrator,
+        ]),
 
         # 3) ML engineer loop (engineer + judge + run_python).
         engineer_loop,
@@ -102,4 +128,9 @@ root_agent = LoopAgent(
     #   - first: plan + AWAITING_APPROVAL
     #   - second: APPROVE → research + engineer → final report
     max_iterations=4,
-)
\ No newline at end of file
+    # Telemetry is set up on the first invocation, not at import time.
+    before_agent_callback=agentops_callback("ml_team"),
+)
+
+# Sub-agents imported above are already wrapped; this covers the reporter.
+apply_call_policy(root_agent)
\ No newline at end of file
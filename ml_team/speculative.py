@@ -0,0 +1,221 @@
+import re
+import time
+import logging
+import contextlib
+from dataclasses import dataclass
+from typing import AsyncGenerator
+
+from google.adk.agents import BaseAgent
+from google.adk.agents.invocation_context import InvocationContext
+from google.adk.events import Event, EventActions
+from google.genai import types
+
+from ml_common.branches import ConcurrentBranches
+from ml_common.state_offload import resolve_value
+from ml_researcher.memory import STATE_MEMORY_BYPASS
+
+# Outcome of the latest reconciliation, for the reporter / debugging.
+STATE_SPECULATION = "speculation"
+
+_MODELS_SECTION = re.compile(
+    r"Models & approaches to try:(?P<body>.*?)(?:Implementation notes|Questions for the user|HITL_STATUS|\Z)",
+    re.S | re.I,
+)
+_BULLET = re.compile(r"^\s*(?:[-*•]|\d+[.)])\s+(?P<item>.+)$", re.M)
+_GENERIC_WORDS = {
+    "model", "models", "baseline", "stronger", "strong", "approach", "approaches",
+    "with", "and", "the", "for", "using", "based", "simple", "classic", "fine",
+    "tuned", "tuning", "pretrained", "classifier", "network", "networks", "small",
+}
+
+
+# --- Relevance check --------------------------------------------------------
+def plan_terms(plan: str) -> list[list[str]]:
+    """
+    Key words of each entry under the plan's "Models & approaches to try:"
+    section, e.g. "- **Logistic Regression** – baseline" -> ["logistic", "regression"].
+    """
+    section = _MODELS_SECTION.search(plan)
+    if not section:
+        return []
+    terms = []
+    for bullet in _BULLET.finditer(section["body"]):
+        name = re.split(r" [–—-] |:|\(", bullet["item"].replace("*", ""), maxsplit=1)[0]
+        words = [
+            w for w in re.findall(r"[a-z0-9][a-z0-9+.-]*", name.lower())
+            if len(w) >= 3 and w not in _GENERIC_WORDS
+        ]
+        if words:
+            terms.append(words)
+    return terms
+
+
+def plan_coverage(plan: str, notes: str) -> tuple[int, int]:
+    """How many of the plan's models / approaches the research notes mention."""
+    terms = plan_terms(plan)
+    notes = notes.lower()
+    return sum(any(w in notes for w in words) for words in terms), len(terms)
+
+
+def plan_status(plan: str) -> str:
+    """"APPROVED", "NO_PLAN" (e.g. an explanation answer) or the HITL status found."""
+    match = re.search(r"HITL_STATUS:\s*(\w+)", plan)
+    if not match:
+        return "NO_PLAN"
+    return "APPROVED" if match[1] == "PLAN_APPROVED" else match[1]
+
+
+# --- Hit / waste accounting -------------------------------------------------
+@dataclass
+class SpeculationStats:
+    runs: int = 0
+    hits: int = 0
+    reruns: int = 0
+    discarded: int = 0
+    overlap_s: float = 0.0
+
+    def record(self, outcome: str, overlap_s: float = 0.0) -> None:
+        self.runs += 1
+        if outcome == "hit":
+            self.hits += 1
+            self.overlap_s += overlap_s
+        elif outcome == "rerun":
+            self.reruns += 1
+        else:
+            self.discarded += 1
+
+    def summary(self) -> str:
+        wasted = self.reruns + self.discarded
+        return (
+            f"hit rate {self.hits}/{self.runs}, waste rate {wasted}/{self.runs}, "
+            f"{self.overlap_s:.1f}s of planner latency overlapped so far"
+        )
+
+
+stats = SpeculationStats()
+
+
+# --- Agent ------------------------------------------------------------------
+class SpeculativeResearchAgent(BaseAgent):
+    """
+    Runs `[planner, research]` concurrently instead of one after the other.
+
+    Research starts on the raw user task at the same moment as the planner,
+    on its own branch. Once both are done, the speculation is reconciled:
+
+    - plan not approved: research is cancelled as soon as the planner
+      finishes, and its results are discarded;
+    - plan approved (or no plan at all) and the research notes mention at
+      least `min_coverage` of the plan's "Models & approaches to try":
+      the notes are kept (a hit);
+    - otherwise research runs again, now with the plan in the
+      conversation and research memory bypassed (a rerun).
+
+    Every outcome is logged with the running hit / waste rates and written
+    to state under `speculation`.
+    """
+
+    notes_keys: tuple[str, ...] = ()
+    min_coverage: float = 0.5
+
+    async def _run_async_impl(
+        self, ctx: InvocationContext
+    ) -> AsyncGenerator[Event, None]:
+        planner, research = self.sub_agents
+        finished_at: dict[str, float] = {}
+        started = time.perf_counter()
+
+        speculative_branch = f"{ctx.branch}.{self.name}" if ctx.branch else self.name
+        branches = ConcurrentBranches(ctx, {
+            planner.name: (planner, ctx.branch),
+            research.name: (research, speculative_branch),
+        })
+        plan_parts: list[str] = []
+        status = None
+        async with contextlib.aclosing(branches.events()) as events:
+            async for name, event in events:
+                if event is None:
+                    finished_at[name] = time.perf_counter() - started
+                    if name == planner.name:
+                        status = plan_status("\n".join(plan_parts))
+                        if status not in ("APPROVED", "NO_PLAN"):
+                            branches.cancel(research.name)
+                    continue
+
+                if name == planner.name and event.author == planner.name and not event.partial:
+                    if event.content and event.content.parts:
+                        plan_parts.extend(p.text for p in event.content.parts if p.text and not p.thought)
+                yield event
+        branches.raise_errors()
+
+        plan = "\n".join(plan_parts)
+        if status not in ("APPROVED", "NO_PLAN"):
+            async for event in self._reconcile(ctx, "discarded", status, 0, 0):
+                yield event
+            return
+
+        notes = "\n".join([
+            str(await resolve_value(ctx, ctx.session.state.get(key)) or "")
+            for key in self.notes_keys
+        ])
+        covered, total = plan_coverage(plan, notes)
+        if total == 0 or covered / total >= self.min_coverage:
+            overlap = min(finished_at[planner.name], finished_at[research.name])
+            async for event in self._reconcile(ctx, "hit", status, covered, total, overlap):
+                yield event
+            return
+
+        async for event in self._reconcile(ctx, "rerun", status, covered, total):
+            yield event
+        try:
+            async for event in research.run_async(ctx):
+                yield event
+        finally:
+            # Appended directly, so the flag is cleared even when the rerun
+            # fails or is cancelled: left set, it would disable research
+            # memory for the rest of the session.
+            await ctx.session_service.append_event(ctx.session, Event(
+                invocation_id=ctx.invocation_id,
+                author=self.name,
+                branch=ctx.branch,
+                actions=EventActions(state_delta={STATE_MEMORY_BYPASS: None}),
+            ))
+
+    async def _reconcile(
+        self,
+        ctx: InvocationContext,
+        outcome: str,
+        status: str,
+        covered: int,
+        total: int,
+        overlap_s: float = 0.0,
+    ) -> AsyncGenerator[Event, None]:
+        stats.record(outcome, overlap_s)
+        logging.info(
+            "[Speculation] %s (plan %s, %d/%d planned models covered); %s",
+            outcome, status, covered, total, stats.summary(),
+        )
+        state_delta = {
+            STATE_SPECULATION: {
+                "outcome": outcome,
+                "plan_status": status,
+                "coverage": [covered, total],
+                "overlap_s": round(overlap_s, 2),
+            },
+        }
+        content = None
+        if outcome == "rerun":
+            state_delta[STATE_MEMORY_BYPASS] = True
+        elif outcome == "discarded":
+            # The engineer must not act on research for a plan nobody approved.
+            state_delta.update({key: None for key in self.notes_keys})
+            content = types.Content(role="model", parts=[types.Part(text=(
+                "[ResearchBrain] Waiting for research to finish; no aggregation yet."
+            ))])
+        yield Event(
+            invocation_id=ctx.invocation_id,
+            author=self.name,
+            branch=ctx.branch,
+            content=content,
+            actions=EventActions(state_delta=state_delta),
+        )
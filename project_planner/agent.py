@@ -1,5 +1,5 @@
-from ml_common.observability import init_agentops
-init_agentops(trace_name="project_planner")
+from ml_common.observability import agentops_callback
+from ml_common.hedging import apply_call_policy
 
 from google.adk.agents.llm_agent import Agent
 
@@ -59,8 +59,13 @@ root_agent = Agent(
         "- Be dense and content-heavy, avoid fluff. The user prefers high-signal answers.\n"
         "- Be honest about uncertainty; if something depends on unknowns, say what needs to be checked.\n"
     ),
+    # Telemetry is set up on the first invocation, not at import time.
+    before_agent_callback=agentops_callback("project_planner"),
 )
 
+# Per-call deadline and hedging for the planner's model calls.
+apply_call_policy(root_agent)
+
         # Here is the HITL approval pipeline before long research, unfortunately did not have the time to debug it in a
         # multi-agent system setting because it causes problems with one of the agents "helpfully" approving the plan
         # for me
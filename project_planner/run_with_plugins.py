@@ -1,17 +1,14 @@
-import logging
-from google.adk.runners import InMemoryRunner
 from google.genai import types
 
 from project_planner.agent import root_agent as planner_root_agent
 from ml_common.plugins import get_common_plugins
+from ml_common.sessions import BoundedInMemoryRunner
+from ml_common.logging_plugin import configure_background_logging
 
 
 def build_runner():
-    logging.basicConfig(
-        level=logging.INFO,
-        format="%(asctime)s | %(levelname)s | %(name)s | %(message)s",
-    )
-    return InMemoryRunner(
+    configure_background_logging()
+    return BoundedInMemoryRunner(
         agent=planner_root_agent,
         plugins=get_common_plugins(),
     )
\ No newline at end of file
@@ -0,0 +1,13 @@
+# Loaded by `adk web .` / `adk api_server .` for custom service schemes.
+# `--session_service_uri bounded://` keeps sessions in memory, bounded by
+# count, size and idle TTL (ML_SESSION_*, see ml_common/sessions.py).
+from google.adk.cli.service_registry import get_service_registry
+
+from ml_common.sessions import get_session_service
+
+
+def bounded_session_factory(uri: str, **kwargs):
+    return get_session_service()
+
+
+get_service_registry().register_session_service("bounded", bounded_session_factory)